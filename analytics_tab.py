@@ -0,0 +1,72 @@
+from PyQt5.QtCore import pyqtSignal
+from PyQt5.QtWidgets import (
+    QWidget, QVBoxLayout, QHBoxLayout, QComboBox, QPushButton, QLabel, QTableView
+)
+
+from cell_delegate import fit_columns, setup_table
+from table_model import SqlTableModel
+
+GRAIN_TITLES = {"day": "Daily", "week": "Weekly", "month": "Monthly"}
+DIMENSION_TITLES = {"country": "by country", "manager": "by manager", "category": "by category"}
+
+
+class AnalyticsTab(QWidget):
+    """Вкладка Analytics: выручка по дням/неделям/месяцам из revenue_rollup.
+
+    Данные не читает: сигнал refreshRequested(grain, dimension) обрабатывает
+    окно (rollups.view_sql) и передаёт строки в show_rows().
+    """
+
+    refreshRequested = pyqtSignal(str, str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.loaded = False
+        layout = QVBoxLayout(self)
+        controls = QHBoxLayout()
+        self.grain = QComboBox()
+        for grain, title in GRAIN_TITLES.items():
+            self.grain.addItem(title, grain)
+        self.grain.setCurrentIndex(2)
+        self.dimension = QComboBox()
+        for dimension, title in DIMENSION_TITLES.items():
+            self.dimension.addItem(title, dimension)
+        for combo in (self.grain, self.dimension):
+            combo.currentIndexChanged.connect(self.refresh)
+            controls.addWidget(combo)
+        self.bt_refresh = QPushButton("Refresh")
+        self.bt_refresh.clicked.connect(self.refresh)
+        controls.addWidget(self.bt_refresh)
+        self.info = QLabel()
+        controls.addWidget(self.info, 1)
+        layout.addLayout(controls)
+
+        self.table = QTableView()
+        self.table.setEditTriggers(QTableView.NoEditTriggers)
+        self.table.setSelectionBehavior(QTableView.SelectRows)
+        setup_table(self.table)
+        layout.addWidget(self.table)
+
+    def selection(self):
+        return self.grain.currentData(), self.dimension.currentData()
+
+    def refresh(self, *args):
+        self.refreshRequested.emit(*self.selection())
+
+    def show_rows(self, columns, rows, info):
+        old = self.table.model()
+        self.table.setModel(SqlTableModel(None, columns, rows=rows, parent=self.table))
+        if old is not None:
+            old.deleteLater()
+        fit_columns(self.table)
+        self.table.horizontalHeader().setStretchLastSection(True)
+        self.info.setText(info)
+        self.loaded = True
+
+    def clear(self):
+        old = self.table.model()
+        self.table.setModel(None)
+        if old is not None:
+            old.deleteLater()
+        self.info.clear()
+        self.loaded = False
@@ -0,0 +1,261 @@
+"""Приближённые bt2/bt3 по случайной выборке блоков rowid.
+
+Таблица (orders для bt2, order_items для bt3) делится на блоки по
+BLOCK_ROWS соседних rowid. Блоки читаются в случайном порядке (выборка
+без возвращения) поиском по первичному ключу, по каждому блоку
+считаются суммы по группам. Сумма группы по всей таблице оценивается
+как N/n · (сумма по прочитанным блокам), где N — число блоков, n —
+прочитано; 95% доверительный интервал — по разбросу сумм между блоками
+(кластерная выборка, с поправкой на конечную совокупность: когда
+прочитаны все блоки, интервал нулевой).
+
+Блок соседних rowid читается с одной-двух страниц, поэтому выборка
+блоками в десятки раз дешевле выборки отдельных случайных строк.
+Оценка годится, пока строки не упорядочены по группам внутри таблицы
+(заказы и позиции пишутся вперемешку по клиентам и товарам).
+
+    python approx_agg.py crm.db bt3 --seconds 0.1
+"""
+import argparse
+import math
+import random
+import sqlite3
+import sys
+import time
+
+# строк (rowid) в одном блоке выборки
+BLOCK_ROWS = 1000
+# z для 95% доверительного интервала
+Z95 = 1.96
+
+# Суммы по группам одного блока: (группа, x, y)
+BT2_BLOCK_SQL = """
+    SELECT c.country, COUNT(o.id), SUM(o.amount)
+    FROM orders o NOT INDEXED
+    LEFT JOIN customers c ON c.id = o.customer_id
+    WHERE o.id BETWEEN ? AND ?
+    GROUP BY c.country
+"""
+
+BT3_BLOCK_SQL = """
+    SELECT oi.product_id, SUM(oi.qty), SUM(oi.qty * p.price)
+    FROM order_items oi NOT INDEXED
+    JOIN products p ON p.id = oi.product_id
+    WHERE oi.id BETWEEN ? AND ?
+    GROUP BY oi.product_id
+"""
+
+
+def plan_queries():
+    """Запросы блоков для query_plan.py: имя -> (SQL, ожидаемые строки плана)"""
+    return {
+        "bt2 sample block": (BT2_BLOCK_SQL, ["USE TEMP B-TREE FOR GROUP BY"]),
+        "bt3 sample block": (BT3_BLOCK_SQL, ["USE TEMP B-TREE FOR GROUP BY"]),
+    }
+
+
+class BlockSampler:
+    """Оценки сумм x и y по группам из случайных блоков rowid таблицы"""
+
+    def __init__(self, conn, table, block_sql, block_rows=BLOCK_ROWS, seed=None):
+        self.conn = conn
+        self.table = table
+        self.block_sql = block_sql
+        self.block_rows = block_rows
+        # min/max rowid с краёв первичного ключа, отдельными подзапросами
+        self.low, high = conn.execute(
+            f"SELECT (SELECT min(rowid) FROM {table}), (SELECT max(rowid) FROM {table})").fetchone()
+        self.blocks = 0 if self.low is None else (high - self.low) // block_rows + 1
+        self._order = list(range(self.blocks))
+        random.Random(seed).shuffle(self._order)
+        self.sampled = 0
+        # группа -> [Σx, Σy, Σx², Σy², Σxy] по прочитанным блокам
+        self._sums = {}
+
+    @property
+    def done(self):
+        return self.sampled >= self.blocks
+
+    @property
+    def fraction(self):
+        """Доля прочитанных блоков (≈ доля строк таблицы)"""
+        return self.sampled / self.blocks if self.blocks else 1.0
+
+    def sample(self, seconds):
+        """Читать блоки seconds секунд (минимум один блок); False — блоки кончились"""
+        deadline = time.perf_counter() + seconds
+        while not self.done:
+            start = self.low + self._order[self.sampled] * self.block_rows
+            for key, x, y in self.conn.execute(self.block_sql, (start, start + self.block_rows - 1)):
+                x = x or 0
+                y = y or 0
+                s = self._sums.get(key)
+                if s is None:
+                    s = self._sums[key] = [0, 0, 0, 0, 0]
+                s[0] += x
+                s[1] += y
+                s[2] += x * x
+                s[3] += y * y
+                s[4] += x * y
+            self.sampled += 1
+            if time.perf_counter() >= deadline:
+                break
+        return not self.done
+
+    def estimates(self):
+        """{группа: (x, y, ±x, ±y)} — оценки сумм по таблице и половины 95% интервалов.
+
+        Пока прочитан один блок, разброс неизвестен — интервал math.inf.
+        """
+        n, total = self.sampled, self.blocks
+        if not n:
+            return {}
+        scale = total / n
+        # поправка на конечную совокупность: прочитаны все блоки — интервал 0
+        fpc = 1 - n / total
+        result = {}
+        for key, (sx, sy, sxx, syy, _) in self._sums.items():
+            result[key] = (sx * scale, sy * scale,
+                           self._half_width(sx, sxx, n, total, fpc),
+                           self._half_width(sy, syy, n, total, fpc))
+        return result
+
+    @staticmethod
+    def _half_width(s, ss, n, total, fpc):
+        if fpc <= 0:
+            return 0.0
+        if n < 2:
+            return math.inf
+        # дисперсия сумм по блокам (блоки без группы — нули)
+        variance = max(ss - s * s / n, 0.0) / (n - 1)
+        return Z95 * total * math.sqrt(fpc * variance / n)
+
+
+def _relative(half, value):
+    if half == 0:
+        return 0.0
+    return half / abs(value) if value else math.inf
+
+
+def _percent(relative):
+    return "±?" if math.isinf(relative) else f"±{relative * 100:.1f}%"
+
+
+class ApproxAggregate:
+    """Приближённый bt2 или bt3: выборка блоков и строки в виде вкладки.
+
+    Колонки с оценками помечены «≈», последняя колонка — половина 95%
+    интервала для колонки, по которой идёт сортировка (в процентах).
+    """
+
+    KINDS = {
+        "bt2": ("orders", BT2_BLOCK_SQL),
+        "bt3": ("order_items", BT3_BLOCK_SQL),
+    }
+    # сколько строк показывает bt3 (как LIMIT в queries.BT3_SQL)
+    TOP_PRODUCTS = 100
+
+    def __init__(self, kind, conn, block_rows=BLOCK_ROWS, seed=None):
+        table, block_sql = self.KINDS[kind]
+        self.kind = kind
+        self.conn = conn
+        self.sampler = BlockSampler(conn, table, block_sql, block_rows, seed)
+        self._products = None
+
+    @property
+    def table(self):
+        return self.sampler.table
+
+    @property
+    def fraction(self):
+        return self.sampler.fraction
+
+    @property
+    def done(self):
+        return self.sampler.done
+
+    def refine(self, seconds):
+        """Дочитать блоки за seconds секунд"""
+        return self.sampler.sample(seconds)
+
+    def result(self):
+        """(columns, rows, precision): precision — худшая относительная
+        половина интервала среди показанных строк"""
+        estimates = self.sampler.estimates()
+        if self.kind == "bt2":
+            return self._bt2(estimates)
+        return self._bt3(estimates)
+
+    def _bt2(self, estimates):
+        ranked = sorted(estimates.items(), key=lambda item: item[1][1], reverse=True)
+        rows = []
+        precision = 0.0
+        for country, (count, revenue, _, half) in ranked:
+            relative = _relative(half, revenue)
+            precision = max(precision, relative)
+            rows.append((country, round(count), round(revenue),
+                         round(revenue / count, 2) if count else None, _percent(relative)))
+        columns = ["country", "≈ orders_count", "≈ total_revenue", "≈ avg_order", "95% CI revenue"]
+        return columns, rows, precision
+
+    def _bt3(self, estimates):
+        if self._products is None:
+            self._products = {r[0]: r[1:] for r in
+                              self.conn.execute("SELECT id, name, category FROM products")}
+        ranked = sorted(estimates.items(), key=lambda item: (item[1][0], item[1][1]),
+                        reverse=True)[:self.TOP_PRODUCTS]
+        rows = []
+        precision = 0.0
+        for product_id, (qty, revenue, half, _) in ranked:
+            relative = _relative(half, qty)
+            precision = max(precision, relative)
+            name, category = self._products.get(product_id, (None, None))
+            rows.append((name, category, round(qty), round(revenue), _percent(relative)))
+        columns = ["product_name", "category", "≈ total_qty", "≈ total_revenue", "95% CI qty"]
+        return columns, rows, precision
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Точность оценки bt2/bt3 по выборке блоков")
+    parser.add_argument("db", nargs="?", default="crm.db")
+    parser.add_argument("kind", nargs="?", default="bt2", choices=sorted(ApproxAggregate.KINDS))
+    parser.add_argument("--seconds", type=float, default=0.1, help="время на выборку")
+    parser.add_argument("--block-rows", type=int, default=BLOCK_ROWS)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(f"file:{args.db}?mode=ro", uri=True)
+    started = time.perf_counter()
+    approx = ApproxAggregate(args.kind, conn, args.block_rows, args.seed)
+    approx.refine(args.seconds)
+    estimates = approx.sampler.estimates()
+    sampled = time.perf_counter() - started
+    # точные суммы — тот же запрос блока по всему диапазону rowid
+    sampler = approx.sampler
+    started = time.perf_counter()
+    exact = {key: (x or 0, y or 0) for key, x, y in conn.execute(
+        sampler.block_sql, (sampler.low or 0, (sampler.low or 0) + sampler.blocks * sampler.block_rows))}
+    exact_seconds = time.perf_counter() - started
+    conn.close()
+
+    # главная величина: выручка для bt2, количество для bt3
+    value = 1 if args.kind == "bt2" else 0
+    covered = 0
+    errors = []
+    for key, truth in exact.items():
+        estimate = estimates.get(key, (0, 0, math.inf, math.inf))
+        error = abs(estimate[value] - truth[value])
+        covered += error <= estimate[2 + value]
+        if truth[value]:
+            errors.append(error / abs(truth[value]))
+    errors.sort()
+    print(f"{args.kind}: {approx.fraction:.1%} of {approx.table} sampled in {sampled * 1000:.0f} ms, "
+          f"full scan {exact_seconds * 1000:.0f} ms")
+    if errors:
+        print(f"  relative error: median {errors[len(errors) // 2]:.2%}, max {errors[-1]:.2%}")
+    print(f"  exact value inside the 95% interval for {covered} of {len(exact)} groups")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,295 @@
+"""Безголовый бенчмарк CRM Viewer.
+
+Генерирует базы нужных размеров (init_db.py, кэшируются в bench_data/),
+запускает MainWindow под QT_QPA_PLATFORM=offscreen и замеряет время и
+пиковый RSS для set_connection, bt1/bt2/bt3, ComboBox и отрисовки
+таблицы. Для прокрутки в Tab1 загружаются все заказы базы, и
+замеряется кадр — перерисовка таблицы после сдвига на страницу или
+прыжка ползунком (scroll_frame; scroll_frame_stock — то же со
+стандартным QStyledItemDelegate вместо cell_delegate.CellDelegate).
+Результаты пишутся в JSON и сравниваются с сохранённым
+baseline (код возврата 1, если что-то стало медленнее порога).
+
+    python benchmark.py --sizes 1000,100000,1000000 --out bench_results.json
+    python benchmark.py --baseline bench_baseline.json   # сравнить
+    python benchmark.py --save-baseline bench_baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import sys
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtCore import QEventLoop  # noqa: E402
+from PyQt5.QtWidgets import QApplication, QMessageBox, QStyledItemDelegate  # noqa: E402
+
+import init_db  # noqa: E402
+from main import MainWindow  # noqa: E402
+
+DATA_DIR = "bench_data"
+DEFAULT_SIZES = "1000,100000,1000000"
+
+
+def bench_db(orders, data_dir=DATA_DIR):
+    """Путь к базе на orders заказов; генерируется один раз"""
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, f"crm_{orders}.db")
+    if not os.path.exists(path):
+        print(f"generating {path} …")
+        init_db.init_db(
+            path, orders=orders,
+            customers=max(6, orders // 100), products=max(6, min(5000, orders // 200)),
+            users=max(5, min(200, orders // 5000)), seed=42,
+            days=max(120, min(3650, orders // 100)),
+        )
+    return path
+
+
+class PeakRss:
+    """Пиковый RSS за время замера (МБ).
+
+    На Linux пик сбрасывается записью 5 в /proc/self/clear_refs, и VmHWM
+    показывает максимум только за этот замер; иначе берётся ru_maxrss
+    (максимум за всё время процесса).
+    """
+
+    def __init__(self):
+        self.peak_mb = None
+
+    def __enter__(self):
+        try:
+            with open("/proc/self/clear_refs", "w") as f:
+                f.write("5")
+            self._proc = True
+        except OSError:
+            self._proc = False
+        return self
+
+    def __exit__(self, *exc):
+        if self._proc:
+            with open("/proc/self/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        self.peak_mb = int(line.split()[1]) / 1024
+                        return False
+        ru = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss в КБ на Linux и в байтах на macOS
+        self.peak_mb = ru / (1024 * 1024) if sys.platform == "darwin" else ru / 1024
+        return False
+
+
+def wait_idle(win, timeout=600):
+    """Крутить цикл событий, пока окно не получит все результаты"""
+    deadline = time.monotonic() + timeout
+    app = QApplication.instance()
+    while win.executor is not None and win.executor.is_running():
+        if time.monotonic() > deadline:
+            raise TimeoutError("query did not finish in time")
+        app.processEvents(QEventLoop.AllEvents, 5)
+        time.sleep(0.001)
+    app.processEvents()
+
+
+def measure(fn, repeat):
+    """[(ms, peak_rss_mb)] для repeat запусков fn"""
+    samples = []
+    for _ in range(repeat):
+        with PeakRss() as rss:
+            start = time.perf_counter()
+            fn()
+            elapsed = (time.perf_counter() - start) * 1000
+        samples.append((elapsed, rss.peak_mb))
+    return {
+        "median_ms": round(statistics.median(s[0] for s in samples), 3),
+        "min_ms": round(min(s[0] for s in samples), 3),
+        "peak_rss_mb": round(max(s[1] for s in samples), 1),
+        "runs": len(samples),
+    }
+
+
+def measure_scroll(view, frames, seed=1):
+    """Время кадра прокрутки: половина кадров — на страницу вниз, половина —
+    прыжок ползунком в случайное место таблицы"""
+    bar = view.verticalScrollBar()
+    bar.setValue(0)
+    QApplication.processEvents()
+    rng = random.Random(seed)
+    times = []
+    with PeakRss() as rss:
+        for i in range(frames):
+            if i % 2:
+                bar.setValue(rng.randrange(bar.maximum() + 1))
+            else:
+                bar.setValue(min(bar.value() + bar.pageStep(), bar.maximum()))
+            start = time.perf_counter()
+            view.viewport().repaint()
+            times.append((time.perf_counter() - start) * 1000)
+    times.sort()
+    median = statistics.median(times)
+    return {
+        "median_ms": round(median, 3),
+        "min_ms": round(times[0], 3),
+        "p95_ms": round(times[int(len(times) * 0.95) - 1], 3),
+        "fps": round(1000 / median) if median else None,
+        "peak_rss_mb": round(rss.peak_mb, 1),
+        "runs": frames,
+    }
+
+
+def run_size(db_path, repeat, frames):
+    win = MainWindow(db_path)
+    win.show()
+
+    def connect():
+        win.close_connection()
+        win.set_connection()
+        wait_idle(win)
+
+    def action(method):
+        def run():
+            # без кэша: измеряем сам запрос, а не повторную выдачу из памяти
+            win.cache.clear()
+            method()
+            wait_idle(win)
+        return run
+
+    def combo():
+        win.cache.clear()
+        win.combo.blockSignals(True)
+        win.combo.setCurrentIndex(win.combo.findText("amount"))
+        win.combo.blockSignals(False)
+        win.query_combo()
+        wait_idle(win)
+
+    results = {"set_connection": measure(connect, repeat)}
+    results["query_bt1"] = measure(action(win.query_bt1), repeat)
+    results["query_bt2"] = measure(action(win.query_bt2), repeat)
+    results["query_bt3"] = measure(action(win.query_bt3), repeat)
+    results["query_combo"] = measure(combo, repeat)
+
+    # отрисовка: показать первую порцию bt1 и нарисовать вьюпорт; строки —
+    # исходные значения (int/float/str), а не текст DisplayRole
+    view = win.table(1)
+    model = view.model()
+    columns = model.columns()
+    rows = model.rows()
+
+    def render():
+        win.show_rows(columns, rows, view)
+        view.viewport().grab()
+        QApplication.processEvents()
+
+    results["show_table"] = measure(render, repeat)
+
+    # прокрутка: все заказы базы в Tab1 (show_all — модель и ширина колонок)
+    view = win.table(0)
+    # невидимая вкладка не рисуется — Tab1 делаем текущей
+    win.tabs.setCurrentWidget(view)
+    win.resize(1600, 1000)
+    QApplication.processEvents()
+    cursor = win.conn.execute(*win.registry.bind("tab1"))
+    order_columns = [d[0] for d in cursor.description]
+    orders = cursor.fetchall()
+    results["show_all"] = measure(lambda: win.show_rows(order_columns, orders, view), 1)
+    # у модели свои строки — наш список больше не нужен (del сломал бы лямбду)
+    orders = None
+    results["scroll_frame"] = measure_scroll(view, frames)
+    delegate = view.itemDelegate()
+    view.setItemDelegate(QStyledItemDelegate(view))
+    results["scroll_frame_stock"] = measure_scroll(view, frames)
+    view.setItemDelegate(delegate)
+    win.close_connection()
+    win.close()
+    win.deleteLater()
+    QApplication.processEvents()
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Печать сравнения с baseline; возвращает число регрессий"""
+    regressions = 0
+    print(f"\n{'size':>10} {'operation':<18} {'baseline':>11} {'current':>11} {'ratio':>7}")
+    for size, ops in results["results"].items():
+        base_ops = baseline.get("results", {}).get(size, {})
+        for op, cur in ops.items():
+            base = base_ops.get(op)
+            if base is None:
+                print(f"{size:>10} {op:<18} {'—':>11} {cur['median_ms']:>9.1f}ms {'new':>7}")
+                continue
+            ratio = cur["median_ms"] / base["median_ms"] if base["median_ms"] else float("inf")
+            flag = ""
+            if ratio > 1 + threshold:
+                regressions += 1
+                flag = "  <-- slower"
+            elif ratio < 1 - threshold:
+                flag = "  faster"
+            print(f"{size:>10} {op:<18} {base['median_ms']:>9.1f}ms "
+                  f"{cur['median_ms']:>9.1f}ms {ratio:>6.2f}x{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Безголовый бенчмарк CRM Viewer")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES,
+                        help=f"размеры баз в заказах через запятую (по умолчанию {DEFAULT_SIZES})")
+    parser.add_argument("--repeat", type=int, default=3, help="повторов каждой операции")
+    parser.add_argument("--scroll-frames", type=int, default=300,
+                        help="кадров в замере прокрутки (scroll_frame)")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="где хранить сгенерированные базы")
+    parser.add_argument("--out", default="bench_results.json", help="куда записать результаты")
+    parser.add_argument("--baseline", help="JSON с прошлым прогоном для сравнения")
+    parser.add_argument("--save-baseline", help="сохранить результаты ещё и как baseline")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="допустимое замедление относительно baseline (0.10 = 10%%)")
+    args = parser.parse_args(argv)
+
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    # в безголовом режиме модальные окна ошибок заменяем выводом в консоль
+    for name in ("information", "warning", "critical"):
+        setattr(QMessageBox, name, staticmethod(lambda parent, title, text, *a, **k: print(f"[{title}] {text}")))
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    results = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": {},
+    }
+    for size in sizes:
+        db_path = bench_db(size, args.data_dir)
+        print(f"benchmarking {db_path} …")
+        results["results"][str(size)] = run_size(db_path, args.repeat, args.scroll_frames)
+        for op, r in results["results"][str(size)].items():
+            fps = f"   {r['fps']} fps (p95 {r['p95_ms']:.1f} ms)" if "fps" in r else ""
+            print(f"  {op:<18} {r['median_ms']:>10.1f} ms   peak RSS {r['peak_rss_mb']:.0f} MB{fps}")
+
+    with open(args.out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"results written to {args.out}")
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"baseline saved to {args.save_baseline}")
+
+    status = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        print(f"\n{regressions} regression(s) above {args.threshold:.0%}")
+        status = 1 if regressions else 0
+    del app
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
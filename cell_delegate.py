@@ -0,0 +1,109 @@
+"""Быстрая отрисовка таблиц с результатами запросов.
+
+Стандартный QStyledItemDelegate на каждую видимую ячейку запрашивает у
+модели полдюжины ролей (текст, шрифт, цвета, выравнивание, иконку,
+флажок) и раскладывает текст через стиль — на Python-модели это больше
+половины времени кадра. CellDelegate берёт у SqlTableModel готовую
+строку (text() — форматируется один раз и кэшируется) и выравнивание
+колонки и рисует текст сам. Строки одной высоты (QHeaderView.Fixed), а
+ширина колонок считается по ограниченной выборке строк (fit_columns), а
+не по всем прочитанным, как resizeColumnsToContents().
+
+Замер прокрутки — benchmark.py (scroll_frame).
+"""
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QFontMetrics
+from PyQt5.QtWidgets import QHeaderView, QStyle, QStyledItemDelegate
+
+# отступ текста от краёв ячейки, пикселей
+CELL_PADDING = 4
+# сколько строк просматривает fit_columns: начало таблицы и равномерная выборка
+SAMPLE_ROWS = 200
+# ширина колонки по содержимому не больше (длинный текст обрезается с «…»)
+MAX_COLUMN_WIDTH = 400
+# сколько ширин текста помнит делегат (даты, имена, страны повторяются)
+WIDTH_CACHE_SIZE = 65536
+
+
+class CellDelegate(QStyledItemDelegate):
+    """Рисует текст ячейки без стиля: фон выделения, текст, «…» при обрезке.
+
+    Модели без text()/alignment() (не SqlTableModel) рисуются как обычно.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._metrics = None
+        # текст -> ширина в пикселях (нужна, чтобы решить, обрезать ли «…»)
+        self._widths = {}
+
+    def paint(self, painter, option, index):
+        model = index.model()
+        if not hasattr(model, "text"):
+            super().paint(painter, option, index)
+            return
+        row, col = index.row(), index.column()
+        text = model.text(row, col)
+        rect = option.rect
+        if option.state & QStyle.State_Selected:
+            painter.fillRect(rect, option.palette.highlight())
+            painter.setPen(option.palette.highlightedText().color())
+        else:
+            painter.setPen(option.palette.text().color())
+        if not text:
+            return
+        if self._metrics is None:
+            # копия: option живёт только на время вызова paint
+            self._metrics = QFontMetrics(option.font)
+        room = rect.width() - 2 * CELL_PADDING
+        if self._width(text) > room:
+            text = self._metrics.elidedText(text, Qt.ElideRight, room)
+        painter.drawText(rect.adjusted(CELL_PADDING, 0, -CELL_PADDING, 0),
+                         model.alignment(row, col), text)
+
+    def _width(self, text):
+        width = self._widths.get(text)
+        if width is None:
+            if len(self._widths) >= WIDTH_CACHE_SIZE:
+                self._widths.clear()
+            width = self._widths[text] = self._metrics.horizontalAdvance(text)
+        return width
+
+
+def setup_table(view):
+    """CellDelegate и строки одной высоты по шрифту таблицы"""
+    view.setItemDelegate(CellDelegate(view))
+    view.setWordWrap(False)
+    rows = view.verticalHeader()
+    rows.setSectionResizeMode(QHeaderView.Fixed)
+    rows.setDefaultSectionSize(view.fontMetrics().height() + 2 * CELL_PADDING)
+
+
+def sample_rows(count, limit=SAMPLE_ROWS):
+    """Номера строк для оценки ширины: первые limit/2 и равномерно по остальным"""
+    if count <= limit:
+        return range(count)
+    head = limit // 2
+    step = (count - head) / (limit - head)
+    return list(range(head)) + [head + int(i * step) for i in range(limit - head)]
+
+
+def fit_columns(view, limit=SAMPLE_ROWS, max_width=MAX_COLUMN_WIDTH):
+    """Ширина колонок по заголовку и выборке из limit прочитанных строк"""
+    model = view.model()
+    if model is None or not hasattr(model, "text"):
+        view.resizeColumnsToContents()
+        return
+    header = view.horizontalHeader()
+    metrics = view.fontMetrics()
+    header_metrics = header.fontMetrics()
+    rows = sample_rows(model.rowCount(), limit)
+    for col in range(model.columnCount()):
+        title = str(model.headerData(col, Qt.Horizontal) or "")
+        width = header_metrics.horizontalAdvance(title)
+        # самые длинные строки выборки — ширину меряем только у них
+        texts = {model.text(row, col) for row in rows}
+        longest = sorted(texts, key=len, reverse=True)[:8]
+        if longest:
+            width = max(width, max(metrics.horizontalAdvance(t) for t in longest))
+        header.resizeSection(col, min(width + 3 * CELL_PADDING, max_width))
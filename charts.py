@@ -0,0 +1,332 @@
+"""Вкладка Charts: выручка по странам, топ товаров и выручка во времени.
+
+Графики рисуются QPainter'ом (QtChart не нужен). Временной ряд перед
+отрисовкой прореживается до ширины графика в пикселях (downsample.py):
+на экран уходит не больше двух точек на пиксель, поэтому перерисовка при
+зуме и изменении размера не зависит от числа заказов.
+"""
+import time
+from datetime import date
+
+from PyQt5.QtCore import Qt, QPointF, QRectF, pyqtSignal
+from PyQt5.QtGui import QColor, QPainter, QPen, QPolygonF
+from PyQt5.QtWidgets import (
+    QWidget, QVBoxLayout, QHBoxLayout, QComboBox, QPushButton, QLabel, QStackedWidget
+)
+
+from downsample import MinMaxPyramid, np
+
+# вид графика -> подпись в списке
+CHART_KINDS = {
+    "country": "Revenue by country",
+    "products": "Top products by revenue",
+    "daily": "Revenue by day",
+    "orders": "Order amounts over time",
+}
+BAR_KINDS = ("country", "products")
+
+BAR_COLOR = QColor(70, 130, 180)
+LINE_COLOR = QColor(200, 80, 40)
+GRID_COLOR = QColor(225, 225, 225)
+
+
+def load_series(cursor):
+    """MinMaxPyramid из строк (date, value), упорядоченных по date.
+
+    x — номер дня (date.toordinal()); заказы одного дня распределяются
+    внутри дня по порядку строк, чтобы при приближении не сливаться в
+    вертикальную черту.
+    """
+    days = {}
+    xs = []
+    ys = []
+    for day, value in cursor:
+        x = days.get(day)
+        if x is None:
+            x = days[day] = date.fromisoformat(day).toordinal()
+        xs.append(x)
+        ys.append(0.0 if value is None else value)
+    if np is not None and xs:
+        xs = np.asarray(xs, dtype=float)
+        starts = np.flatnonzero(np.diff(xs, prepend=-1.0))
+        sizes = np.diff(np.append(starts, len(xs)))
+        rank = np.arange(len(xs)) - np.repeat(starts, sizes)
+        xs += rank / np.repeat(sizes, sizes)
+    return MinMaxPyramid(xs, ys)
+
+
+def _format_value(value):
+    if abs(value) >= 1_000_000:
+        return f"{value / 1_000_000:.1f}M"
+    if abs(value) >= 10_000:
+        return f"{value / 1000:.0f}k"
+    return f"{value:,.0f}"
+
+
+def _day_label(x):
+    try:
+        return date.fromordinal(int(x)).isoformat()
+    except ValueError:
+        return ""
+
+
+class BarChart(QWidget):
+    """Горизонтальные столбцы, отсортированные по убыванию значения"""
+
+    BAR_HEIGHT = 18
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.title = ""
+        self.items = []             # [(подпись, значение)]
+        self.setMinimumHeight(120)
+
+    def set_bars(self, title, labels, values):
+        self.title = title
+        items = [("(none)" if label is None else str(label), value or 0)
+                 for label, value in zip(labels, values)]
+        self.items = sorted(items, key=lambda item: item[1], reverse=True)
+        self.update()
+
+    def clear(self):
+        self.items = []
+        self.title = ""
+        self.update()
+
+    def paintEvent(self, event):
+        p = QPainter(self)
+        p.fillRect(self.rect(), Qt.white)
+        fm = p.fontMetrics()
+        p.drawText(8, fm.ascent() + 4, self.title)
+        if not self.items:
+            return
+        top = fm.height() + 10
+        # столько столбцов, сколько помещается по высоте
+        count = min(len(self.items), max((self.height() - top - 4) // self.BAR_HEIGHT, 1))
+        shown = self.items[:count]
+        label_width = min(max(fm.width(label) for label, _ in shown) + 12, self.width() // 3)
+        value_width = fm.width(_format_value(shown[0][1])) + 12
+        bar_space = max(self.width() - label_width - value_width - 8, 1)
+        peak = max(max(value for _, value in shown), 1e-9)
+        for i, (label, value) in enumerate(shown):
+            y = top + i * self.BAR_HEIGHT
+            text_y = y + (self.BAR_HEIGHT + fm.ascent() - fm.descent()) // 2
+            p.setPen(Qt.black)
+            p.drawText(QRectF(4, y, label_width - 8, self.BAR_HEIGHT),
+                       Qt.AlignRight | Qt.AlignVCenter, fm.elidedText(label, Qt.ElideRight, label_width - 8))
+            length = max(value, 0) / peak * bar_space
+            p.fillRect(QRectF(label_width, y + 2, length, self.BAR_HEIGHT - 4), BAR_COLOR)
+            p.drawText(int(label_width + length + 4), text_y, _format_value(value))
+        if count < len(self.items):
+            p.setPen(Qt.gray)
+            p.drawText(QRectF(0, 0, self.width() - 8, fm.height() + 4),
+                       Qt.AlignRight | Qt.AlignVCenter, f"top {count} of {len(self.items)}")
+
+
+class LineChart(QWidget):
+    """Линия по MinMaxPyramid: колесо — зум вокруг курсора, перетаскивание —
+    сдвиг, двойной щелчок — весь ряд."""
+
+    MARGIN_LEFT = 64
+    MARGIN_RIGHT = 12
+    MARGIN_TOP = 32
+    MARGIN_BOTTOM = 24
+    TICKS = 5
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.title = ""
+        self.series = None
+        self.x0 = self.x1 = 0.0
+        # прореженная линия для последнего (ширина, высота, x0, x1)
+        self._cache_key = None
+        self._cache = None
+        self._drag = None
+        self.last_points = 0        # точек ряда в окне
+        self.last_drawn = 0         # точек ушло на экран
+        self.last_ms = 0.0          # прореживание + построение линии
+        self.setMinimumHeight(120)
+
+    def set_series(self, title, series):
+        self.title = title
+        self.series = series
+        self._cache_key = None
+        self.reset_zoom()
+
+    def clear(self):
+        self.series = None
+        self.title = ""
+        self._cache_key = self._cache = None
+        self.update()
+
+    def reset_zoom(self):
+        if self.series is not None:
+            self.x0, self.x1 = self.series.bounds()[:2]
+            if self.x1 <= self.x0:
+                self.x1 = self.x0 + 1
+        self.update()
+
+    def _plot_rect(self):
+        return QRectF(self.MARGIN_LEFT, self.MARGIN_TOP,
+                      max(self.width() - self.MARGIN_LEFT - self.MARGIN_RIGHT, 1),
+                      max(self.height() - self.MARGIN_TOP - self.MARGIN_BOTTOM, 1))
+
+    def _line(self, plot):
+        """(QPolygonF, y_min, y_max) для текущего окна; считается один раз на вид"""
+        width = int(plot.width())
+        key = (width, int(plot.height()), self.x0, self.x1)
+        if key == self._cache_key:
+            return self._cache
+        started = time.perf_counter()
+        xs, ys, n = self.series.points(self.x0, self.x1, width)
+        if len(ys):
+            y_min, y_max = float(min(ys)), float(max(ys))
+        else:
+            y_min, y_max = 0.0, 1.0
+        if y_max <= y_min:
+            y_max = y_min + 1
+        sx = plot.width() / (self.x1 - self.x0)
+        sy = plot.height() / (y_max - y_min)
+        if np is not None:
+            px = (np.asarray(xs, dtype=float) - self.x0) * sx + plot.left()
+            py = plot.bottom() - (np.asarray(ys, dtype=float) - y_min) * sy
+            points = [QPointF(x, y) for x, y in zip(px.tolist(), py.tolist())]
+        else:
+            points = [QPointF((x - self.x0) * sx + plot.left(), plot.bottom() - (y - y_min) * sy)
+                      for x, y in zip(xs, ys)]
+        self._cache = (QPolygonF(points), y_min, y_max)
+        self._cache_key = key
+        self.last_points = n
+        self.last_drawn = len(points)
+        self.last_ms = (time.perf_counter() - started) * 1000
+        return self._cache
+
+    def paintEvent(self, event):
+        p = QPainter(self)
+        p.fillRect(self.rect(), Qt.white)
+        fm = p.fontMetrics()
+        p.drawText(8, fm.ascent() + 4, self.title)
+        if self.series is None or not len(self.series):
+            return
+        plot = self._plot_rect()
+        line, y_min, y_max = self._line(plot)
+
+        # сетка и подписи осей
+        p.setPen(GRID_COLOR)
+        for i in range(self.TICKS + 1):
+            y = plot.bottom() - plot.height() * i / self.TICKS
+            p.drawLine(QPointF(plot.left(), y), QPointF(plot.right(), y))
+        p.setPen(Qt.black)
+        for i in range(self.TICKS + 1):
+            y = plot.bottom() - plot.height() * i / self.TICKS
+            value = y_min + (y_max - y_min) * i / self.TICKS
+            p.drawText(QRectF(0, y - fm.height() / 2, self.MARGIN_LEFT - 6, fm.height()),
+                       Qt.AlignRight | Qt.AlignVCenter, _format_value(value))
+        for i in range(self.TICKS + 1):
+            x = plot.left() + plot.width() * i / self.TICKS
+            label = _day_label(self.x0 + (self.x1 - self.x0) * i / self.TICKS)
+            left = min(max(x - fm.width(label) / 2, 0), self.width() - fm.width(label))
+            p.drawText(int(left), int(plot.bottom() + fm.ascent() + 4), label)
+        p.drawRect(plot)
+
+        p.setClipRect(plot)
+        p.setPen(QPen(LINE_COLOR, 1))
+        p.drawPolyline(line)
+        p.setClipping(False)
+
+        p.setPen(Qt.gray)
+        p.drawText(QRectF(0, 0, self.width() - 8, fm.height() + 4), Qt.AlignRight | Qt.AlignVCenter,
+                   f"{self.last_points:,} points → {self.last_drawn:,} drawn, {self.last_ms:.1f} ms")
+
+    def wheelEvent(self, event):
+        if self.series is None:
+            return
+        plot = self._plot_rect()
+        # точка под курсором остаётся на месте
+        ratio = min(max((event.pos().x() - plot.left()) / plot.width(), 0.0), 1.0)
+        anchor = self.x0 + (self.x1 - self.x0) * ratio
+        factor = 0.8 ** (event.angleDelta().y() / 120)
+        span = (self.x1 - self.x0) * factor
+        first, last = self.series.bounds()[:2]
+        # не уже ~1/100 дня и не шире всего ряда
+        span = min(max(span, 0.01), max(last - first, 1))
+        self._set_view(anchor - span * ratio, span)
+
+    def _set_view(self, x0, span):
+        first, last = self.series.bounds()[:2]
+        x0 = min(max(x0, first), max(last - span, first))
+        self.x0, self.x1 = x0, x0 + span
+        self.update()
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.LeftButton:
+            self._drag = (event.pos().x(), self.x0)
+
+    def mouseMoveEvent(self, event):
+        if self._drag is None or self.series is None:
+            return
+        start_x, start_x0 = self._drag
+        span = self.x1 - self.x0
+        shift = (event.pos().x() - start_x) / self._plot_rect().width() * span
+        self._set_view(start_x0 - shift, span)
+
+    def mouseReleaseEvent(self, event):
+        self._drag = None
+
+    def mouseDoubleClickEvent(self, event):
+        self.reset_zoom()
+
+
+class ChartsTab(QWidget):
+    """Выбор графика, кнопка Refresh и сам график.
+
+    Данные не читает: сигнал refreshRequested(kind) обрабатывает окно и
+    передаёт результат в set_bars()/set_series().
+    """
+
+    refreshRequested = pyqtSignal(str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.loaded = False
+        layout = QVBoxLayout(self)
+        controls = QHBoxLayout()
+        self.combo = QComboBox()
+        for kind, title in CHART_KINDS.items():
+            self.combo.addItem(title, kind)
+        self.combo.currentIndexChanged.connect(self.refresh)
+        controls.addWidget(self.combo)
+        self.bt_refresh = QPushButton("Refresh")
+        self.bt_refresh.clicked.connect(self.refresh)
+        controls.addWidget(self.bt_refresh)
+        self.info = QLabel("Wheel — zoom, drag — pan, double click — reset")
+        controls.addWidget(self.info, 1)
+        layout.addLayout(controls)
+
+        self.stack = QStackedWidget()
+        self.bars = BarChart()
+        self.line = LineChart()
+        self.stack.addWidget(self.bars)
+        self.stack.addWidget(self.line)
+        layout.addWidget(self.stack, 1)
+
+    def kind(self):
+        return self.combo.currentData()
+
+    def refresh(self, *args):
+        self.refreshRequested.emit(self.kind())
+
+    def set_bars(self, title, labels, values):
+        self.bars.set_bars(title, labels, values)
+        self.stack.setCurrentWidget(self.bars)
+        self.loaded = True
+
+    def set_series(self, title, series):
+        self.line.set_series(title, series)
+        self.stack.setCurrentWidget(self.line)
+        self.loaded = True
+
+    def clear(self):
+        self.bars.clear()
+        self.line.clear()
+        self.loaded = False
@@ -0,0 +1,179 @@
+"""Профиль колонки за один потоковый проход: count, nulls, distinct,
+min/max, mean, гистограмма и top-k.
+
+Значения обрабатываются порциями (как их отдаёт fetchmany), поэтому
+память ограничена независимо от числа строк: точный distinct/top-k
+ведётся, пока различных значений не больше exact_limit, дальше —
+HyperLogLog и усечённый счётчик частот.
+"""
+import math
+from collections import Counter
+
+MASK64 = (1 << 64) - 1
+
+
+def _mix64(x):
+    """splitmix64: hash(int) в Python равен самому числу, его надо перемешать"""
+    x = (x + 0x9E3779B97F4A7C15) & MASK64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & MASK64
+    return x ^ (x >> 31)
+
+
+class HyperLogLog:
+    """Приблизительное число различных значений (ошибка ~1.04/sqrt(2^p))"""
+
+    def __init__(self, p=14):
+        self.p = p
+        self.m = 1 << p
+        self.registers = bytearray(self.m)
+
+    def add_many(self, values):
+        p = self.p
+        m1 = self.m - 1
+        shift = 64 - p
+        regs = self.registers
+        for v in values:
+            x = _mix64(hash(v) & MASK64)
+            idx = x & m1
+            w = x >> p
+            # позиция первой единицы в оставшихся (64 - p) битах
+            rank = shift - w.bit_length() + 1
+            if rank > regs[idx]:
+                regs[idx] = rank
+
+    def merge_counter(self, counter):
+        self.add_many(counter.keys())
+
+    def count(self):
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # поправка для малых значений (linear counting)
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+
+class StreamingHistogram:
+    """Гистограмма с равными корзинами за один проход без знания min/max.
+
+    Корзина значения v — floor(v / width). Когда значения перестают
+    помещаться в bins корзин, ширина удваивается, а номера корзин делятся
+    на 2: сетки вложены друг в друга, поэтому счётчики остаются точными.
+    """
+
+    def __init__(self, bins=20):
+        self.bins = bins
+        self.width = None
+        self.counts = Counter()
+
+    def add_many(self, values):
+        if not values:
+            return
+        if self.width is None:
+            span = max(values) - min(values)
+            # ширина — степень двойки, чтобы границы корзин были «круглыми»
+            self.width = 2.0 ** math.ceil(math.log2(span / self.bins)) if span > 0 else 1.0
+        width = self.width
+        self.counts.update(math.floor(v / width) for v in values)
+        while max(self.counts) - min(self.counts) + 1 > self.bins:
+            merged = Counter()
+            for b, n in self.counts.items():
+                merged[b // 2] += n
+            self.counts = merged
+            self.width *= 2
+
+    def rows(self):
+        """[(label, count)] от минимальной до максимальной корзины"""
+        if not self.counts:
+            return []
+        out = []
+        for b in range(min(self.counts), max(self.counts) + 1):
+            a = b * self.width
+            out.append((f"[{a:g}, {a + self.width:g})", self.counts.get(b, 0)))
+        return out
+
+
+class ColumnProfiler:
+    """Накапливает профиль колонки; update() вызывается на каждую порцию"""
+
+    def __init__(self, column, top_k=10, exact_limit=200_000, bins=20):
+        self.column = column
+        self.top_k = top_k
+        self.exact_limit = exact_limit
+        self.count = 0
+        self.nulls = 0
+        self.numeric = 0
+        self.total = 0.0
+        self.num_min = self.num_max = None
+        self.text_min = self.text_max = None
+        self.freq = Counter()
+        self.hll = None              # включается, когда distinct > exact_limit
+        self.histogram = StreamingHistogram(bins)
+
+    def update(self, values):
+        self.count += len(values)
+        n = len(values)
+        values = [v for v in values if v is not None]
+        self.nulls += n - len(values)
+        numbers = [v for v in values if type(v) in (int, float)]
+        texts = [v for v in values if type(v) is str] if len(numbers) != len(values) else []
+
+        if numbers:
+            self.numeric += len(numbers)
+            self.total += math.fsum(numbers)
+            lo, hi = min(numbers), max(numbers)
+            self.num_min = lo if self.num_min is None else min(self.num_min, lo)
+            self.num_max = hi if self.num_max is None else max(self.num_max, hi)
+            self.histogram.add_many(numbers)
+        if texts:
+            lo, hi = min(texts), max(texts)
+            self.text_min = lo if self.text_min is None else min(self.text_min, lo)
+            self.text_max = hi if self.text_max is None else max(self.text_max, hi)
+
+        self.freq.update(values)
+        if self.hll is not None:
+            self.hll.add_many(values)
+        elif len(self.freq) > self.exact_limit:
+            # дальше distinct считаем приблизительно, а частоты усекаем
+            self.hll = HyperLogLog()
+            self.hll.merge_counter(self.freq)
+        if self.hll is not None and len(self.freq) > 2 * self.exact_limit // 10:
+            self.freq = Counter(dict(self.freq.most_common(self.exact_limit // 10)))
+
+    @property
+    def approximate(self):
+        return self.hll is not None
+
+    def distinct(self):
+        return self.hll.count() if self.hll is not None else len(self.freq)
+
+    def rows(self):
+        """Профиль как строки (section, item, value) для таблицы"""
+        approx = " (≈ HyperLogLog)" if self.approximate else ""
+        rows = [
+            ("summary", "column", self.column),
+            ("summary", "count", self.count),
+            ("summary", "nulls", self.nulls),
+            ("summary", "distinct" + approx, self.distinct()),
+        ]
+        if self.numeric:
+            rows += [
+                ("summary", "min", self.num_min),
+                ("summary", "max", self.num_max),
+                ("summary", "mean", round(self.total / self.numeric, 4)),
+            ]
+        if self.text_min is not None:
+            rows += [
+                ("summary", "min (text)", self.text_min),
+                ("summary", "max (text)", self.text_max),
+            ]
+        rows += [("histogram", label, n) for label, n in self.histogram.rows()]
+        top_label = "top-k (≈ truncated counts)" if self.approximate else "top-k"
+        rows += [(top_label, str(v), n) for v, n in self.freq.most_common(self.top_k)]
+        return rows
+
+
+PROFILE_COLUMNS = ["section", "item", "value"]
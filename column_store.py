@@ -0,0 +1,252 @@
+"""Колоночное хранение результата запроса для SqlTableModel.
+
+Вместо списка кортежей (кортеж + отдельный объект int/float/str на каждое
+значение, десятки байт накладных расходов) каждая колонка хранится
+отдельно:
+- целые и вещественные — в массивах NumPy int64/float64 (без NumPy —
+  array.array), NULL — в отдельной маске;
+- текст — словарём: каждая различная строка хранится один раз, в колонке
+  лежат только 4-байтовые коды (страны, категории, имена, даты);
+- всё остальное (смесь типов, BLOB) — обычным списком.
+
+Тип колонки определяется по первой порции и при необходимости
+расширяется (int → float → object).
+"""
+import sys
+from array import array
+
+try:
+    import numpy as np
+except ImportError:  # NumPy необязателен
+    np = None
+
+HAVE_NUMPY = np is not None
+
+_NP_DTYPES = {"q": "int64", "d": "float64", "I": "uint32"}
+
+
+class _Buffer:
+    """Растущий массив чисел одного типа (NumPy или array.array)"""
+
+    def __init__(self, typecode, values=()):
+        self.typecode = typecode
+        self.size = 0
+        if np is not None:
+            self.data = np.empty(1024, dtype=_NP_DTYPES[typecode])
+        else:
+            self.data = array(typecode)
+        self.extend(values)
+
+    def extend(self, values):
+        n = len(values)
+        if not n:
+            return
+        if np is None:
+            self.data.extend(values)
+            self.size += n
+            return
+        if self.size + n > len(self.data):
+            # удвоение ёмкости: амортизированно O(1) на значение
+            grown = np.empty(max(2 * len(self.data), self.size + n), dtype=self.data.dtype)
+            grown[:self.size] = self.data[:self.size]
+            self.data = grown
+        self.data[self.size:self.size + n] = values
+        self.size += n
+
+    def get(self, i):
+        # ndarray.item(i) сразу отдаёт int/float Python, без скаляра NumPy
+        return self.data.item(i) if np is not None else self.data[i]
+
+    def tolist(self, start, stop):
+        return self.data[start:stop].tolist()
+
+    def array(self):
+        """Значения как массив NumPy (или array.array) без копирования"""
+        return self.data[:self.size]
+
+    @property
+    def nbytes(self):
+        if np is not None:
+            return self.data.nbytes
+        return self.data.buffer_info()[1] * self.data.itemsize
+
+
+class _NumericColumn:
+    """int64 / float64 с маской NULL (маска заводится при первом NULL)"""
+
+    def __init__(self, kind):
+        self.kind = kind                       # "int" | "float"
+        self.buf = _Buffer("q" if kind == "int" else "d")
+        self.nulls = None                      # bytearray: 1 — NULL
+
+    def accepts(self, values):
+        allowed = (int,) if self.kind == "int" else (int, float)
+        return all(v is None or type(v) in allowed for v in values)
+
+    def extend(self, values):
+        has_null = None in values
+        if has_null and self.nulls is None:
+            self.nulls = bytearray(self.buf.size)
+        if self.nulls is not None:
+            self.nulls.extend(v is None for v in values)
+        if has_null:
+            values = [0 if v is None else v for v in values]
+        self.buf.extend(values)
+
+    def get(self, i):
+        if self.nulls is not None and self.nulls[i]:
+            return None
+        return self.buf.get(i)
+
+    def tolist(self, start, stop):
+        values = self.buf.tolist(start, stop)
+        if self.nulls is not None:
+            nulls = self.nulls[start:stop]
+            values = [None if n else v for v, n in zip(values, nulls)]
+        return values
+
+    def to_float(self):
+        column = _NumericColumn("float")
+        column.buf.extend(self.buf.tolist(0, self.buf.size))
+        column.nulls = self.nulls
+        return column
+
+    @property
+    def nbytes(self):
+        return self.buf.nbytes + (len(self.nulls) if self.nulls is not None else 0)
+
+
+class _TextColumn:
+    """Словарное кодирование: коды uint32 + список различных строк"""
+
+    kind = "text"
+
+    def __init__(self):
+        self.codes = _Buffer("I")
+        self.values = [None]                   # код 0 — NULL
+        self.index = {None: 0}
+
+    def accepts(self, values):
+        return all(v is None or type(v) is str for v in values)
+
+    def extend(self, values):
+        index = self.index
+        codes = []
+        for v in values:
+            code = index.get(v)
+            if code is None:
+                code = index[v] = len(self.values)
+                self.values.append(v)
+            codes.append(code)
+        self.codes.extend(codes)
+
+    def get(self, i):
+        return self.values[self.codes.get(i)]
+
+    def tolist(self, start, stop):
+        values = self.values
+        return [values[c] for c in self.codes.tolist(start, stop)]
+
+    @property
+    def nbytes(self):
+        # строки словаря + сам словарь и индекс (приблизительно)
+        strings = sum(sys.getsizeof(v) for v in self.values if v is not None)
+        return self.codes.nbytes + strings + sys.getsizeof(self.values) + sys.getsizeof(self.index)
+
+
+class _ObjectColumn:
+    """Запасной вариант для смеси типов и BLOB"""
+
+    kind = "object"
+
+    def __init__(self, values=()):
+        self.items = list(values)
+
+    def accepts(self, values):
+        return True
+
+    def extend(self, values):
+        self.items.extend(values)
+
+    def get(self, i):
+        return self.items[i]
+
+    def tolist(self, start, stop):
+        return self.items[start:stop]
+
+    @property
+    def nbytes(self):
+        return sys.getsizeof(self.items) + sum(sys.getsizeof(v) for v in self.items)
+
+
+def _new_column(values):
+    kinds = {type(v) for v in values if v is not None}
+    if not kinds or kinds == {int}:
+        # пустая/NULL-колонка начинается как int и расширится по данным
+        return _NumericColumn("int")
+    if kinds <= {int, float}:
+        return _NumericColumn("float")
+    if kinds == {str}:
+        return _TextColumn()
+    return _ObjectColumn()
+
+
+class ColumnStore:
+    """Результат запроса по колонкам; строки дописываются порциями"""
+
+    def __init__(self, columns, rows=None):
+        self.names = list(columns)
+        self._columns = None
+        self._len = 0
+        if rows:
+            self.append(rows)
+
+    def __len__(self):
+        return self._len
+
+    def append(self, rows):
+        """Дописать порцию строк (список кортежей, как из fetchmany)"""
+        if not rows:
+            return
+        data = list(zip(*rows))
+        if self._columns is None:
+            self._columns = [_new_column(values) for values in data]
+        for i, values in enumerate(data):
+            column = self._columns[i]
+            if not column.accepts(values):
+                column = self._columns[i] = self._widen(column, values)
+            column.extend(values)
+        self._len += len(rows)
+
+    def _widen(self, column, values):
+        if column.kind == "int" and all(v is None or type(v) in (int, float) for v in values):
+            return column.to_float()
+        # значения другого типа: дальше храним как есть
+        return _ObjectColumn(column.tolist(0, self._len))
+
+    def kind(self, col):
+        """"int" | "float" | "text" | "object" (None — строк ещё нет)"""
+        return self._columns[col].kind if self._columns else None
+
+    def value(self, row, col):
+        return self._columns[col].get(row)
+
+    def row(self, i):
+        return tuple(c.get(i) for c in self._columns)
+
+    def rows(self, start=0, stop=None):
+        """Строки как список кортежей (для экспорта, кэша, графиков)"""
+        if not self._columns:
+            return []
+        stop = self._len if stop is None else min(stop, self._len)
+        return list(zip(*(c.tolist(start, stop) for c in self._columns)))
+
+    def column(self, col):
+        """Значения колонки: массив NumPy для числовых без NULL, иначе список"""
+        column = self._columns[col]
+        if isinstance(column, _NumericColumn) and column.nulls is None:
+            return column.buf.array()
+        return column.tolist(0, self._len)
+
+    def nbytes(self):
+        return sum(c.nbytes for c in self._columns) if self._columns else 0
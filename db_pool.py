@@ -0,0 +1,148 @@
+"""Пул read-only соединений к crm.db с настроенными PRAGMA.
+
+Каждый фоновый запрос и каждая вкладка с открытым курсором получают
+своё соединение из пула, поэтому GUI и рабочие потоки не делят один
+дескриптор. Соединения открываются через URI mode=ro и query_only,
+так что просмотрщик физически не может изменить базу.
+"""
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import quote
+
+# Значения по умолчанию; переопределяются из командной строки (--pragma name=value)
+DEFAULT_PRAGMAS = {
+    "mmap_size": 256 * 1024 * 1024,   # читать файл через mmap, без копий в page cache SQLite
+    "cache_size": -64 * 1024,         # 64 МБ кэша страниц на соединение (отрицательное — КБ)
+    "temp_store": "MEMORY",           # временные B-tree (GROUP BY, ORDER BY) в памяти
+    "query_only": 1,                  # запрет записи даже при ошибке в SQL
+}
+
+# Подготовленных запросов на соединение (sqlite3 по умолчанию держит 128):
+# запросы реестра, их варианты с сортировкой/фильтрами и страницы не
+# вытесняют друг друга и не разбираются заново на каждый клик
+STATEMENT_CACHE = 256
+
+
+def parse_pragma(text):
+    """'name=value' -> (name, value), числа приводятся к int"""
+    name, sep, value = text.partition("=")
+    if not sep or not name.strip().isidentifier():
+        raise ValueError(f"expected name=value, got {text!r}")
+    value = value.strip()
+    try:
+        value = int(value)
+    except ValueError:
+        pass
+    return name.strip(), value
+
+
+class PooledConnection:
+    """Соединение, взятое из пула; close() возвращает его обратно"""
+
+    def __init__(self, pool, connection):
+        self.pool = pool
+        self.connection = connection
+
+    def __getattr__(self, name):
+        return getattr(self.connection, name)
+
+    def close(self):
+        if self.connection is not None:
+            self.pool.release(self.connection)
+            self.connection = None
+
+
+class ConnectionPool:
+    """Небольшой пул read-only соединений с одинаковыми PRAGMA"""
+
+    def __init__(self, db_path, size=4, pragmas=None, read_only=True):
+        if read_only and not os.path.exists(db_path):
+            # mode=ro не создаёт файл — сообщаем понятной ошибкой
+            raise sqlite3.OperationalError(f"database file not found: {db_path}")
+        self.db_path = db_path
+        self.size = size
+        self.read_only = read_only
+        self.pragmas = dict(DEFAULT_PRAGMAS if pragmas is None else pragmas)
+        if not read_only:
+            self.pragmas.pop("query_only", None)
+        self._lock = threading.Lock()
+        first = self.connect()
+        self.journal_mode = first.execute("PRAGMA journal_mode").fetchone()[0]
+        self._idle = [first]
+        self._closed = False
+        self.opened = 1
+
+    @property
+    def is_wal(self):
+        return self.journal_mode.lower() == "wal"
+
+    def connect(self, pragmas=None):
+        """Новое соединение вне пула (pragmas=None — настройки пула)"""
+        if self.read_only:
+            uri = f"file:{quote(os.path.abspath(self.db_path))}?mode=ro"
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False,
+                                   cached_statements=STATEMENT_CACHE)
+        else:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False,
+                                   cached_statements=STATEMENT_CACHE)
+        for name, value in (self.pragmas if pragmas is None else pragmas).items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def acquire(self):
+        """Соединение из пула; если свободных нет — открывается новое"""
+        with self._lock:
+            if self._idle:
+                return PooledConnection(self, self._idle.pop())
+            self.opened += 1
+        return PooledConnection(self, self.connect())
+
+    def release(self, conn):
+        conn.set_progress_handler(None, 0)
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            if not self._closed and len(self._idle) < self.size:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+    def describe(self):
+        mode = "WAL" if self.is_wal else f"journal={self.journal_mode} (readers block writers)"
+        return f"{'read-only' if self.read_only else 'read-write'}, {mode}, pool {self.size}"
+
+
+def measure_pragmas(pool, sql, repeat=2):
+    """Время запроса без PRAGMA, с каждой PRAGMA по отдельности и со всеми.
+
+    Каждый вариант выполняется на новом соединении repeat раз; берётся
+    лучшее время (первый проход прогревает кэш ОС). Возвращает строки
+    (settings, best_ms, rows).
+    """
+    variants = [("none (SQLite defaults)", {})]
+    variants += [(f"{name} = {value}", {name: value}) for name, value in pool.pragmas.items()]
+    variants.append(("all configured", pool.pragmas))
+    results = []
+    for label, pragmas in variants:
+        conn = pool.connect(pragmas)
+        best = None
+        count = 0
+        try:
+            for _ in range(repeat):
+                start = time.perf_counter()
+                count = sum(1 for _ in conn.execute(sql))
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+        finally:
+            conn.close()
+        results.append((label, round(best * 1000, 2), count))
+    return results
@@ -0,0 +1,141 @@
+"""Прореживание временных рядов для графиков.
+
+- minmax — для каждого пикселя по x оставляет минимум и максимум: пики
+  не теряются, на экран уходит не больше 2 точек на пиксель. Работает за
+  O(n) векторно (NumPy), поэтому годится для миллионов точек.
+- MinMaxPyramid — min/max заранее посчитаны по блокам точек, поэтому
+  зум и изменение размера прореживают несколько тысяч блоков, а не весь
+  ряд.
+
+xs должны быть отсортированы по возрастанию.
+"""
+try:
+    import numpy as np
+except ImportError:  # NumPy необязателен
+    np = None
+
+
+def visible_slice(xs, x0, x1):
+    """Границы [lo, hi) точек с x0 <= x <= x1 (с одной точкой запаса с каждой стороны)"""
+    if np is not None:
+        lo = int(np.searchsorted(xs, x0, side="left"))
+        hi = int(np.searchsorted(xs, x1, side="right"))
+    else:
+        from bisect import bisect_left, bisect_right
+        lo = bisect_left(xs, x0)
+        hi = bisect_right(xs, x1)
+    return max(lo - 1, 0), min(hi + 1, len(xs))
+
+
+def minmax(xs, ys, x0, x1, width):
+    """([x], [y]) не более чем из 2 точек на каждый из width пикселей"""
+    n = len(xs)
+    if n == 0 or width <= 0:
+        return [], []
+    span = (x1 - x0) or 1.0
+    if np is not None:
+        xs = np.asarray(xs, dtype=float)
+        ys = np.asarray(ys, dtype=float)
+        # номер пикселя каждой точки; xs отсортированы, значит и pixels тоже
+        pixels = np.clip(((xs - x0) / span * width).astype(np.int64), 0, width - 1)
+        starts = np.flatnonzero(np.diff(pixels, prepend=-1))
+        lows = np.minimum.reduceat(ys, starts)
+        highs = np.maximum.reduceat(ys, starts)
+        argmin_first = _argmin_first(ys, starts, lows, highs)
+        px = (pixels[starts] + 0.5) / width * span + x0
+        # порядок min/max внутри пикселя сохраняем, чтобы линия не «перекрещивалась»
+        first = np.where(argmin_first, lows, highs)
+        second = np.where(argmin_first, highs, lows)
+        out_x = np.repeat(px, 2)
+        out_y = np.empty(2 * len(starts))
+        out_y[0::2] = first
+        out_y[1::2] = second
+        return out_x, out_y
+    # пиксель -> [min, max, позиция первого min, позиция первого max]
+    buckets = {}
+    order = []
+    for i, (x, y) in enumerate(zip(xs, ys)):
+        p = min(max(int((x - x0) / span * width), 0), width - 1)
+        b = buckets.get(p)
+        if b is None:
+            buckets[p] = [y, y, i, i]
+            order.append(p)
+        else:
+            if y < b[0]:
+                b[0], b[2] = y, i
+            if y > b[1]:
+                b[1], b[3] = y, i
+    out_x, out_y = [], []
+    for p in order:
+        low, high, low_pos, high_pos = buckets[p]
+        x = (p + 0.5) / width * span + x0
+        out_x += [x, x]
+        # как _argmin_first в ветке NumPy: минимум первым, если встретился не позже
+        out_y += [low, high] if low_pos <= high_pos else [high, low]
+    return out_x, out_y
+
+
+def _argmin_first(ys, starts, lows, highs):
+    """Для каждой корзины: встречается ли минимум не позже максимума"""
+    sizes = np.diff(np.append(starts, len(ys)))
+    idx = np.arange(len(ys))
+    big = len(ys)
+    # позиции первого минимума/максимума внутри корзин без цикла по точкам
+    low_pos = np.minimum.reduceat(np.where(ys == np.repeat(lows, sizes), idx, big), starts)
+    high_pos = np.minimum.reduceat(np.where(ys == np.repeat(highs, sizes), idx, big), starts)
+    return low_pos <= high_pos
+
+
+class MinMaxPyramid:
+    """Ряд с заранее посчитанными min/max по блокам из 16, 256, 4096… точек.
+
+    points() выбирает самый крупный уровень, у которого на пиксель всё ещё
+    приходится несколько блоков, и прореживает уже его — поэтому
+    перерисовка при зуме и изменении размера стоит O(ширина в пикселях),
+    а не O(число точек). Небольшие окна рисуются как есть.
+    """
+
+    BLOCK = 16
+    # до стольких точек на пиксель линия рисуется без прореживания
+    RAW_LIMIT = 4
+
+    def __init__(self, xs, ys):
+        self.xs = np.asarray(xs, dtype=float) if np is not None else list(xs)
+        self.ys = np.asarray(ys, dtype=float) if np is not None else list(ys)
+        self.levels = []            # [(block, xs, ys)] по две точки на блок
+        if np is None:
+            return
+        block = self.BLOCK
+        while len(self.xs) // block >= 1024:
+            starts = np.arange(0, len(self.xs), block)
+            lows = np.minimum.reduceat(self.ys, starts)
+            highs = np.maximum.reduceat(self.ys, starts)
+            level_y = np.empty(2 * len(starts))
+            level_y[0::2] = lows
+            level_y[1::2] = highs
+            self.levels.append((block, np.repeat(self.xs[starts], 2), level_y))
+            block *= 16
+
+    def __len__(self):
+        return len(self.xs)
+
+    def bounds(self):
+        """(x_min, x_max, y_min, y_max) всего ряда"""
+        if not len(self.xs):
+            return 0.0, 1.0, 0.0, 1.0
+        return self.xs[0], self.xs[-1], min(self.ys), max(self.ys)
+
+    def points(self, x0, x1, width):
+        """([x], [y], исходных точек в окне) для окна [x0, x1] шириной width пикселей"""
+        lo, hi = visible_slice(self.xs, x0, x1)
+        n = hi - lo
+        xs, ys = self.xs[lo:hi], self.ys[lo:hi]
+        if n <= self.RAW_LIMIT * width:
+            return xs, ys, n
+        for block, level_x, level_y in reversed(self.levels):
+            if n / block >= 4 * width:
+                a, b = visible_slice(level_x, x0, x1)
+                xs, ys = level_x[a:b], level_y[a:b]
+                break
+        out_x, out_y = minmax(xs, ys, x0, x1, width)
+        return out_x, out_y, n
@@ -0,0 +1,195 @@
+"""Потоковый экспорт результата запроса в CSV или Parquet.
+
+Строки читаются из курсора порциями fetchmany и сразу пишутся в файл,
+поэтому память не зависит от размера результата (10M заказов
+экспортируются так же, как 100). Parquet доступен, только если
+установлен pyarrow. Файл пишется под временным именем и переименовывается
+в конце, так что прерванный экспорт не оставляет полуфайл.
+
+Схема Parquet задаётся до первой порции и в файле уже не меняется, а в
+SQLite тип есть у значения, а не у колонки: первые 50 000 строк могут
+быть NULL или int, а дальше встретится str. Поэтому типы колонок берутся
+из отдельного прохода запроса с typeof() (column_kinds), а каждая
+порция приводится к этой схеме.
+"""
+import csv
+import os
+import time
+from importlib.util import find_spec
+
+# pyarrow необязателен и импортируется только при экспорте в Parquet:
+# сам импорт занимает сотни миллисекунд и замедлял бы запуск окна
+HAVE_PYARROW = find_spec("pyarrow") is not None
+
+FORMATS = {"csv": "CSV (*.csv)", "parquet": "Parquet (*.parquet)"}
+
+# классы хранения SQLite (typeof) -> типы значений, которые вернёт sqlite3
+_STORAGE_TYPES = {"integer": int, "real": float, "text": str, "blob": bytes}
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+def available_formats():
+    return [f for f in FORMATS if f != "parquet" or HAVE_PYARROW]
+
+
+def format_for_path(path):
+    """Формат по расширению файла (по умолчанию CSV)"""
+    return "parquet" if path.lower().endswith(".parquet") else "csv"
+
+
+def _chunks(cursor, chunk_size, progress, should_stop):
+    written = 0
+    started = time.perf_counter()
+    while True:
+        if should_stop is not None and should_stop():
+            raise ExportCancelled()
+        chunk = cursor.fetchmany(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+        written += len(chunk)
+        if progress is not None:
+            progress(written, time.perf_counter() - started)
+
+
+def _write_csv(path, columns, chunks):
+    count = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for chunk in chunks:
+            writer.writerows(chunk)
+            count += len(chunk)
+    return count
+
+
+def column_kinds(conn, sql, params=()):
+    """Типы значений в каждой колонке результата sql: [{int, float, str, bytes}].
+
+    Отдельный проход запроса (без сортировки и выдачи строк); для
+    согласованности с экспортом — в той же транзакции чтения.
+    """
+    # перевод строки — на случай комментария «--» в конце sql
+    sql = sql.strip().rstrip(";")
+    count = len(conn.execute(f"SELECT * FROM ({sql}\n) LIMIT 0", params).description or ())
+    if not count:
+        return []
+    names = [f"c{i}" for i in range(count)]
+    row = conn.execute(
+        f"WITH q({', '.join(names)}) AS ({sql}\n) SELECT "
+        + ", ".join(f"group_concat(DISTINCT typeof({name}))" for name in names)
+        + " FROM q", params).fetchone()
+    return [{_STORAGE_TYPES[t] for t in (found or "").split(",") if t in _STORAGE_TYPES}
+            for found in row]
+
+
+def _value_kinds(rows):
+    """То же, что column_kinds, по уже прочитанным строкам"""
+    return [{type(v) for v in col if v is not None} for col in zip(*rows)]
+
+
+def _arrow_type(pa, kinds):
+    """Тип колонки Parquet по типам её значений"""
+    if not kinds:
+        return pa.string()
+    if kinds <= {int}:
+        return pa.int64()
+    if kinds <= {int, float}:
+        return pa.float64()
+    if kinds <= {bytes}:
+        return pa.binary()
+    return pa.string()
+
+
+def _cast(pa, arrow_type, values):
+    """Значения порции под тип колонки схемы"""
+    if arrow_type == pa.string():
+        return [v if v is None or isinstance(v, str) else str(v) for v in values]
+    if arrow_type == pa.float64():
+        return [v if v is None or isinstance(v, float) else float(v) for v in values]
+    return values
+
+
+def _write_parquet(path, columns, chunks, kinds=None):
+    """kinds — типы значений колонок (column_kinds); None — по первой порции"""
+    if not HAVE_PYARROW:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    count = 0
+    writer = None
+    schema = None
+    if kinds is not None:
+        schema = pa.schema([(name, _arrow_type(pa, k)) for name, k in zip(columns, kinds)])
+    try:
+        for chunk in chunks:
+            if schema is None:
+                schema = pa.schema([(name, _arrow_type(pa, k))
+                                    for name, k in zip(columns, _value_kinds(chunk))])
+            if writer is None:
+                writer = pq.ParquetWriter(path, schema)
+            arrays = [pa.array(_cast(pa, field.type, col), type=field.type)
+                      for field, col in zip(schema, zip(*chunk))]
+            # каждая порция — отдельная row group, в памяти только она
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            count += len(chunk)
+        if writer is None:
+            if schema is None:
+                schema = pa.schema([(name, pa.string()) for name in columns])
+            writer = pq.ParquetWriter(path, schema)
+    finally:
+        if writer is not None:
+            writer.close()
+    return count
+
+
+def export_cursor(cursor, path, fmt=None, chunk_size=50_000, progress=None, should_stop=None,
+                  kinds=None):
+    """Выписать всё, что осталось в курсоре, в path. Возвращает число строк.
+
+    progress(rows, seconds) вызывается после каждой порции;
+    should_stop() == True прерывает экспорт (ExportCancelled).
+    kinds — типы колонок для схемы Parquet (см. column_kinds).
+    """
+    fmt = fmt or format_for_path(path)
+    columns = [d[0] for d in cursor.description] if cursor.description else []
+    chunks = _chunks(cursor, chunk_size, progress, should_stop)
+    tmp = path + ".part"
+    try:
+        if fmt == "parquet":
+            count = _write_parquet(tmp, columns, chunks, kinds)
+        else:
+            count = _write_csv(tmp, columns, chunks)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    return count
+
+
+class _RowsCursor:
+    """Уже прочитанные строки с интерфейсом курсора (для вкладок без SQL)"""
+
+    def __init__(self, columns, rows):
+        self.description = [(c,) for c in columns]
+        self._rows = rows
+        self._pos = 0
+
+    def fetchmany(self, size):
+        chunk = self._rows[self._pos:self._pos + size]
+        self._pos += len(chunk)
+        return chunk
+
+
+def export_rows(columns, rows, path, fmt=None, **kwargs):
+    """Экспорт небольшого результата, который уже есть в памяти"""
+    rows = list(rows)
+    if (fmt or format_for_path(path)) == "parquet":
+        kwargs.setdefault("kinds", _value_kinds(rows) if rows else None)
+    return export_cursor(_RowsCursor(columns, rows), path, fmt, **kwargs)
@@ -0,0 +1,109 @@
+from PyQt5.QtCore import Qt, pyqtSignal
+from PyQt5.QtWidgets import QHeaderView, QLineEdit
+
+
+class FilterHeader(QHeaderView):
+    """Горизонтальный заголовок с сортировкой по клику и полем фильтра под
+    каждой колонкой.
+
+    Сам ничего не сортирует и не фильтрует: хранит выбранную сортировку и
+    тексты фильтров и сообщает об изменениях сигналом viewChanged, а окно
+    перезапускает запрос с ORDER BY/WHERE (см. queries.wrap_view).
+    """
+
+    viewChanged = pyqtSignal()
+
+    PADDING = 4
+
+    def __init__(self, table_view):
+        super().__init__(Qt.Horizontal, table_view)
+        self._editors = []
+        self._columns = []
+        self.sort = None            # (колонка, "ASC" | "DESC") или None
+        self.setSectionsClickable(True)
+        self.setSortIndicatorShown(False)
+        self.setDefaultAlignment(Qt.AlignLeft | Qt.AlignVCenter)
+        self.sectionClicked.connect(self._on_section_clicked)
+        self.sectionResized.connect(self._place_editors)
+        table_view.horizontalScrollBar().valueChanged.connect(self._place_editors)
+
+    def set_columns(self, columns):
+        """Поля фильтров под колонки нового результата; тексты сохраняются по имени"""
+        columns = list(columns)
+        if columns == self._columns:
+            self._show_sort()
+            return
+        texts = self.filters()
+        for editor in self._editors:
+            editor.deleteLater()
+        self._editors = []
+        self._columns = columns
+        for name in columns:
+            editor = QLineEdit(self)
+            editor.setPlaceholderText("filter")
+            editor.setToolTip("text — contains, 100 / =100, >100, <=100, !=0, 10..20, NULL")
+            editor.setText(texts.get(name, ""))
+            editor.returnPressed.connect(self.viewChanged.emit)
+            editor.show()
+            self._editors.append(editor)
+        if self.sort is not None and self.sort[0] not in columns:
+            self.sort = None
+        self.updateGeometries()
+        self._show_sort()
+
+    def filters(self):
+        """{колонка: текст фильтра} для непустых полей"""
+        return {name: e.text().strip() for name, e in zip(self._columns, self._editors)
+                if e.text().strip()}
+
+    def clear_view(self):
+        """Сбросить сортировку и фильтры (без перезапроса)"""
+        self.sort = None
+        for editor in self._editors:
+            editor.clear()
+        self._show_sort()
+
+    def _on_section_clicked(self, index):
+        if not 0 <= index < len(self._columns):
+            return
+        name = self._columns[index]
+        # первый клик — по возрастанию, второй — по убыванию, третий — исходный порядок
+        if self.sort is None or self.sort[0] != name:
+            self.sort = (name, "ASC")
+        elif self.sort[1] == "ASC":
+            self.sort = (name, "DESC")
+        else:
+            self.sort = None
+        self._show_sort()
+        self.viewChanged.emit()
+
+    def _show_sort(self):
+        if self.sort is None:
+            self.setSortIndicatorShown(False)
+            return
+        self.setSortIndicatorShown(True)
+        order = Qt.AscendingOrder if self.sort[1] == "ASC" else Qt.DescendingOrder
+        self.setSortIndicator(self._columns.index(self.sort[0]), order)
+
+    def _editor_height(self):
+        return self._editors[0].sizeHint().height() if self._editors else 0
+
+    def sizeHint(self):
+        size = super().sizeHint()
+        if self._editors:
+            size.setHeight(size.height() + self._editor_height() + self.PADDING)
+        return size
+
+    def updateGeometries(self):
+        # место под поля фильтров — нижнее поле заголовка
+        extra = self._editor_height() + self.PADDING if self._editors else 0
+        self.setViewportMargins(0, 0, 0, extra)
+        super().updateGeometries()
+        self._place_editors()
+
+    def _place_editors(self, *args):
+        height = self._editor_height()
+        top = super().sizeHint().height() + self.PADDING // 2
+        for index, editor in enumerate(self._editors):
+            editor.move(self.sectionViewportPosition(index) + 1, top)
+            editor.resize(max(self.sectionSize(index) - 2, 0), height)
@@ -1,134 +1,458 @@
+import argparse
+import os
 import sqlite3
-from random import choice, randint, uniform
+import time
+from urllib.parse import quote
+
+import rollups
+import shards
+import summaries
+from random import Random
 from datetime import datetime, timedelta
 
 
-def init_db():
-    conn = sqlite3.connect("crm.db")
+# Справочники по умолчанию; при --users/--customers/--products N больше
+# этих списков недостающие строки генерируются по шаблону
+USERS = [
+    ("Alice Brown", "manager", 1200, "London"),
+    ("Bob Stone", "manager", 1100, "Paris"),
+    ("Charlie Ray", "analyst", 1500, "Berlin"),
+    ("Diana Key", "admin", 1800, "New York"),
+    ("Edward Black", "manager", 1300, "Tokyo"),
+]
+
+CUSTOMERS = [
+    ("ACME Corp", "USA", "business"),
+    ("Zenit LLC", "Germany", "business"),
+    ("Kohan Ltd", "Japan", "business"),
+    ("Maria Gomez", "Spain", "private"),
+    ("Ivan Petrov", "Russia", "private"),
+    ("Liu Wei", "China", "private")
+]
+
+PRODUCTS = [
+    ("Laptop Pro 15", "electronics", 1200.0),
+    ("Laptop Air 13", "electronics", 800.0),
+    ("Office Chair", "furniture", 150.0),
+    ("Desk Wood", "furniture", 300.0),
+    ("Monitor 27", "electronics", 350.0),
+    ("Keyboard", "electronics", 40.0)
+]
+
+CITIES = ["London", "Paris", "Berlin", "New York", "Tokyo", "Madrid", "Moscow", "Beijing"]
+COUNTRIES = ["USA", "Germany", "Japan", "Spain", "Russia", "China", "France", "UK", "Brazil", "India"]
+CATEGORIES = ["electronics", "furniture", "office", "software", "accessories"]
+
+
+def make_users(n, rng):
+    rows = USERS[:n]
+    for i in range(len(rows), n):
+        rows.append((f"Manager {i + 1}", "manager", rng.randint(900, 2500), rng.choice(CITIES)))
+    return rows
+
+
+def make_customers(n, rng):
+    rows = CUSTOMERS[:n]
+    for i in range(len(rows), n):
+        rows.append((f"Customer {i + 1}", rng.choice(COUNTRIES),
+                     rng.choice(("business", "private"))))
+    return rows
+
+
+def make_products(n, rng):
+    rows = PRODUCTS[:n]
+    for i in range(len(rows), n):
+        rows.append((f"Product {i + 1}", rng.choice(CATEGORIES),
+                     round(rng.uniform(5, 2000), 2)))
+    return rows
+
+
+# Индексы под запросы CRM Viewer:
+# - idx_orders_date_id покрывает SELECT * / bt1 / ComboBox с ORDER BY
+#   date DESC, id DESC, поэтому первые строки отдаются без сортировки всей
+#   таблицы; id стоит сразу после date, чтобы постраничный переход по
+#   ключу (date, id) был поиском по индексу, а не перебором внутри дня;
+# - idx_orders_customer и idx_orders_user — покрывающие для агрегатов
+#   по клиентам/странам (bt2) и по менеджерам;
+# - idx_orders_amount — сортировка Tab1/Tab2 по amount из заголовка
+#   отдаёт первые строки без сортировки всей таблицы;
+# - idx_order_items_product — покрывающий для bt3 (product_id, qty),
+#   idx_order_items_order_product — для перехода от заказа к его позициям;
+#   покрывающий, чтобы bt3 за диапазон дат не читал саму order_items.
+INDEXES = """
+DROP INDEX IF EXISTS idx_orders_date;
+CREATE INDEX IF NOT EXISTS idx_orders_date_id ON orders(date, id, customer_id, user_id, amount);
+CREATE INDEX IF NOT EXISTS idx_orders_customer ON orders(customer_id, amount);
+CREATE INDEX IF NOT EXISTS idx_orders_user ON orders(user_id, amount);
+CREATE INDEX IF NOT EXISTS idx_orders_amount ON orders(amount);
+DROP INDEX IF EXISTS idx_order_items_order;
+CREATE INDEX IF NOT EXISTS idx_order_items_order_product ON order_items(order_id, product_id, qty);
+CREATE INDEX IF NOT EXISTS idx_order_items_product ON order_items(product_id, qty);
+"""
+
+
+# Режим массовой загрузки: база создаётся с нуля, поэтому журнал и
+# fsync не нужны — при сбое её проще сгенерировать заново
+BULK_PRAGMAS = """
+PRAGMA journal_mode = OFF;
+PRAGMA synchronous = OFF;
+PRAGMA locking_mode = EXCLUSIVE;
+PRAGMA temp_store = MEMORY;
+"""
+# кэш страниц массовой загрузки, КиБ
+BULK_CACHE_KIB = 262144
+# у init_shards открыто соединение на каждый месяц (заказы идут вперемешку
+# по датам): 256 МБ на каждое при --days 730 дали бы гигабайты
+SHARD_CACHE_KIB = 8192
+
+# Справочники и заказы отдельно: при помесячном хранении (shards.py)
+# справочники лежат в dims.db, а заказы и позиции — в файле месяца
+DIMS_SCHEMA = """
+DROP TABLE IF EXISTS products;
+DROP TABLE IF EXISTS customers;
+DROP TABLE IF EXISTS users;
+
+CREATE TABLE users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT,
+    role TEXT,
+    salary INTEGER,
+    city TEXT
+);
+
+CREATE TABLE customers (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT,
+    country TEXT,
+    segment TEXT
+);
+
+CREATE TABLE products (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT,
+    category TEXT,
+    price REAL
+);
+"""
+
+ORDERS_SCHEMA = """
+DROP TABLE IF EXISTS order_items;
+DROP TABLE IF EXISTS orders;
+
+CREATE TABLE orders (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    customer_id INTEGER,
+    user_id INTEGER,
+    amount REAL,
+    date TEXT,
+    FOREIGN KEY(customer_id) REFERENCES customers(id),
+    FOREIGN KEY(user_id) REFERENCES users(id)
+);
+
+CREATE TABLE order_items (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    order_id INTEGER,
+    product_id INTEGER,
+    qty INTEGER,
+    FOREIGN KEY(order_id) REFERENCES orders(id),
+    FOREIGN KEY(product_id) REFERENCES products(id)
+);
+"""
+
+
+def _bulk_connect(db_path, cache_kib=BULK_CACHE_KIB):
+    conn = sqlite3.connect(db_path, isolation_level=None, uri=True)
+    conn.executescript(BULK_PRAGMAS)
+    conn.execute(f"PRAGMA cache_size = -{cache_kib}")
+    return conn
+
+
+def _finish(conn):
+    # дальше база работает в режиме WAL: открытый курсор просмотрщика
+    # не блокирует запись новых заказов
+    conn.execute("PRAGMA locking_mode = NORMAL")
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.close()
+
+
+def create_indexes(conn):
+    """Миграция: добавить индексы (если их ещё нет) и обновить статистику"""
+    conn.executescript(INDEXES)
+    # analysis_limit ограничивает ANALYZE выборкой, иначе на 10M строк он долгий
+    conn.execute("PRAGMA analysis_limit = 1000")
+    conn.execute("ANALYZE")
+    conn.commit()
+
+
+def migrate(db_path="crm.db"):
+    """Применить индексы к уже существующей базе без пересоздания данных и включить WAL"""
+    conn = sqlite3.connect(db_path)
+    start = time.perf_counter()
+    create_indexes(conn)
+    if not summaries.is_installed(conn):
+        summaries.install(conn)
+    conn.isolation_level = None
+    if rollups.is_installed(conn):
+        # заказы, добавленные после прошлой свёртки
+        rollups.refresh(conn)
+    else:
+        rollups.install(conn)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.close()
+    print(f"Индексы и сводные таблицы в {db_path} созданы за {time.perf_counter() - start:.1f} с.")
+
+
+def fill_dimensions(cursor, rng, users, customers, products):
+    """Заполнить users, customers, products; возвращает строки товаров"""
+    cursor.executemany("INSERT INTO users (name, role, salary, city) VALUES (?,?,?,?)",
+                       make_users(users, rng))
+    cursor.executemany("INSERT INTO customers (name, country, segment) VALUES (?,?,?)",
+                       make_customers(customers, rng))
+    product_rows = make_products(products, rng)
+    cursor.executemany("INSERT INTO products (name, category, price) VALUES (?,?,?)", product_rows)
+    return product_rows
+
+
+def generate_orders(rng, orders, customers, users, product_rows, days, batch_size):
+    """Пачки (order_rows, item_rows) по batch_size заказов.
+
+    orders.amount считается сразу при генерации по ценам товаров из памяти.
+    """
+    # цены в памяти вместо SELECT price FROM products WHERE id=? на каждую позицию
+    prices = [None] + [p[2] for p in product_rows]
+    products = len(product_rows)
+
+    # случайная дата в пределах последних `days` дней
+    today = datetime.now()
+    dates = [(today - timedelta(days=d)).strftime("%Y-%m-%d") for d in range(1, days + 1)]
+
+    # генерация в Python — узкое место, поэтому вместо randint/choice
+    # используем random() напрямую и локальные ссылки на функции
+    rand = rng.random
+    n_dates = len(dates)
+
+    item_id = 0
+    for first in range(1, orders + 1, batch_size):
+        last = min(first + batch_size, orders + 1)
+        order_rows = []
+        item_rows = []
+        add_item = item_rows.append
+        for order_id in range(first, last):
+            # создаём 1–5 позиций на каждый заказ и сразу считаем сумму
+            total_amount = 0
+            for _ in range(int(rand() * 5) + 1):
+                prod = int(rand() * products) + 1
+                qty = int(rand() * 5) + 1
+                total_amount += prices[prod] * qty
+                item_id += 1
+                add_item((item_id, order_id, prod, qty))
+            order_rows.append((order_id, int(rand() * customers) + 1, int(rand() * users) + 1,
+                               round(total_amount, 2), dates[int(rand() * n_dates)]))
+        yield order_rows, item_rows
+
+
+def _insert_orders(cursor, order_rows, item_rows):
+    cursor.executemany(
+        "INSERT INTO orders (id, customer_id, user_id, amount, date) VALUES (?,?,?,?,?)",
+        order_rows
+    )
+    cursor.executemany(
+        "INSERT INTO order_items (id, order_id, product_id, qty) VALUES (?,?,?,?)",
+        item_rows
+    )
+
+
+def _progress(order_rows, orders, total_items, start):
+    elapsed = time.perf_counter() - start
+    done = order_rows[-1][0]
+    print(f"  {done:,} / {orders:,} orders, {total_items:,} items "
+          f"({(done + total_items) / elapsed:,.0f} rows/sec)")
+
+
+def init_db(db_path="crm.db", orders=50, customers=len(CUSTOMERS), products=len(PRODUCTS),
+            users=len(USERS), seed=None, days=120, batch_size=20000, verbose=False):
+    """Создать crm.db и заполнить её данными.
+
+    Заказы и позиции генерируются пачками по batch_size заказов и
+    вставляются через executemany в одной транзакции; цены товаров берутся
+    из памяти, а orders.amount считается сразу при генерации.
+    """
+    rng = Random(seed)
+    conn = _bulk_connect(db_path)
     cursor = conn.cursor()
 
     # ----------------- CREATE TABLES -----------------
     cursor.executescript("""
-    DROP TABLE IF EXISTS order_items;
-    DROP TABLE IF EXISTS orders;
-    DROP TABLE IF EXISTS products;
-    DROP TABLE IF EXISTS customers;
-    DROP TABLE IF EXISTS users;
-
-    CREATE TABLE users (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT,
-        role TEXT,
-        salary INTEGER,
-        city TEXT
-    );
-
-    CREATE TABLE customers (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT,
-        country TEXT,
-        segment TEXT
-    );
-
-    CREATE TABLE products (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT,
-        category TEXT,
-        price REAL
-    );
-
-    CREATE TABLE orders (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        customer_id INTEGER,
-        user_id INTEGER,
-        amount REAL,
-        date TEXT,
-        FOREIGN KEY(customer_id) REFERENCES customers(id),
-        FOREIGN KEY(user_id) REFERENCES users(id)
-    );
-
-    CREATE TABLE order_items (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        order_id INTEGER,
-        product_id INTEGER,
-        qty INTEGER,
-        FOREIGN KEY(order_id) REFERENCES orders(id),
-        FOREIGN KEY(product_id) REFERENCES products(id)
-    );
-    """)
-
-    # ----------------- FILL USERS -----------------
-    users = [
-        ("Alice Brown", "manager", 1200, "London"),
-        ("Bob Stone", "manager", 1100, "Paris"),
-        ("Charlie Ray", "analyst", 1500, "Berlin"),
-        ("Diana Key", "admin", 1800, "New York"),
-        ("Edward Black", "manager", 1300, "Tokyo"),
-    ]
-    cursor.executemany("INSERT INTO users (name, role, salary, city) VALUES (?,?,?,?)", users)
-
-    # ----------------- FILL CUSTOMERS -----------------
-    customers = [
-        ("ACME Corp", "USA", "business"),
-        ("Zenit LLC", "Germany", "business"),
-        ("Kohan Ltd", "Japan", "business"),
-        ("Maria Gomez", "Spain", "private"),
-        ("Ivan Petrov", "Russia", "private"),
-        ("Liu Wei", "China", "private")
-    ]
-    cursor.executemany("INSERT INTO customers (name, country, segment) VALUES (?,?,?)", customers)
-
-    # ----------------- FILL PRODUCTS -----------------
-    products = [
-        ("Laptop Pro 15", "electronics", 1200.0),
-        ("Laptop Air 13", "electronics", 800.0),
-        ("Office Chair", "furniture", 150.0),
-        ("Desk Wood", "furniture", 300.0),
-        ("Monitor 27", "electronics", 350.0),
-        ("Keyboard", "electronics", 40.0)
-    ]
-    cursor.executemany("INSERT INTO products (name, category, price) VALUES (?,?,?)", products)
-
-    # ----------------- GENERATE ORDERS -----------------
-    user_ids = [1, 2, 3, 4, 5]
-    customer_ids = [1, 2, 3, 4, 5, 6]
-    product_ids = [1, 2, 3, 4, 5, 6]
-
-    for _ in range(50):  # 50 заказов
-        cust = choice(customer_ids)
-        user = choice(user_ids)
-
-        # случайная дата в пределах последних 120 дней
-        date = datetime.now() - timedelta(days=randint(1, 120))
-        date_str = date.strftime("%Y-%m-%d")
-
-        cursor.execute(
-            "INSERT INTO orders (customer_id, user_id, amount, date) VALUES (?,?,?,?)",
-            (cust, user, 0, date_str)
-        )
-        order_id = cursor.lastrowid
-
-        # создаём 1–5 позиций на каждый заказ
-        total_amount = 0
-        for _ in range(randint(1, 5)):
-            prod = choice(product_ids)
-            qty = randint(1, 5)
-            cursor.execute("SELECT price FROM products WHERE id=?", (prod,))
-            price = cursor.fetchone()[0]
-            total_amount += price * qty
-
-            cursor.execute(
-                "INSERT INTO order_items (order_id, product_id, qty) VALUES (?,?,?)",
-                (order_id, prod, qty)
-            )
-
-        # обновляем сумму заказа
-        cursor.execute("UPDATE orders SET amount=? WHERE id=?", (round(total_amount, 2), order_id))
+    DROP TABLE IF EXISTS revenue_rollup;
+    DROP TABLE IF EXISTS rollup_state;
+    DROP TABLE IF EXISTS country_revenue;
+    DROP TABLE IF EXISTS product_sales;
+    """ + ORDERS_SCHEMA + DIMS_SCHEMA)
 
-    conn.commit()
-    conn.close()
-    print("База данных crm.db успешно создана.")
+    cursor.execute("BEGIN")
+    product_rows = fill_dimensions(cursor, rng, users, customers, products)
+
+    start = time.perf_counter()
+    total_items = 0
+    for order_rows, item_rows in generate_orders(rng, orders, customers, users, product_rows,
+                                                 days, batch_size):
+        _insert_orders(cursor, order_rows, item_rows)
+        total_items += len(item_rows)
+        if verbose:
+            _progress(order_rows, orders, total_items, start)
+
+    cursor.execute("COMMIT")
+    # индексы строим после загрузки: так быстрее, чем обновлять их на каждой вставке
+    create_indexes(conn)
+    # сводные таблицы для bt2/bt3 заполняем одним проходом, затем вешаем триггеры
+    summaries.install(conn)
+    # выручка по дням/неделям/месяцам для вкладки Analytics (rollups.py)
+    rollups.install(conn)
+    _finish(conn)
+    elapsed = time.perf_counter() - start
+
+    rows = orders + total_items
+    print(f"База данных {db_path} успешно создана: {orders:,} заказов, {total_items:,} позиций "
+          f"за {elapsed:.1f} с ({rows / max(elapsed, 1e-9):,.0f} строк/с).")
+
+
+def _clear_shards(root):
+    """Удалить dims.db и файлы месяцев прошлой генерации (с WAL)"""
+    for name in os.listdir(root):
+        if name.startswith(shards.DIMS_FILE) or shards.SHARD_FILE.match(name):
+            os.remove(os.path.join(root, name))
+
+
+def init_shards(root="crm_shards", orders=50, customers=len(CUSTOMERS), products=len(PRODUCTS),
+                users=len(USERS), seed=None, days=120, batch_size=20000, verbose=False):
+    """То же, что init_db, но в каталог root: dims.db и файл на каждый месяц (shards.py).
+
+    Сводные таблицы и revenue_rollup здесь не создаются: их триггеры
+    работают только внутри одного файла.
+    """
+    os.makedirs(root, exist_ok=True)
+    _clear_shards(root)
+    rng = Random(seed)
+    dims = _bulk_connect(os.path.join(root, shards.DIMS_FILE))
+    dims.executescript(DIMS_SCHEMA)
+    dims.execute("BEGIN")
+    product_rows = fill_dimensions(dims.cursor(), rng, users, customers, products)
+    dims.execute("COMMIT")
+    _finish(dims)
+
+    start = time.perf_counter()
+    months = {}
+    total_items = 0
+    for order_rows, item_rows in generate_orders(rng, orders, customers, users, product_rows,
+                                                 days, batch_size):
+        # каждый заказ — в файл своего месяца, позиции — туда же, где заказ
+        month_of = {}
+        batches = {}
+        for row in order_rows:
+            month = row[4][:7]
+            month_of[row[0]] = month
+            batches.setdefault(month, ([], []))[0].append(row)
+        for item in item_rows:
+            batches[month_of[item[1]]][1].append(item)
+        for month, (month_orders, month_items) in batches.items():
+            conn = months.get(month)
+            if conn is None:
+                conn = months[month] = _bulk_connect(os.path.join(root, shards.shard_name(month)),
+                                                     SHARD_CACHE_KIB)
+                conn.executescript(ORDERS_SCHEMA)
+                conn.execute("BEGIN")
+            _insert_orders(conn.cursor(), month_orders, month_items)
+        total_items += len(item_rows)
+        if verbose:
+            _progress(order_rows, orders, total_items, start)
+
+    for conn in months.values():
+        conn.execute("COMMIT")
+        # индексы строятся по одному месяцу, и файл сразу закрывается —
+        # здесь большой кэш нужен только одному соединению
+        conn.execute(f"PRAGMA cache_size = -{BULK_CACHE_KIB}")
+        create_indexes(conn)
+        _finish(conn)
+    elapsed = time.perf_counter() - start
+    rows = orders + total_items
+    print(f"Каталог {root} создан: {len(months)} мес., {orders:,} заказов, {total_items:,} позиций "
+          f"за {elapsed:.1f} с ({rows / max(elapsed, 1e-9):,.0f} строк/с).")
+
+
+def _attach_source(conn, source):
+    # исходную базу (она в WAL) только читаем: EXCLUSIVE из BULK_PRAGMAS
+    # распространился бы и на неё, поэтому перед ATTACH возвращаем NORMAL;
+    # main свою эксклюзивную блокировку при этом не отпускает
+    conn.execute("PRAGMA locking_mode = NORMAL")
+    conn.execute("ATTACH DATABASE ? AS src", (f"file:{quote(source)}?mode=ro",))
+
+
+def create_dims(db_path, source):
+    """dims.db из справочников готовой базы source (для shards.split)"""
+    conn = _bulk_connect(db_path)
+    conn.executescript(DIMS_SCHEMA)
+    _attach_source(conn, source)
+    conn.execute("BEGIN")
+    for table in ("users", "customers", "products"):
+        conn.execute(f"INSERT INTO main.{table} SELECT * FROM src.{table}")
+    conn.execute("COMMIT")
+    conn.execute("DETACH DATABASE src")
+    _finish(conn)
+
+
+def create_shard(db_path, source, date_from, date_to):
+    """Файл месяца: заказы source за [date_from, date_to] и их позиции. Возвращает число заказов"""
+    conn = _bulk_connect(db_path)
+    conn.executescript(ORDERS_SCHEMA)
+    _attach_source(conn, source)
+    conn.execute("BEGIN")
+    count = conn.execute("INSERT INTO main.orders SELECT * FROM src.orders "
+                         "WHERE date BETWEEN ? AND ?", (date_from, date_to)).rowcount
+    conn.execute("""
+        INSERT INTO main.order_items
+        SELECT oi.* FROM src.orders o
+        CROSS JOIN src.order_items oi ON oi.order_id = o.id
+        WHERE o.date BETWEEN ? AND ?
+        ORDER BY oi.id
+    """, (date_from, date_to))
+    conn.execute("COMMIT")
+    conn.execute("DETACH DATABASE src")
+    create_indexes(conn)
+    _finish(conn)
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Создание и заполнение учебной CRM-базы")
+    parser.add_argument("--db", default="crm.db", help="путь к файлу базы (по умолчанию crm.db)")
+    parser.add_argument("--orders", type=int, default=50, help="количество заказов")
+    parser.add_argument("--customers", type=int, default=len(CUSTOMERS), help="количество клиентов")
+    parser.add_argument("--products", type=int, default=len(PRODUCTS), help="количество товаров")
+    parser.add_argument("--users", type=int, default=len(USERS), help="количество сотрудников")
+    parser.add_argument("--seed", type=int, default=None, help="seed генератора случайных чисел")
+    parser.add_argument("--days", type=int, default=120, help="за сколько последних дней даты заказов")
+    parser.add_argument("--batch-size", type=int, default=20000, help="заказов в одной пачке executemany")
+    parser.add_argument("-v", "--verbose", action="store_true", help="печатать прогресс по пачкам")
+    parser.add_argument("--migrate", action="store_true",
+                        help="только добавить индексы и сводные таблицы в существующую базу")
+    parser.add_argument("--shards", metavar="DIR", default=None,
+                        help="вместо одного файла: каталог с dims.db и файлом на каждый месяц")
+    args = parser.parse_args(argv)
+    if args.migrate:
+        migrate(args.db)
+        return
+    if min(args.customers, args.products, args.users, args.days) < 1 or args.orders < 0:
+        parser.error("--customers, --products, --users и --days должны быть >= 1, --orders >= 0")
+
+    if args.shards:
+        init_shards(args.shards, orders=args.orders, customers=args.customers,
+                    products=args.products, users=args.users, seed=args.seed, days=args.days,
+                    batch_size=args.batch_size, verbose=args.verbose)
+        return
+    init_db(args.db, orders=args.orders, customers=args.customers, products=args.products,
+            users=args.users, seed=args.seed, days=args.days, batch_size=args.batch_size,
+            verbose=args.verbose)
 
 
 if __name__ == "__main__":
-    init_db()
+    main()
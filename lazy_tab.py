@@ -0,0 +1,23 @@
+from PyQt5.QtWidgets import QWidget, QVBoxLayout
+
+
+class LazyTab(QWidget):
+    """Вкладка, содержимое которой создаётся при первом показе.
+
+    factory() вызывается один раз из ensure(); до этого вкладка пустая и не
+    тянет за собой импорты (графики — NumPy, SQL-консоль — модель таблицы),
+    поэтому окно появляется раньше.
+    """
+
+    def __init__(self, factory, parent=None):
+        super().__init__(parent)
+        self._factory = factory
+        self.widget = None
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+
+    def ensure(self):
+        if self.widget is None:
+            self.widget = self._factory()
+            self.layout().addWidget(self.widget)
+        return self.widget
@@ -1,21 +1,106 @@
+import argparse
+import importlib
+import os
 import sys
-import sqlite3
+import threading
+import time
+
+# начало отсчёта для --startup-profile (до импорта Qt и модулей окна)
+_STARTED = time.perf_counter()
+
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QPushButton,
-    QTabWidget, QTableWidget, QTableWidgetItem, QComboBox, QMenuBar,
-    QAction, QHBoxLayout, QMessageBox, QLabel, QSizePolicy
+    QTabWidget, QTableView, QComboBox, QMenuBar,
+    QAction, QHBoxLayout, QMessageBox, QLabel, QSizePolicy, QProgressBar,
+    QDateEdit, QFileDialog, QCheckBox
 )
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import QDate, QSettings, QTimer
+
+import export
+import queries
+import rollups
+import summaries
+from cell_delegate import fit_columns, setup_table
+from column_profile import PROFILE_COLUMNS
+from db_pool import DEFAULT_PRAGMAS, ConnectionPool, measure_pragmas, parse_pragma
+from filter_header import FilterHeader
+from lazy_tab import LazyTab
+from pagination import KeysetPager
+from perf_log import PERF_COLUMNS, PerfLog, QueryStats, StartupProfile
+from plan_dialog import PlanDialog
+from query_cache import QueryCache, estimate_size
+from query_executor import QueryExecutor
+from query_registry import QueryRegistry
 
 
 class MainWindow(QMainWindow):
-    def __init__(self):
+    # сколько строк читать из курсора за одну порцию
+    CHUNK_SIZE = 1000
+    # пауза после последнего изменения диапазона дат перед перезапросом
+    RANGE_DEBOUNCE_MS = 300
+
+    # вкладки с сортировкой и фильтрами в заголовке (в Tab3 — профиль, а не SQL)
+    SORTABLE_TABS = (0, 1, 3, 4)
+    # QSettings(организация, приложение): последняя открытая база
+    SETTINGS = ("crm-viewer", "CRM Viewer")
+
+    # встроенные запросы: key -> (вкладка, сообщение о готовности)
+    BUILTIN = {
+        "tab1": (0, "orders loaded into Tab1"),
+        "bt1": (1, "bt1: orders with client & manager shown in Tab2"),
+        "bt2": (3, "bt2: revenue by country shown in Tab4"),
+        "bt3": (4, "bt3: top products shown in Tab5"),
+    }
+
+    def __init__(self, db_path="crm.db", pragmas=None, pool_size=4,
+                 slow_log="slow_queries.jsonl", slow_ms=500, parallel=0, refresh_ms=2000,
+                 startup=None, approx=False):
         super().__init__()
         self.setWindowTitle("CRM Viewer (PyQt5)")
         self.resize(1100, 600)
 
+        self.db_path = db_path
+        # настройки соединений (None — db_pool.DEFAULT_PRAGMAS)
+        self.pragmas = pragmas
+        self.pool_size = pool_size
+        self.pool = None
         self.conn = None
-        self.cursor = None
+        self.executor = None
+        # bt2/bt3 в нескольких процессах (parallel_agg.py); 0 — одним запросом
+        self.parallel = parallel
+        self.aggregator = None
+        # каталог помесячных файлов (shards.ShardSet) или None для одного файла
+        self.shards = None
+        # диапазон дат длиннее лимита ATTACH — о нём уже предупредили
+        self._range_refused = False
+        self.cache = None
+        # именованные запросы окна (query_registry.py), создаётся в set_connection
+        self.registry = None
+        # есть ли в базе сводные таблицы для bt2/bt3 (summaries.py)
+        self.use_summaries = False
+        # есть ли таблицы revenue_rollup для вкладки Analytics (rollups.py)
+        self.use_rollups = False
+        # живое обновление Tab1: период опроса PRAGMA data_version (0 — выключено)
+        # и последний заказ, который уже есть в окне
+        self.refresh_ms = refresh_ms
+        self.last_order_id = 0
+        self._live_token = None
+        # сведения о базе (_load_database_info) уже пришли
+        self._info_loaded = False
+        # вкладки, где сейчас показана оценка по выборке (approx_agg.py), а не точный ответ
+        self._estimated = set()
+        # key запроса -> куда показать результат и как его кэшировать
+        self._targets = {}
+        # вкладка -> (sql, params) полного запроса, который в ней показан (для экспорта)
+        self.tab_queries = {}
+        # вкладка -> (key, sql, params, message) запроса до сортировки/фильтров из заголовка
+        self._tab_base = {}
+        # замеры по фазам и журнал медленных запросов (perf_log.py)
+        self.perf = PerfLog(slow_log, slow_ms)
+        # --startup-profile: perf_log.StartupProfile или None
+        self.startup = startup
+        # подключиться к базе после первого кадра окна (см. open_after_paint)
+        self._open_after_paint = False
 
         # Меню
         menubar = self.menuBar()
@@ -29,6 +114,37 @@ class MainWindow(QMainWindow):
         act_close.triggered.connect(self.close_connection)
         menu.addAction(act_close)
 
+        self.act_cancel = QAction("Cancel query", self)
+        self.act_cancel.setShortcut("Esc")
+        self.act_cancel.triggered.connect(self.cancel_queries)
+        self.act_cancel.setEnabled(False)
+        menu.addAction(self.act_cancel)
+
+        act_export = QAction("Export current tab…", self)
+        act_export.setShortcut("Ctrl+E")
+        act_export.triggered.connect(self.export_tab)
+        menu.addAction(act_export)
+
+        self.act_live = QAction("Live refresh", self)
+        self.act_live.setCheckable(True)
+        self.act_live.setChecked(refresh_ms > 0)
+        self.act_live.toggled.connect(self._update_live_timer)
+        menu.addAction(self.act_live)
+
+        # bt2/bt3 по всем датам: сначала оценка по выборке, затем точный ответ
+        self.act_approx = QAction("Approximate bt2/bt3 first", self)
+        self.act_approx.setCheckable(True)
+        self.act_approx.setChecked(approx)
+        menu.addAction(self.act_approx)
+
+        diagnostics = menubar.addMenu("Diagnostics")
+        act_plans = QAction("Query plans…", self)
+        act_plans.triggered.connect(self.show_query_plans)
+        diagnostics.addAction(act_plans)
+        act_pragmas = QAction("Connection pragma timings…", self)
+        act_pragmas.triggered.connect(self.measure_pragmas)
+        diagnostics.addAction(act_pragmas)
+
         # Центральный виджет
         central = QWidget()
         self.setCentralWidget(central)
@@ -57,203 +173,1222 @@ class MainWindow(QMainWindow):
 
         main_layout.addLayout(controls)
 
-        # Tabs: Tab1..Tab5 (каждая — QTableWidget)
+        # Фильтр по диапазону дат для Tab1, bt1, bt2, bt3
+        range_bar = QHBoxLayout()
+        self.range_check = QCheckBox("Date range:")
+        self.range_check.toggled.connect(lambda checked: self.range_timer.start())
+        range_bar.addWidget(self.range_check)
+        self.range_from = QDateEdit(QDate.currentDate().addDays(-30))
+        self.range_to = QDateEdit(QDate.currentDate())
+        for i, edit in enumerate((self.range_from, self.range_to)):
+            if i:
+                range_bar.addWidget(QLabel("—"))
+            edit.setCalendarPopup(True)
+            edit.setDisplayFormat("yyyy-MM-dd")
+            edit.dateChanged.connect(self._on_range_edited)
+            range_bar.addWidget(edit)
+        range_bar.addStretch(1)
+        main_layout.addLayout(range_bar)
+        # перезапрос только когда пользователь перестал менять даты
+        self.range_timer = QTimer(self)
+        self.range_timer.setSingleShot(True)
+        self.range_timer.setInterval(self.RANGE_DEBOUNCE_MS)
+        self.range_timer.timeout.connect(self.apply_date_range)
+        # опрос базы для живого обновления Tab1
+        self.live_timer = QTimer(self)
+        self.live_timer.setInterval(refresh_ms or 2000)
+        self.live_timer.timeout.connect(self.check_for_changes)
+
+        # Постраничный просмотр Tab1/Tab2 по ключу (date, id)
+        self.pagers = {
+            0: KeysetPager(queries.ORDERS_PAGE_SQL, "date", "id", "date", "id"),
+            1: KeysetPager(queries.BT1_PAGE_SQL, "o.date", "o.id", "date", "order_id"),
+        }
+        pager_bar = QHBoxLayout()
+        self.bt_newer = QPushButton("◀ Newer")
+        self.bt_newer.clicked.connect(lambda: self.load_page("newer"))
+        pager_bar.addWidget(self.bt_newer)
+        self.bt_older = QPushButton("Older ▶")
+        self.bt_older.clicked.connect(lambda: self.load_page("older"))
+        pager_bar.addWidget(self.bt_older)
+        pager_bar.addWidget(QLabel("Jump to date:"))
+        self.page_date = QDateEdit(QDate.currentDate())
+        self.page_date.setCalendarPopup(True)
+        self.page_date.setDisplayFormat("yyyy-MM-dd")
+        pager_bar.addWidget(self.page_date)
+        self.bt_jump = QPushButton("Go")
+        self.bt_jump.clicked.connect(lambda: self.load_page("jump"))
+        pager_bar.addWidget(self.bt_jump)
+        self.pager_label = QLabel()
+        pager_bar.addWidget(self.pager_label)
+        pager_bar.addStretch(1)
+        main_layout.addLayout(pager_bar)
+
+        # Tabs: Tab1..Tab5 (каждая — QTableView с ленивой моделью). Tab1 видна
+        # сразу, Tab2..Tab5 создаются при первом показе или первом результате
+        # для них (table(i)); до этого self.tables[i] — None
         self.tabs = QTabWidget()
         main_layout.addWidget(self.tabs)
 
-        self.tables = []
-        for i in range(5):
-            table = QTableWidget()
-            table.setEditTriggers(QTableWidget.NoEditTriggers)
-            table.setSelectionBehavior(QTableWidget.SelectRows)
-            table.setSelectionMode(QTableWidget.SingleSelection)
-            self.tabs.addTab(table, f"Tab{i+1}")
-            self.tables.append(table)
+        self.tables = [None] * 5
+        self.tabs.addTab(self._make_table(0), "Tab1")
+        for i in range(1, 5):
+            self.tabs.addTab(LazyTab(lambda i=i: self._make_table(i)), f"Tab{i+1}")
+
+        # SQL, Charts и Analytics создаются при первом показе (lazy_tab.py):
+        # до этого self.console / self.charts / self.analytics — None
+        self.console = self.charts = self.analytics = None
+        # SQL: произвольные запросы с потоковой выдачей строк
+        self.console_page = LazyTab(self._build_console)
+        self.tabs.addTab(self.console_page, "SQL")
+        # Charts: выручка по странам/товарам и во времени
+        self.charts_page = LazyTab(self._build_charts)
+        self.tabs.addTab(self.charts_page, "Charts")
+        # Analytics: выручка по дням/неделям/месяцам из revenue_rollup
+        self.analytics_page = LazyTab(self._build_analytics)
+        self.tabs.addTab(self.analytics_page, "Analytics")
+
+        # Performance: последние операции с разбивкой по фазам
+        self.perf_table = QTableView()
+        self.perf_table.setEditTriggers(QTableView.NoEditTriggers)
+        self.perf_table.setSelectionBehavior(QTableView.SelectRows)
+        self.tabs.addTab(self.perf_table, "Performance")
+        self.tabs.currentChanged.connect(self._build_tab)
+        self.tabs.currentChanged.connect(self._update_pager)
+        self.tabs.currentChanged.connect(self._refresh_perf_tab)
+        self.tabs.currentChanged.connect(self._load_tab_on_show)
+        self._update_pager()
+
+        # Индикатор выполнения и отмена запросов в статусбаре
+        self.progress = QProgressBar()
+        self.progress.setRange(0, 0)
+        self.progress.setMaximumWidth(120)
+        self.progress.setVisible(False)
+        self.statusBar().addPermanentWidget(self.progress)
+
+        self.cache_label = QLabel()
+        self.statusBar().addPermanentWidget(self.cache_label)
+
+        self.cancel_button = QPushButton("Cancel")
+        self.cancel_button.clicked.connect(self.cancel_queries)
+        self.cancel_button.setVisible(False)
+        self.statusBar().addPermanentWidget(self.cancel_button)
 
         # Подсказка в статусбаре
-        self.statusBar().showMessage("Ready. Use Menu → Set connection to open crm.db")
+        self.statusBar().showMessage(f"Ready. Use Menu → Set connection to open {self.db_path}")
+
+    def _make_table(self, i):
+        table = QTableView()
+        table.setEditTriggers(QTableView.NoEditTriggers)
+        table.setSelectionBehavior(QTableView.SelectRows)
+        table.setSelectionMode(QTableView.SingleSelection)
+        # текст ячеек рисует CellDelegate, строки одной высоты
+        setup_table(table)
+        if i in self.SORTABLE_TABS:
+            header = FilterHeader(table)
+            header.viewChanged.connect(lambda: self._on_view_changed(i))
+            table.setHorizontalHeader(header)
+        self.tables[i] = table
+        return table
+
+    def table(self, i):
+        """QTableView вкладки Tab{i+1}; создаётся при первом обращении"""
+        if self.tables[i] is None:
+            self.tabs.widget(i).ensure()
+        return self.tables[i]
+
+    def open_after_paint(self):
+        """Выполнить Set connection, как только окно будет нарисовано"""
+        self._open_after_paint = True
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if self.startup is not None:
+            self.startup.mark("window painted")
+        if self._open_after_paint:
+            self._open_after_paint = False
+            QTimer.singleShot(0, self.set_connection)
+
+    def _build_tab(self, index):
+        page = self.tabs.widget(index)
+        if isinstance(page, LazyTab):
+            page.ensure()
+
+    def _build_console(self):
+        from sql_console import SqlConsole
+        self.console = SqlConsole()
+        self.console.set_executor(self.executor)
+        return self.console
+
+    def _build_charts(self):
+        import charts
+        self.charts = charts.ChartsTab()
+        self.charts.refreshRequested.connect(self.load_chart)
+        return self.charts
+
+    def _build_analytics(self):
+        from analytics_tab import AnalyticsTab
+        self.analytics = AnalyticsTab()
+        self.analytics.refreshRequested.connect(self.load_analytics)
+        return self.analytics
 
     def set_connection(self):
         """Подключаемся к crm.db и загружаем Tab1 и ComboBox"""
+        if self.conn:
+            self.close_connection()
         try:
-            self.conn = sqlite3.connect("crm.db")
-            self.conn.row_factory = sqlite3.Row
-            self.cursor = self.conn.cursor()
+            # все соединения — read-only из пула с настроенными PRAGMA
+            if os.path.isdir(self.db_path):
+                # каталог с dims.db и месяцами (shards.py)
+                from shards import ShardedPool
+                self.pool = ShardedPool(self.db_path, self.pool_size, self.pragmas)
+                self.shards = self.pool.shards
+            else:
+                self.pool = ConnectionPool(self.db_path, self.pool_size, self.pragmas)
+            self.conn = self.pool.acquire()
         except Exception as e:
+            self.pool = None
+            self.shards = None
             QMessageBox.critical(self, "DB Error", f"Не удалось подключиться: {e}")
             return
 
-        try:
-            # Tab1: SELECT * FROM orders
-            self.cursor.execute("SELECT * FROM orders ORDER BY date DESC LIMIT 200")
-            rows = self.cursor.fetchall()
-            columns = rows[0].keys() if rows else [d[0] for d in self.cursor.description]
-            data = [tuple(r) for r in rows]
-            self.show_table(data, list(columns), self.tables[0])
-            self.tabs.setCurrentIndex(0)
-            self.statusBar().showMessage("Connected to crm.db — orders loaded into Tab1")
-
-            # Заполнить ComboBox колонками таблицы orders
+        self.cache = QueryCache(self.db_path, self.pool.connect(),
+                                files=self.shards.files if self.shards is not None else None)
+        self._update_cache_label()
+        self.executor = QueryExecutor(self.pool, parent=self)
+        self.executor.started.connect(self.on_query_started)
+        self.executor.finished.connect(self.on_query_finished)
+        self.executor.failed.connect(self.on_query_failed)
+        self.executor.cancelled.connect(self.on_query_cancelled)
+        self.executor.progress.connect(self.on_query_progress)
+        self.executor.partial.connect(self.on_query_partial)
+        if self.console is not None:
+            self.console.set_executor(self.executor)
+        if self.shards is not None:
+            # bt2/bt3 — слиянием агрегатов по месяцам, без лимита ATTACH
+            from shards import ShardAggregator
+            self.aggregator = ShardAggregator(self.shards, self.pragmas)
+        elif self.parallel > 1:
+            # процессы стартуют в фоне, пока грузится Tab1
+            from parallel_agg import ParallelAggregator
+            self.aggregator = ParallelAggregator(self.db_path, self.parallel, self.pragmas)
+            self.aggregator.warm_up(wait=False)
+
+        self.registry = QueryRegistry(self.conn, getattr(self.pool, "queries", None))
+        # до ответа _load_database_info: ComboBox пуст, bt2/bt3 — без сводных таблиц
+        self.combo.clear()
+        self.use_summaries = self.use_rollups = False
+        self.last_order_id = 0
+        self._info_loaded = False
+        self._live_token = self.cache.token()
+        # эту базу откроем и при следующем запуске
+        QSettings(*self.SETTINGS).setValue("last_db", os.path.abspath(self.db_path))
+        # сведения о базе и Tab1 читаются параллельно, каждый на своём соединении пула
+        self._load_database_info()
+        # Tab1: SELECT * FROM orders (с фильтром по датам, если он включён)
+        refused = self._update_shard_window()
+        self._apply_pager_filter()
+        self._update_pager()
+        if refused:
+            self.statusBar().showMessage(f"Connected to {self.db_path} ({self.pool.describe()})")
+            return
+        self._run_builtin(
+            "tab1", f"Connected to {self.db_path} ({self.pool.describe()}) — orders loaded into Tab1")
+
+    def _load_database_info(self):
+        """Колонки orders для ComboBox, наличие сводных таблиц и края дат — в фоне"""
+        overrides = getattr(self.pool, "queries", None)
+        info = {}
+
+        def work(pool):
+            # своё соединение, а не из пула: ShardedPool отказывает, пока
+            # диапазон дат длиннее лимита ATTACH, а сведения нужны всегда
+            conn = pool.connect()
+            try:
+                registry = QueryRegistry(conn, overrides)
+                # те же колонки, по которым registry.bind() проверяет выбор в ComboBox
+                info["columns"] = registry.columns("orders")
+                info["summaries"] = summaries.is_installed(conn)
+                info["rollups"] = rollups.is_installed(conn)
+                # min/max по краям индекса idx_orders_date_id: отдельными подзапросами,
+                # иначе SQLite читает весь индекс (сотни мс на 1M заказов)
+                _, info["last_day"] = conn.execute(*registry.bind("date_bounds")).fetchone()
+                info["last_id"] = conn.execute(*registry.bind("max_order_id")).fetchone()[0] or 0
+            finally:
+                conn.close()
+            return ["column"], [(c,) for c in info["columns"]]
+
+        def on_rows(columns, rows):
             self.combo.blockSignals(True)
             self.combo.clear()
-            self.cursor.execute("PRAGMA table_info(orders)")
-            cols_info = self.cursor.fetchall()
-            orders_cols = [c[1] for c in cols_info]  # (cid, name, type, ...)
-            for col in orders_cols:
-                self.combo.addItem(col)
+            self.combo.addItems(info["columns"])
             self.combo.blockSignals(False)
+            self.use_summaries = info["summaries"]
+            self.use_rollups = info["rollups"]
+            self.last_order_id = max(self.last_order_id, info["last_id"])
+            last_day = info["last_day"]
+            if last_day and not self.range_check.isChecked():
+                # по умолчанию предлагаем последние 30 дней, которые есть в базе
+                last = QDate.fromString(last_day, "yyyy-MM-dd")
+                for edit, date in ((self.range_to, last), (self.range_from, last.addDays(-30)),
+                                   (self.page_date, last)):
+                    edit.blockSignals(True)
+                    edit.setDate(date)
+                    edit.blockSignals(False)
+            # живое обновление — только когда известен последний id
+            self._info_loaded = True
+            self._update_live_timer()
+            return None
 
-        except Exception as e:
-            QMessageBox.warning(self, "Query Error", f"Ошибка при загрузке orders: {e}")
+        self.run_query("connect", "PRAGMA table_info(orders)", 0, "Database info", on_rows=on_rows,
+                       submit=lambda replace: self.executor.submit_call("connect", work, replace),
+                       cache_key=False, activate=False)
 
     def close_connection(self):
         if self.conn:
+            if self.executor is not None:
+                self.executor.shutdown()
+                if self.console is not None:
+                    self.console.set_executor(None)
+                self.executor.deleteLater()
+                self.executor = None
+            if self.aggregator is not None:
+                self.aggregator.close()
+                self.aggregator = None
+            self.live_timer.stop()
+            self._targets.clear()
+            self.tab_queries.clear()
+            self._tab_base.clear()
+            if self.charts is not None:
+                self.charts.clear()
+            if self.analytics is not None:
+                self.analytics.clear()
+            self._update_busy()
+            # очистим таблицы (и вернём их соединения в пул) до закрытия пула
+            for t in self.tables:
+                if t is None:
+                    continue
+                self.clear_table(t)
+                if isinstance(t.horizontalHeader(), FilterHeader):
+                    t.horizontalHeader().clear_view()
+            if self.cache is not None:
+                self.cache.close()
+                self.cache = None
+            self.cache_label.clear()
             try:
                 self.conn.close()
+                self.pool.close()
             except Exception:
                 pass
             self.conn = None
-            self.cursor = None
-            # очистим таблицы
-            for t in self.tables:
-                t.clear()
-                t.setRowCount(0)
-                t.setColumnCount(0)
+            self.pool = None
+            self.shards = None
+            self._range_refused = False
+            self.registry = None
             self.combo.clear()
+            for pager in self.pagers.values():
+                pager.reset()
+            self._update_pager()
             self.statusBar().showMessage("Connection closed")
         else:
             self.statusBar().showMessage("No active connection")
 
     def query_bt1(self):
         """bt1: показать заказы + имя клиента + имя пользователя (менеджера) + date + amount"""
-        if not self.cursor:
+        if not self.conn:
             QMessageBox.information(self, "Not connected", "Сначала выполните Set connection")
             return
-        q = """
-            SELECT o.id AS order_id,
-                   c.name AS customer_name,
-                   u.name AS user_name,
-                   o.amount,
-                   o.date
-            FROM orders o
-            LEFT JOIN customers c ON o.customer_id = c.id
-            LEFT JOIN users u ON o.user_id = u.id
-            ORDER BY o.date DESC
-            LIMIT 200
-        """
-        try:
-            self.cursor.execute(q)
-            rows = self.cursor.fetchall()
-            cols = rows[0].keys() if rows else [d[0] for d in self.cursor.description]
-            data = [tuple(r) for r in rows]
-            self.show_table(data, list(cols), self.tables[1])
-            self.tabs.setCurrentIndex(1)
-            self.statusBar().showMessage("bt1: orders with client & manager shown in Tab2")
-        except Exception as e:
-            QMessageBox.warning(self, "Query error", f"Ошибка bt1: {e}")
+        self.pagers[1].reset()
+        self._update_pager()
+        self._run_builtin("bt1")
 
     def query_combo(self):
-        """При выборе колонки orders → SELECT <col> FROM orders → Tab3"""
-        if not self.cursor:
+        """При выборе колонки orders → профиль колонки (count, distinct, гистограмма, top-k) → Tab3"""
+        if not self.conn:
             return
         col = self.combo.currentText()
         if not col:
             return
-        q = f"SELECT {col} FROM orders ORDER BY date DESC LIMIT 500"
         try:
-            self.cursor.execute(q)
-            rows = self.cursor.fetchall()
-            # rows may be list of sqlite3.Row or tuples
-            if isinstance(rows, list) and rows and isinstance(rows[0], sqlite3.Row):
-                data = [tuple(r) for r in rows]
-            else:
-                data = [tuple(r) for r in rows]
-            self.show_table(data, [col], self.tables[2])
-            self.tabs.setCurrentIndex(2)
-            self.statusBar().showMessage(f"Column '{col}' from orders shown in Tab3")
-        except Exception as e:
-            QMessageBox.warning(self, "Query error", f"Ошибка combo query: {e}")
+            sql, _ = self.registry.bind("profile", column=col)
+        except ValueError as e:
+            QMessageBox.warning(self, "Query Error", f"Неизвестная колонка: {e}")
+            return
+        note = self._window_note()
+        if self.shards is not None and self.date_range() is not None and self.pool.window:
+            # профиль не фильтруется по датам, но видит только месяцы диапазона
+            window = self.pool.window
+            note = f" (months {window[-1].month}…{window[0].month} only)"
+        # важен только последний выбор — предыдущий проход отменяем;
+        # профиль кэшируется отдельно от строк того же запроса (и для
+        # разных подключённых месяцев)
+        self.run_query(
+            "combo", sql, 2, f"Profile of orders.{col} shown in Tab3{note}", replace=True,
+            submit=lambda replace: self.executor.submit_profile("combo", sql, col, replace),
+            cache_key=f"-- profile{note}\n{sql}",
+        )
 
     def query_bt2(self):
         """bt2: выручка (sum amount) по странам (customers.country) -> Tab4"""
-        if not self.cursor:
+        if not self.conn:
             QMessageBox.information(self, "Not connected", "Сначала выполните Set connection")
             return
-        q = """
-            SELECT c.country AS country, 
-                   COUNT(o.id) AS orders_count,
-                   ROUND(SUM(o.amount), 2) AS total_revenue,
-                   ROUND(AVG(o.amount), 2) AS avg_order
-            FROM orders o
-            LEFT JOIN customers c ON o.customer_id = c.id
-            GROUP BY c.country
-            ORDER BY total_revenue DESC
-        """
-        try:
-            self.cursor.execute(q)
-            rows = self.cursor.fetchall()
-            cols = rows[0].keys() if rows else [d[0] for d in self.cursor.description]
-            data = [tuple(r) for r in rows]
-            self.show_table(data, list(cols), self.tables[3])
-            self.tabs.setCurrentIndex(3)
-            self.statusBar().showMessage("bt2: revenue by country shown in Tab4")
-        except Exception as e:
-            QMessageBox.warning(self, "Query error", f"Ошибка bt2: {e}")
+        self._run_builtin("bt2")
 
     def query_bt3(self):
         """bt3: топ товаров по количеству и выручке -> Tab5"""
-        if not self.cursor:
+        if not self.conn:
             QMessageBox.information(self, "Not connected", "Сначала выполните Set connection")
             return
-        q = """
-            SELECT p.name AS product_name,
-                   p.category,
-                   SUM(oi.qty) AS total_qty,
-                   ROUND(SUM(oi.qty * p.price), 2) AS total_revenue
-            FROM order_items oi
-            JOIN products p ON oi.product_id = p.id
-            GROUP BY p.id
-            ORDER BY total_qty DESC, total_revenue DESC
-            LIMIT 100
+        self._run_builtin("bt3")
+
+    def date_range(self):
+        """(от, до) в формате orders.date или None, если фильтр выключен"""
+        if not self.range_check.isChecked():
+            return None
+        first, last = self.range_from.date(), self.range_to.date()
+        if first > last:
+            first, last = last, first
+        return first.toString("yyyy-MM-dd"), last.toString("yyyy-MM-dd")
+
+    def _builtin_sql(self, key):
+        """(sql, params, пометка) встроенного запроса с учётом фильтра и сводных таблиц"""
+        rng = self.date_range()
+        if rng is not None:
+            # сводные таблицы считаются по всем датам — с фильтром идём в orders
+            sql, params = self.registry.bind(f"{key}_range", date_from=rng[0], date_to=rng[1])
+            return sql, params, f" for {rng[0]} … {rng[1]}"
+        if self.use_summaries and key in ("bt2", "bt3"):
+            sql, params = self.registry.bind(f"{key}_summary")
+            return sql, params, " (summary table)"
+        sql, params = self.registry.bind(key)
+        if key in ("bt2", "bt3"):
+            return sql, params, ""
+        return sql, params, self._window_note()
+
+    def _window_note(self):
+        """Пометка для запросов, которые видят только подключённые месяцы
+        (без фильтра по датам — самые новые, сколько позволяет ATTACH)"""
+        if self.shards is None or not self.pool.skipped:
+            return ""
+        return f" (last {len(self.pool.window)} months only)"
+
+    def _run_builtin(self, key, message=None, replace=False, activate=True):
+        tab_index, default_message = self.BUILTIN[key]
+        sql, params, note = self._builtin_sql(key)
+        message = (message or default_message) + note
+        if key in ("bt2", "bt3") and self.shards is not None:
+            # месяцы: агрегаты каждого файла, в том числе с фильтром по датам
+            # и с сортировкой/фильтрами из заголовка
+            self._run_parallel(key, sql, tab_index, message, replace, activate,
+                               params, self.date_range() or ())
+            return
+        if key in ("bt2", "bt3") and not note and not self._view_active(tab_index):
+            if self.act_approx.isChecked():
+                self._run_approx(key, sql, tab_index, message, replace, activate)
+                return
+            if self.aggregator is not None:
+                self._run_parallel(key, sql, tab_index, message, replace, activate)
+                return
+        self.run_query(key, sql, tab_index, message, params, replace=replace, activate=activate)
+
+    def _aggregate(self, key, message, dates=(), view=None):
+        """Работа задачи bt2/bt3 через self.aggregator и подпись к результату.
+
+        describe() берётся в потоке задачи сразу после расчёта — до него
+        неизвестно, сколько месяцев прочитано. Из кэша — подпись без него.
+        view — (сортировка, фильтры) из заголовка вкладки для слитых строк.
+        """
+        aggregate = (self.aggregator.revenue_by_country if key == "bt2"
+                     else self.aggregator.top_products)
+        described = []
+
+        def work(pool):
+            result = aggregate(*dates, task=pool)
+            described.append(self.aggregator.describe())
+            if view is not None:
+                from parallel_agg import view_rows
+                result = view_rows(*result, *view)
+            return result
+
+        return work, lambda: f"{message} ({described[0]})" if described else message
+
+    def _run_parallel(self, key, sql, tab_index, message, replace, activate, params=(), dates=()):
+        """bt2/bt3 частичными агрегатами: в процессах ParallelAggregator или по
+        месяцам ShardAggregator (dates — диапазон дат для него, params — те же
+        даты для sql, они же входят в ключ кэша)"""
+        self._tab_base[tab_index] = (key, sql, params, message)
+        view = None
+        if self.shards is None:
+            # сортировка из заголовка и экспорт идут обычным запросом по той же
+            # базе — строки те же
+            self.tab_queries[tab_index] = (sql, params)
+        else:
+            # sql видит только подключённые месяцы: сортировка и фильтры
+            # из заголовка — над слитыми строками, экспорт — показанные строки
+            header = self._filter_header(tab_index)
+            if self._view_active(tab_index):
+                view = (header.sort, header.filters())
+            sql, params, note = self._apply_view(tab_index, sql, params)
+            message += note
+            self.tab_queries.pop(tab_index, None)
+        work, done_message = self._aggregate(key, message, dates, view)
+        self.run_query(
+            key, sql, tab_index, done_message, params,
+            replace=replace, activate=activate, on_rows=lambda columns, rows: rows,
+            submit=lambda replace: self.executor.submit_call(key, work, replace),
+        )
+
+    def _run_approx(self, key, sql, tab_index, message, replace, activate):
+        """bt2/bt3 по всем датам: оценка по выборке блоков за ~0.1 с, уточнение, затем точный ответ"""
+        exact = None
+        done_message = message
+        if self.aggregator is not None:
+            exact, done_message = self._aggregate(key, message)
+        # сортировка из заголовка и экспорт — по точному запросу
+        self._tab_base[tab_index] = (key, sql, (), message)
+        self.tab_queries[tab_index] = (sql, ())
+        table = self.table(tab_index)
+
+        def on_partial(value):
+            self.show_rows(value["columns"], value["rows"], table)
+            self._set_estimated(tab_index, True)
+            if activate:
+                self.tabs.setCurrentIndex(tab_index)
+            precision = "unknown" if value["precision"] == float("inf") else f"±{value['precision']:.1%}"
+            self.statusBar().showMessage(
+                f"{key}: estimate from {value['fraction']:.1%} of {value['table']} "
+                f"(95% CI up to {precision}) — computing the exact result…")
+
+        self.run_query(
+            key, sql, tab_index, done_message, replace=replace, activate=activate,
+            on_rows=lambda columns, rows: rows, on_partial=on_partial,
+            submit=lambda replace: self.executor.submit_approx(key, sql, key, exact, replace),
+        )
+
+    def _set_estimated(self, tab_index, estimated):
+        """Пометить вкладку: в ней оценка по выборке («≈» в названии)"""
+        if estimated == (tab_index in self._estimated):
+            return
+        if estimated:
+            self._estimated.add(tab_index)
+            self.tabs.setTabText(tab_index, f"Tab{tab_index + 1} ≈")
+            self.tabs.setTabToolTip(tab_index, "Estimate from a random sample; the exact result replaces it")
+        else:
+            self._estimated.discard(tab_index)
+            self.tabs.setTabText(tab_index, f"Tab{tab_index + 1}")
+            self.tabs.setTabToolTip(tab_index, "")
+
+    def _on_range_edited(self, *args):
+        if self.range_check.isChecked():
+            self.range_timer.start()
+
+    def _apply_pager_filter(self):
+        rng = self.date_range()
+        for pager in self.pagers.values():
+            if rng is None:
+                pager.set_filter()
+            else:
+                pager.set_filter(f"{pager.date_col} BETWEEN ? AND ?", rng)
+
+    def _update_shard_window(self):
+        """Месяцы: подключать к новым соединениям только файлы текущего диапазона.
+
+        True — диапазон длиннее лимита ATTACH: запросы к пулу не выполняются
+        (см. ShardedPool), предупреждение показывается один раз.
         """
+        if self.shards is None:
+            return False
+        self.pool.set_range(*(self.date_range() or ()))
+        refused = self.pool.refused is not None
+        if refused and not self._range_refused:
+            QMessageBox.warning(
+                self, "Date range",
+                f"Диапазон дат охватывает больше месяцев, чем можно подключить "
+                f"(лимит ATTACH: {self.pool.max_attached}).\n"
+                f"Tab1, bt1, графики по дням и SQL-консоль не выполняются — сузьте диапазон.\n"
+                f"bt2/bt3 и графики по странам и товарам считаются по всем месяцам.")
+        self._range_refused = refused
+        return refused
+
+    def apply_date_range(self):
+        """Перезапросить Tab1 и уже открытые bt1/bt2/bt3 с новым диапазоном дат"""
+        if not self.conn:
+            return
+        refused = self._update_shard_window()
+        self._apply_pager_filter()
+        self._update_pager()
+        loaded = [key for key in ("bt1", "bt2", "bt3") if self.BUILTIN[key][0] in self._tab_base]
+        if refused:
+            # строки прежнего диапазона не выдаём за новый; bt1 перезапросится
+            # вместе с Tab1, когда диапазон сузят
+            for key in ("tab1", "bt1"):
+                self.clear_table(self.table(self.BUILTIN[key][0]))
+            loaded = [key for key in loaded if key != "bt1"]
+        else:
+            # replace: пока пользователь меняет даты, устаревший запрос отменяется;
+            # текущая вкладка не переключается
+            self._run_builtin("tab1", replace=True, activate=False)
+        for key in loaded:
+            self._run_builtin(key, replace=True, activate=False)
+        if self.charts is not None and self.charts.loaded:
+            import charts
+            if refused and self.charts.kind() not in charts.BAR_KINDS:
+                self.charts.clear()
+            else:
+                self.load_chart(self.charts.kind())
+        if self.analytics is not None and self.analytics.loaded:
+            self.load_analytics(*self.analytics.selection())
+
+    def _update_live_timer(self, *args):
+        if self.conn and self._info_loaded and self.act_live.isChecked():
+            self.live_timer.start()
+        else:
+            self.live_timer.stop()
+
+    def check_for_changes(self):
+        """Таймер: база изменилась (data_version/mtime) — дочитать новые заказы"""
+        if not self.conn or self.cache is None:
+            return
+        token = self.cache.token()
+        if token == self._live_token:
+            return
+        self._live_token = token
+        # мог появиться файл нового месяца
+        if not self._update_shard_window():
+            self.refresh_new_orders()
+
+    def refresh_new_orders(self):
+        """Заказы с id больше последнего увиденного — в начало Tab1 без перезагрузки"""
+        rng = self.date_range()
+        last = self.last_order_id
+        dates = {} if rng is None else {"date_from": rng[0], "date_to": rng[1]}
+        name = "new_orders" if rng is None else "new_orders_range"
+        info = {}
+
+        def work(pool):
+            conn = pool.acquire()
+            try:
+                high = conn.execute(*self.registry.bind("max_order_id")).fetchone()[0] or 0
+                cursor = conn.execute(*self.registry.bind(name, after_id=last, last_id=high, **dates))
+                columns = [d[0] for d in cursor.description]
+                rows = cursor.fetchall()
+            finally:
+                conn.close()
+            info["high"] = high
+            return columns, rows
+
+        def on_rows(columns, rows):
+            self.last_order_id = max(self.last_order_id, info["high"])
+            if not rows:
+                return None
+            added = self._prepend_tab1(columns, rows)
+            if added is None:
+                self.statusBar().showMessage(
+                    f"Live: {len(rows)} new order(s) in {self.db_path} — reload Tab1 to see them")
+                return None
+            message = f"Live: {added} new order(s) added to Tab1"
+            if added < len(rows):
+                message += f", {len(rows) - added} back-dated shown after reload"
+            self.statusBar().showMessage(message)
+            return None
+
+        submit = lambda replace: self.executor.submit_call("live", work, replace)
+        # текст и параметры — только для журнала; верхняя граница id читается в work()
+        sql, params = self.registry.bind(name, after_id=last, last_id=None, **dates)
+        self.run_query("live", sql, 0, "Live: new orders", params,
+                       on_rows=on_rows, submit=submit, cache_key=False, activate=False)
+        if "live" not in self._targets:
+            # предыдущая проверка ещё идёт — повторим на следующем тике таймера
+            self._live_token = None
+
+    def _prepend_tab1(self, columns, rows):
+        """Вставить новые заказы в начало Tab1; None — вкладка показывает не самые новые"""
+        table = self.tables[0]
+        model = table.model()
+        pager = self.pagers[0]
+        newest = pager.first_key is None or (pager.page == 0 and not pager.has_newer)
+        if (model is None or model.columns() != columns or not newest
+                or self._view_active(0) or "tab1" in self._targets or "page1" in self._targets):
+            return None
+        d, i = columns.index("date"), columns.index("id")
+        if model.rowCount():
+            # в начало идут только заказы новее верхней строки (остальные уже
+            # показаны или датированы задним числом и появятся после перезагрузки)
+            top = model.row(0)
+            rows = [r for r in rows if (r[d], r[i]) > (top[d], top[i])]
+        if rows:
+            bar = table.verticalScrollBar()
+            position = bar.value()
+            model.prepend_rows(rows)
+            if position > 0:
+                # пользователь пролистал вниз — оставляем на экране те же строки
+                step = 1 if table.verticalScrollMode() == QTableView.ScrollPerItem else table.rowHeight(0)
+                bar.setValue(position + len(rows) * step)
+            if pager.first_key is not None:
+                pager.first_key = (rows[0][d], rows[0][i])
+        return len(rows)
+
+    def load_chart(self, kind):
+        """Данные для вкладки Charts (с учётом диапазона дат)"""
+        import charts
+        if not self.conn:
+            QMessageBox.information(self, "Not connected", "Сначала выполните Set connection")
+            return
+        tab_index = self.tabs.indexOf(self.charts_page)
+        title = charts.CHART_KINDS[kind]
+        if kind in charts.BAR_KINDS:
+            # те же запросы, что у bt2/bt3: общий кэш и сводные таблицы
+            key = "bt2" if kind == "country" else "bt3"
+            sql, params, note = self._builtin_sql(key)
+
+            def on_bars(columns, rows):
+                values = [r[columns.index("total_revenue")] for r in rows]
+                self.charts.set_bars(title + note, [r[0] for r in rows], values)
+                return None
+
+            message, submit = f"Chart: {title}{note}", None
+            if self.shards is not None:
+                # месяцы: sql видит только подключённые файлы — считаем, как bt2/bt3
+                work, message = self._aggregate(key, message, self.date_range() or ())
+                submit = lambda replace: self.executor.submit_call("chart", work, replace)
+            self.run_query("chart", sql, tab_index, message, params,
+                           replace=True, on_rows=on_bars, submit=submit)
+            return
+
+        rng = self.date_range()
+        name = "revenue_by_day" if kind == "daily" else "order_amounts"
+        if rng:
+            sql, params = self.registry.bind(f"{name}_range", date_from=rng[0], date_to=rng[1])
+        else:
+            sql, params = self.registry.bind(name)
+        note = f" for {rng[0]} … {rng[1]}" if rng else self._window_note()
+
+        def work(pool):
+            conn = pool.acquire()
+            try:
+                # ряд и пирамида min/max строятся в фоне, в окно приходит готовый объект
+                series = charts.load_series(conn.execute(sql, params))
+            finally:
+                conn.close()
+            return ["series"], [(series,)]
+
+        def on_series(columns, rows):
+            series = rows[0][0]
+            self.charts.set_series(f"{title}{note} — {len(series):,} points", series)
+            return None
+
+        self.run_query("chart", sql, tab_index, f"Chart: {title}{note}", params,
+                       replace=True, on_rows=on_series, cache_key=False,
+                       submit=lambda replace: self.executor.submit_call("chart", work, replace))
+
+    def load_analytics(self, grain, dimension):
+        """Вкладка Analytics: свёрнутая выручка плюс ещё не свёрнутые заказы"""
+        if not self.conn:
+            QMessageBox.information(self, "Not connected", "Сначала выполните Set connection")
+            return
+        if not self.use_rollups and self.shards is not None:
+            QMessageBox.information(self, "Analytics",
+                                    "Для заказов по месяцам таблицы revenue_rollup не ведутся:\n"
+                                    "откройте базу одним файлом (crm.db)")
+            return
+        if not self.use_rollups:
+            QMessageBox.information(self, "Analytics",
+                                    f"В базе нет таблиц revenue_rollup: выполните\n"
+                                    f"python rollups.py install {self.db_path}")
+            return
+        rng = self.date_range()
+        sql, params = rollups.view_sql(grain, dimension, rng)
+        info = {}
+
+        def work(pool):
+            conn = pool.acquire()
+            try:
+                info.update(rollups.state(conn))
+                info["pending"] = rollups.pending_orders(conn, info["last_order_id"])
+                # всё свёрнуто — читаем таблицу без слияния с orders
+                sql, params = rollups.view_sql(grain, dimension, rng, live=info["pending"] > 0)
+                started = time.perf_counter()
+                cursor = conn.execute(sql, params)
+                columns = [d[0] for d in cursor.description]
+                rows = cursor.fetchall()
+                info["seconds"] = time.perf_counter() - started
+            finally:
+                conn.close()
+            return columns, rows
+
+        def on_rows(columns, rows):
+            refreshed = "never"
+            if info["refreshed_at"]:
+                refreshed = (f"{info['refreshed_at']} UTC ({info['refresh_orders']:,} orders "
+                             f"in {info['refresh_seconds']:.2f} s)")
+            self.analytics.show_rows(columns, rows, (
+                f"{len(rows):,} rows in {info['seconds'] * 1000:.0f} ms; "
+                f"rollup refreshed {refreshed}, {info['pending']:,} newer orders added live"))
+            return None
+
+        note = f" for {rng[0]} … {rng[1]}" if rng else ""
+        self.run_query("analytics", sql, self.tabs.indexOf(self.analytics_page),
+                       f"Analytics: {grain} revenue by {dimension}{note}", params,
+                       replace=True, on_rows=on_rows, cache_key=False,
+                       submit=lambda replace: self.executor.submit_call("analytics", work, replace))
+
+    def _load_tab_on_show(self, *args):
+        # первый переход на Charts/Analytics после подключения загружает данные
+        if not self.conn:
+            return
+        widget = self.tabs.currentWidget()
+        if widget is self.charts_page and not self.charts.loaded:
+            self.load_chart(self.charts.kind())
+        elif widget is self.analytics_page and not self.analytics.loaded and self.use_rollups:
+            self.load_analytics(*self.analytics.selection())
+
+    def show_query_plans(self):
+        """Диагностика: EXPLAIN QUERY PLAN встроенных запросов"""
+        if not self.conn:
+            QMessageBox.information(self, "Not connected", "Сначала выполните Set connection")
+            return
         try:
-            self.cursor.execute(q)
-            rows = self.cursor.fetchall()
-            cols = rows[0].keys() if rows else [d[0] for d in self.cursor.description]
-            data = [tuple(r) for r in rows]
-            self.show_table(data, list(cols), self.tables[4])
-            self.tabs.setCurrentIndex(4)
-            self.statusBar().showMessage("bt3: top products shown in Tab5")
+            PlanDialog(self.conn, self).exec_()
         except Exception as e:
-            QMessageBox.warning(self, "Query error", f"Ошибка bt3: {e}")
-
-    def show_table(self, data, columns, table_widget):
-        """data: list of tuples; columns: list of column names"""
-        table_widget.clear()
-        table_widget.setRowCount(len(data))
-        table_widget.setColumnCount(len(columns))
-        table_widget.setHorizontalHeaderLabels(columns)
-
-        for r, row in enumerate(data):
-            for c, val in enumerate(row):
-                if val is None:
-                    disp = ""
-                else:
-                    disp = str(val)
-                item = QTableWidgetItem(disp)
-                # числа в правую сторону ячейки
-                if isinstance(val, (int, float)):
-                    item.setTextAlignment(Qt.AlignVCenter | Qt.AlignRight)
-                table_widget.setItem(r, c, item)
-
-        table_widget.resizeColumnsToContents()
-        if len(columns) > 0:
-            table_widget.horizontalHeader().setStretchLastSection(True)
+            QMessageBox.warning(self, "Query error", f"Ошибка EXPLAIN: {e}")
+
+    def load_page(self, move):
+        """Страница Tab1/Tab2: move = "first" | "older" | "newer" | "jump" """
+        if not self.conn:
+            QMessageBox.information(self, "Not connected", "Сначала выполните Set connection")
+            return
+        tab_index = self.tabs.currentIndex()
+        pager = self.pagers.get(tab_index)
+        if pager is None or self._view_active(tab_index):
+            return
+        if move == "jump":
+            sql, params, reverse = pager.jump(self.page_date.date().toString("yyyy-MM-dd"))
+        else:
+            sql, params, reverse = getattr(pager, move)()
+
+        started = time.perf_counter()
+
+        def on_rows(columns, rows):
+            if reverse:
+                rows = rows[::-1]
+            rows = pager.update(columns, rows)
+            if rows is None:
+                self.statusBar().showMessage(f"Tab{tab_index + 1}: no more orders in that direction")
+                self._update_pager()
+                return None
+            self._update_pager()
+            ms = (time.perf_counter() - started) * 1000
+            self.pager_label.setText(f"{pager.describe()} — fetched in {ms:.1f} ms")
+            return rows
+
+        self.run_query(f"page{tab_index + 1}", sql, tab_index,
+                       f"Tab{tab_index + 1}: page loaded{self._window_note()}", params, on_rows=on_rows)
+
+    def export_tab(self):
+        """Экспорт текущей вкладки в CSV/Parquet.
+
+        Если вкладка показывает SQL-запрос, он выполняется заново и строки
+        пишутся в файл прямо из курсора в фоне; иначе (профиль колонки,
+        Performance, bt2/bt3 по месяцам) выгружаются уже показанные строки.
+        """
+        if not self.conn:
+            QMessageBox.information(self, "Not connected", "Сначала выполните Set connection")
+            return
+        index = self.tabs.currentIndex()
+        widget = self.tabs.currentWidget()
+        sql, params, columns, rows = "", (), None, None
+        if widget is self.console_page:
+            if not self.console.last_sql:
+                QMessageBox.information(self, "Export", "Сначала выполните запрос во вкладке SQL")
+                return
+            sql = self.console.last_sql
+        elif index in self.tab_queries:
+            sql, params = self.tab_queries[index]
+        else:
+            if widget is self.analytics_page:
+                widget = self.analytics.table
+            elif isinstance(widget, LazyTab):
+                widget = widget.widget
+            model = widget.model() if isinstance(widget, QTableView) else None
+            if model is None or not model.columnCount():
+                QMessageBox.information(self, "Export", "Во вкладке нет данных для экспорта")
+                return
+            columns, rows = model.columns(), model.rows()
+
+        filters = [export.FORMATS[f] for f in export.available_formats()]
+        name = self.tabs.tabText(index).lower()
+        path, selected = QFileDialog.getSaveFileName(self, "Export", f"{name}.csv", ";;".join(filters))
+        if not path:
+            return
+        fmt = "parquet" if selected == export.FORMATS["parquet"] else export.format_for_path(path)
+        if not path.lower().endswith("." + fmt):
+            path += "." + fmt
+
+        def on_progress(value):
+            rate = value["rows"] / value["elapsed"] if value["elapsed"] > 0 else 0
+            self.statusBar().showMessage(
+                f"export: {value['rows']:,} rows written to {path} ({rate:,.0f} rows/s)…")
+
+        def on_rows(columns, rows):
+            path_, fmt_, count, seconds = rows[0]
+            self.statusBar().showMessage(f"Exported {count:,} rows to {path_} ({fmt_}, {seconds:.1f} s)")
+            return None
+
+        self.run_query(
+            "export", sql, index, "Export finished", params, cache_key=False,
+            on_rows=on_rows, on_partial=on_progress,
+            submit=lambda replace: self.executor.submit_export(
+                "export", path, fmt, sql, params, columns, rows),
+        )
+
+    def _update_pager(self, *args):
+        index = self.tabs.currentIndex()
+        pager = self.pagers.get(index)
+        # при сортировке/фильтре из заголовка порядок уже не (date, id) —
+        # строки подгружает ленивая модель
+        enabled = pager is not None and self.conn is not None and not self._view_active(index)
+        self.bt_newer.setEnabled(enabled and pager.has_newer)
+        self.bt_older.setEnabled(enabled and (pager.has_older or pager.first_key is None))
+        self.page_date.setEnabled(enabled)
+        self.bt_jump.setEnabled(enabled)
+        self.pager_label.setText(pager.describe() if enabled else "")
+
+    def measure_pragmas(self):
+        """Диагностика: время bt2/bt3 без PRAGMA, с каждой по отдельности и со всеми"""
+        if not self.conn:
+            QMessageBox.information(self, "Not connected", "Сначала выполните Set connection")
+            return
+
+        def work(pool):
+            rows = []
+            for name, sql in (("bt2", queries.BT2_SQL), ("bt3", queries.BT3_SQL)):
+                rows += [(name,) + r for r in measure_pragmas(pool, sql)]
+            return ["query", "settings", "best_ms", "rows"], rows
+
+        def on_rows(columns, rows):
+            lines = [f"{q:4} {ms:>10.2f} ms   {label}" for q, label, ms, _ in rows]
+            QMessageBox.information(
+                self, "Connection pragma timings",
+                f"{self.pool.describe()}\n\n" + "\n".join(lines),
+            )
+            return None
+
+        self.run_query(
+            "pragmas", "", self.tabs.currentIndex(), "Pragma timings measured",
+            on_rows=on_rows, cache_key=False,
+            submit=lambda replace: self.executor.submit_call("pragmas", work, replace),
+        )
+
+    def run_query(self, key, sql, tab_index, done_message, params=(), replace=False,
+                  on_rows=None, submit=None, cache_key=None, on_partial=None, activate=True):
+        """Запустить запрос в фоне; результат попадёт во вкладку tab_index.
+
+        on_rows(columns, rows) — для небольших результатов, прочитанных целиком:
+        возвращает строки для показа или None, чтобы оставить вкладку как есть.
+        submit(replace) — своя фоновая задача вместо executor.submit(sql).
+        cache_key — текст для кэша (по умолчанию sql); False — не кэшировать.
+        on_partial(value) — промежуточные результаты задачи (по умолчанию профиль колонки).
+        activate=False — не переключаться на вкладку с результатом.
+        done_message может быть функцией: её текст берётся, когда результат готов.
+        """
+        if submit is None and on_rows is None:
+            self._tab_base[tab_index] = (key, sql, tuple(params), done_message)
+            sql, params, note = self._apply_view(tab_index, sql, params)
+            done_message += note
+            self.tab_queries[tab_index] = (sql, tuple(params))
+        if cache_key is None:
+            cache_key = sql
+        stats = QueryStats(key, cache_key or sql, params)
+        started = time.perf_counter()
+        cached = self.cache.get(cache_key, params) if cache_key is not False else None
+        self._update_cache_label()
+        if cached is not None:
+            if replace:
+                self.executor.cancel(key)
+            columns, rows = cached
+            stats.status = "cached"
+            stats.add("fetch", time.perf_counter() - started)
+            stats.rows = len(rows)
+            stats.bytes = estimate_size(columns, rows)
+            if on_rows is not None:
+                rows = on_rows(columns, rows)
+                if rows is None:
+                    self._record(stats)
+                    return
+            self._record(stats, self.show_rows(columns, rows, self.table(tab_index)))
+            if activate:
+                self.tabs.setCurrentIndex(tab_index)
+            self.statusBar().showMessage(f"{self._message(done_message)} (cached)")
+            return
+        token = self.cache.token()
+        if submit is not None:
+            submitted = submit(replace)
+        else:
+            submitted = self.executor.submit(key, sql, params, chunk_size=self.CHUNK_SIZE,
+                                             replace=replace)
+        if not submitted:
+            self.statusBar().showMessage(f"{key}: query is already running")
+            return
+        self._targets[key] = {
+            "tab": tab_index, "message": done_message,
+            "sql": cache_key, "params": params, "token": token, "on_rows": on_rows,
+            "stats": stats, "started": started, "on_partial": on_partial,
+            "activate": activate,
+        }
+        self._update_busy()
+
+    @staticmethod
+    def _message(done_message):
+        return done_message() if callable(done_message) else done_message
+
+    def _filter_header(self, tab_index):
+        if tab_index not in self.SORTABLE_TABS:
+            return None
+        if self.tables[tab_index] is None:
+            # вкладку ещё не создавали — сортировки и фильтров в ней нет
+            return None
+        return self.tables[tab_index].horizontalHeader()
+
+    def _view_active(self, tab_index):
+        header = self._filter_header(tab_index)
+        return header is not None and (header.sort is not None or bool(header.filters()))
+
+    def _apply_view(self, tab_index, sql, params):
+        """Добавить к запросу вкладки сортировку и фильтры из её заголовка"""
+        header = self._filter_header(tab_index)
+        if header is None:
+            return sql, params, ""
+        filters = header.filters()
+        sql, params = queries.wrap_view(sql, params, header.sort, filters)
+        note = ""
+        if header.sort is not None:
+            note += f", sorted by {header.sort[0]} {header.sort[1]}"
+        if filters:
+            note += f", {len(filters)} filter(s)"
+        return sql, params, note
+
+    def _on_view_changed(self, tab_index):
+        """Клик по заголовку или Enter в фильтре: перезапрос в базе"""
+        base = self._tab_base.get(tab_index)
+        if not self.conn or base is None:
+            return
+        # сообщение с пометкой источника (" (summary table)", диапазон дат) —
+        # то же, с которым вкладка загружалась; сортировку и фильтры добавит run_query
+        key, sql, params, message = base
+        if tab_index in self.pagers:
+            self.pagers[tab_index].reset()
+        self._update_pager()
+        if key in ("bt2", "bt3") and self.shards is not None:
+            # месяцы: заново слить агрегаты и отсортировать их строки
+            self._run_parallel(key, sql, tab_index, message, True, True,
+                               params, self.date_range() or ())
+            return
+        self.run_query(key, sql, tab_index, message, params, replace=True)
+
+    def cancel_queries(self):
+        if self.executor is not None and self.executor.is_running():
+            self.executor.cancel()
+
+    def on_query_started(self, key):
+        self.statusBar().showMessage(f"{key}: running…")
+
+    def on_query_progress(self, key, steps):
+        target = self._targets.get(key)
+        if target is not None and target["on_partial"] is not None:
+            # задача сама сообщает о ходе работы через on_partial
+            return
+        self.statusBar().showMessage(f"{key}: running… ({steps:,} VM steps)")
+
+    def on_query_partial(self, key, rows):
+        """Промежуточный профиль колонки, пока проход ещё идёт"""
+        target = self._targets.get(key)
+        if target is None:
+            return
+        if target["on_partial"] is not None:
+            target["on_partial"](rows)
+            return
+        self.show_rows(PROFILE_COLUMNS, rows, self.table(target["tab"]))
+        if target["activate"]:
+            self.tabs.setCurrentIndex(target["tab"])
+        scanned = next((v for _, item, v in rows if item == "count"), 0)
+        self.statusBar().showMessage(f"{key}: profiling… {scanned:,} rows scanned")
+
+    def on_query_finished(self, key, result):
+        target = self._targets.pop(key, None)
+        if target is None:
+            # запрос не из вкладок окна (например, SQL-консоль)
+            return
+        self._update_busy()
+        stats = target["stats"]
+        stats.phases.update(result.timings)
+        stats.rows = len(result.rows)
+        stats.complete = result.cursor is None or len(result.rows) < self.CHUNK_SIZE
+        stats.bytes = estimate_size(result.columns, result.rows)
+        if target["sql"] is not False and len(result.rows) < self.CHUNK_SIZE:
+            # результат прочитан целиком — его можно положить в кэш
+            self.cache.put(target["sql"], target["params"], result.columns,
+                           result.rows, target["token"])
+            self._update_cache_label()
+        if target["on_rows"] is not None:
+            result.close()
+            rows = target["on_rows"](result.columns, result.rows)
+            if rows is None:
+                self._record(stats)
+                return
+            render = self.show_rows(result.columns, rows, self.table(target["tab"]))
+        else:
+            render = self.show_result(result, self.table(target["tab"]))
+        self._record(stats, render)
+        if target["activate"]:
+            self.tabs.setCurrentIndex(target["tab"])
+        self.statusBar().showMessage(f"{self._message(target['message'])} ({result.elapsed * 1000:.0f} ms)")
+        if self.startup is not None and key == "tab1":
+            self.startup.mark("first data", f" (Tab1: {len(result.rows):,} rows)")
+
+    def on_query_failed(self, key, message):
+        target = self._targets.pop(key, None)
+        if target is None:
+            return
+        self._record_unfinished(target, "failed")
+        self._update_busy()
+        QMessageBox.warning(self, "Query error", f"Ошибка {key}: {message}")
+
+    def on_query_cancelled(self, key):
+        target = self._targets.pop(key, None)
+        if target is not None:
+            self._record_unfinished(target, "cancelled")
+            self.statusBar().showMessage(f"{key}: cancelled")
+        self._update_busy()
+
+    def _record(self, stats, render=None):
+        """Записать операцию в журнал; render — фазы отрисовки от show_*"""
+        if render:
+            for phase, seconds in render.items():
+                stats.add(phase, seconds)
+        self.perf.record(stats)
+        self._refresh_perf_tab()
+
+    def _record_unfinished(self, target, status):
+        if target is None:
+            return
+        stats = target["stats"]
+        stats.status = status
+        stats.complete = False
+        # фаз из потока нет — записываем время от запуска до ошибки/отмены
+        stats.add("execute", time.perf_counter() - target["started"])
+        self._record(stats)
+
+    def _refresh_perf_tab(self, *args):
+        if self.tabs.currentWidget() is self.perf_table:
+            self.show_rows(PERF_COLUMNS, self.perf.rows(), self.perf_table)
+
+    def _update_cache_label(self):
+        self.cache_label.setText(self.cache.stats_text())
+
+    def _update_busy(self):
+        busy = bool(self._targets)
+        self.progress.setVisible(busy)
+        self.cancel_button.setVisible(busy)
+        self.act_cancel.setEnabled(busy)
+
+    def closeEvent(self, event):
+        # не оставляем работающие запросы после закрытия окна
+        if self.executor is not None:
+            self.executor.shutdown()
+        if self.aggregator is not None:
+            self.aggregator.close()
+        self.perf.close()
+        super().closeEvent(event)
+
+    def show_result(self, result, table_view):
+        """result: QueryResult из фонового потока; остальные строки — по мере прокрутки.
+
+        Возвращает время фаз отрисовки {"model": с, "resize": с}.
+        """
+        # table_model тянет NumPy — импортируется при первых данных, уже после первого кадра
+        from table_model import SqlTableModel
+        started = time.perf_counter()
+        self.clear_table(table_view)
+        model = SqlTableModel(
+            result.cursor, result.columns, rows=result.rows,
+            connection=result.connection, chunk_size=self.CHUNK_SIZE, parent=table_view,
+        )
+        return self._set_model(model, table_view, started)
+
+    def show_rows(self, columns, rows, table_view):
+        """Показать уже прочитанные строки (например, из кэша)"""
+        from table_model import SqlTableModel
+        started = time.perf_counter()
+        self.clear_table(table_view)
+        model = SqlTableModel(None, columns, rows=rows, parent=table_view)
+        return self._set_model(model, table_view, started)
+
+    def _set_model(self, model, table_view, started):
+        table_view.setModel(model)
+        if isinstance(table_view.horizontalHeader(), FilterHeader):
+            table_view.horizontalHeader().set_columns(model.columns())
+
+        resize_started = time.perf_counter()
+        # ширина по выборке строк, а не по всем прочитанным
+        fit_columns(table_view)
+        if model.columnCount() > 0:
+            table_view.horizontalHeader().setStretchLastSection(True)
+        return {"model": resize_started - started,
+                "resize": time.perf_counter() - resize_started}
+
+    def clear_table(self, table_view):
+        """Убрать модель из таблицы и закрыть её курсор"""
+        if table_view in self.tables:
+            # новые строки — уже не оценка (on_partial пометит вкладку снова)
+            self._set_estimated(self.tables.index(table_view), False)
+        old = table_view.model()
+        table_view.setModel(None)
+        if old is not None:
+            old.close()
+            old.deleteLater()
 
 
 def main():
-    app = QApplication(sys.argv)
-    win = MainWindow()
+    parser = argparse.ArgumentParser(description="CRM Viewer")
+    parser.add_argument("--db", default=None,
+                        help="путь к базе (по умолчанию — открытая в прошлый раз, иначе crm.db)")
+    parser.add_argument("--pool-size", type=int, default=4,
+                        help="сколько свободных read-only соединений держать в пуле")
+    parser.add_argument("--pragma", action="append", default=[], metavar="NAME=VALUE",
+                        help="переопределить PRAGMA соединений (mmap_size, cache_size, ...)")
+    parser.add_argument("--slow-ms", type=float, default=500,
+                        help="порог журнала медленных запросов в мс (по умолчанию 500)")
+    parser.add_argument("--slow-log", default="slow_queries.jsonl",
+                        help="файл журнала медленных запросов (пустая строка — не вести)")
+    parser.add_argument("--refresh-ms", type=int, default=2000, metavar="MS",
+                        help="как часто проверять базу на новые заказы для Tab1 (0 — не проверять)")
+    parser.add_argument("--startup-profile", action="store_true",
+                        help="напечатать время до первого кадра окна и до первых данных")
+    parser.add_argument("--parallel", type=int, default=0, metavar="N",
+                        help="считать bt2/bt3 в N процессах (parallel_agg.py); 0 — одним запросом")
+    parser.add_argument("--approx", action="store_true",
+                        help="bt2/bt3 сначала показывать оценкой по выборке (approx_agg.py)")
+    # остальные аргументы (например -style) достаются Qt
+    args, qt_args = parser.parse_known_args()
+    pragmas = dict(DEFAULT_PRAGMAS)
+    try:
+        pragmas.update(parse_pragma(p) for p in args.pragma)
+    except ValueError as e:
+        parser.error(str(e))
+
+    startup = StartupProfile(_STARTED) if args.startup_profile else None
+    if startup is not None:
+        startup.mark("imports")
+    db_path = args.db or QSettings(*MainWindow.SETTINGS).value("last_db", "crm.db")
+    app = QApplication(sys.argv[:1] + qt_args)
+    win = MainWindow(db_path, pragmas, args.pool_size, args.slow_log, args.slow_ms,
+                     args.parallel, args.refresh_ms, startup, args.approx)
+    if os.path.exists(db_path):
+        # окно не ждёт базу: подключение — после первого кадра, а модель
+        # таблицы с NumPy (~100 мс) импортируется в фоне, пока окно рисуется
+        win.open_after_paint()
+        threading.Thread(target=importlib.import_module, args=("table_model",), daemon=True).start()
     win.show()
     sys.exit(app.exec_())
 
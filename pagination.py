@@ -0,0 +1,113 @@
+class KeysetPager:
+    """Постраничный просмотр заказов по ключу (date, id).
+
+    Вместо OFFSET следующая страница ищется по индексу от ключа последней
+    строки текущей: WHERE (date, id) < (?, ?), поэтому страница 50 000
+    стоит столько же, сколько первая. Переход «назад» — тот же поиск в
+    обратную сторону с разворотом результата.
+    """
+
+    def __init__(self, sql, date_col, id_col, date_field, id_field, page_size=200):
+        self.sql = sql                # шаблон с {where} и {dir}, см. queries.*_PAGE_SQL
+        self.date_col = date_col      # колонки ключа в SQL (например "o.date")
+        self.id_col = id_col
+        self.date_field = date_field  # имена колонок ключа в результате
+        self.id_field = id_field
+        self.page_size = page_size
+        # постоянное условие (например, диапазон дат), см. set_filter
+        self.filter_sql = ""
+        self.filter_params = ()
+        self.reset()
+
+    def reset(self):
+        """Забыть текущую страницу (вкладку перезагрузили целиком)"""
+        self.first_key = None         # ключ первой (самой новой) строки страницы
+        self.last_key = None          # ключ последней (самой старой) строки
+        self.page = 0                 # номер страницы относительно точки входа
+        self.has_older = False
+        self.has_newer = False
+        self._pending = None
+
+    def set_filter(self, sql="", params=()):
+        """Условие, которое добавляется к каждой странице (без WHERE).
+
+        Меняет набор строк, поэтому текущая страница забывается.
+        """
+        self.filter_sql = sql
+        self.filter_params = tuple(params)
+        self.reset()
+
+    def _build(self, cond, direction, params, move):
+        self._pending = move
+        conds = [c for c in (self.filter_sql, cond) if c]
+        where = "WHERE " + " AND ".join(conds) if conds else ""
+        sql = self.sql.format(where=where, dir=direction)
+        params = self.filter_params + tuple(params)
+        # лишняя строка показывает, есть ли что-то за границей страницы
+        return sql, params + (self.page_size + 1,), direction == "ASC"
+
+    def first(self):
+        """Самые новые заказы. Возвращает (sql, params, reverse)"""
+        return self._build("", "DESC", (), "first")
+
+    def older(self):
+        if self.last_key is None:
+            return self.first()
+        cond = f"({self.date_col}, {self.id_col}) < (?, ?)"
+        return self._build(cond, "DESC", self.last_key, "older")
+
+    def newer(self):
+        if self.first_key is None:
+            return self.first()
+        cond = f"({self.date_col}, {self.id_col}) > (?, ?)"
+        return self._build(cond, "ASC", self.first_key, "newer")
+
+    def jump(self, date):
+        """Страница, начинающаяся с последних заказов за дату date (YYYY-MM-DD)"""
+        return self._build(f"{self.date_col} <= ?", "DESC", (date,), "jump")
+
+    def update(self, columns, rows):
+        """Запомнить границы страницы и вернуть строки для показа (или None).
+
+        rows — уже от новых к старым, с лишней строкой за границей страницы.
+        """
+        move = self._pending or "first"
+        self._pending = None
+        more = len(rows) > self.page_size
+        if more:
+            # при движении к новым лишняя строка — самая новая, иначе — самая старая
+            rows = rows[1:] if move == "newer" else rows[:self.page_size]
+        if not rows:
+            # дальше пусто: остаёмся на месте и запрещаем движение в эту сторону
+            if move == "older":
+                self.has_older = False
+            elif move == "newer":
+                self.has_newer = False
+            return None
+        if move == "first":
+            self.page = 0
+            self.has_newer = False
+            self.has_older = more
+        elif move == "older":
+            self.page += 1
+            self.has_newer = True
+            self.has_older = more
+        elif move == "newer":
+            self.page -= 1
+            self.has_older = True
+            self.has_newer = more
+        else:
+            self.page = 0
+            self.has_older = more
+            # новее точки перехода заказы почти наверняка есть; пустой ответ это уточнит
+            self.has_newer = True
+        d = columns.index(self.date_field)
+        i = columns.index(self.id_field)
+        self.first_key = (rows[0][d], rows[0][i])
+        self.last_key = (rows[-1][d], rows[-1][i])
+        return rows
+
+    def describe(self):
+        if self.first_key is None:
+            return "no page"
+        return f"page {self.page:+d}: {self.first_key[0]} … {self.last_key[0]}"
@@ -0,0 +1,322 @@
+"""Параллельная агрегация bt2/bt3 по диапазонам ключа в нескольких процессах.
+
+SQLite выполняет один запрос в одном потоке. Здесь данные делятся на
+непрерывные диапазоны ключа группировки (orders.customer_id для bt2,
+products.id для bt3), каждый процесс пула со своим read-only соединением
+считает частичные COUNT/SUM/MIN/MAX по своему диапазону, а основной
+процесс складывает их (суммы float — через math.fsum) и последним шагом
+выполняет в SQLite :memory: те же ROUND и ORDER BY, что и одиночный
+запрос, поэтому результат совпадает с queries.BT2_SQL / queries.BT3_SQL
+строка в строку.
+
+Диапазоны берутся по ключу, а не по rowid: так каждый процесс идёт по
+своему куску покрывающего индекса (idx_orders_customer,
+idx_order_items_product) уже в порядке группировки. Диапазон rowid
+пришлось бы группировать через временный B-tree, и половина orders
+считалась бы в 3 раза дольше, чем весь одиночный запрос.
+
+Процессы запускаются через spawn (работает и под Windows, и из окна Qt
+с рабочими потоками) один раз на ParallelAggregator и переиспользуются.
+
+    python parallel_agg.py crm.db --workers 1,2,4,8 --repeat 3
+"""
+import argparse
+import math
+import multiprocessing
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import FIRST_EXCEPTION, ProcessPoolExecutor, wait
+
+from db_pool import ConnectionPool
+from queries import quote_ident, wrap_view
+
+# Частичные агрегаты: {where} — условие на диапазон ключа
+ORDERS_BY_CUSTOMER_SQL = """
+    SELECT customer_id, COUNT(id), SUM(amount)
+    FROM orders
+    WHERE {where}
+    GROUP BY customer_id
+"""
+
+ITEMS_BY_PRODUCT_SQL = """
+    SELECT p.id, SUM(oi.qty), SUM(oi.qty * p.price)
+    FROM products p
+    JOIN order_items oi ON oi.product_id = p.id
+    WHERE {where}
+    GROUP BY p.id
+"""
+
+# Последний шаг — те же выражения, что в queries.BT2_SQL / BT3_SQL
+BT2_FINAL_SQL = """
+    SELECT country, orders_count,
+           ROUND(revenue, 2) AS total_revenue,
+           ROUND(revenue / orders_count, 2) AS avg_order
+    FROM merged
+    ORDER BY total_revenue DESC
+"""
+
+BT3_FINAL_SQL = """
+    SELECT product_name, category, total_qty,
+           ROUND(revenue, 2) AS total_revenue
+    FROM merged
+    ORDER BY total_qty DESC, total_revenue DESC
+    LIMIT 100
+"""
+
+# соединение процесса пула (открывается один раз в _init_worker)
+_worker_conn = None
+
+
+def _init_worker(db_path, pragmas):
+    global _worker_conn
+    _worker_conn = ConnectionPool(db_path, size=1, pragmas=pragmas).acquire()
+
+
+def _partial(sql, params):
+    """Частичный агрегат одного диапазона (выполняется в процессе пула)"""
+    return _worker_conn.execute(sql, params).fetchall()
+
+
+def key_ranges(low, high, parts):
+    """[(low, high)] — parts непрерывных диапазонов целых от low до high"""
+    if low is None:
+        return []
+    step = max((high - low + 1) // parts, 1)
+    ranges = []
+    while low <= high:
+        ranges.append((low, min(low + step - 1, high)))
+        low += step
+    return ranges
+
+
+def _sum(values):
+    """SUM как в SQLite: NULL пропускаются, все NULL — NULL; целые складываются точно"""
+    values = [v for v in values if v is not None]
+    if not values:
+        return None
+    if all(type(v) is int for v in values):
+        return sum(values)
+    return math.fsum(values)
+
+
+def merge(partials, kinds):
+    """Сложить частичные строки (ключ, агрегаты...) -> {ключ: [значения]}.
+
+    kinds — вид каждого агрегата: "count" | "sum" | "min" | "max".
+    Ключ, который встретился в одной порции (при разбиении по ключу — все),
+    берётся как есть; складываются только повторяющиеся.
+    """
+    result = {}
+    repeated = {}
+    for rows in partials:
+        for key, *values in rows:
+            if key in result:
+                repeated.setdefault(key, [result[key]]).append(values)
+            else:
+                result[key] = values
+    for key, rows in repeated.items():
+        merged = []
+        for kind, values in zip(kinds, zip(*rows)):
+            present = [v for v in values if v is not None]
+            if kind == "count":
+                merged.append(sum(present))
+            elif kind == "sum":
+                merged.append(_sum(values))
+            elif kind == "min":
+                merged.append(min(present) if present else None)
+            else:
+                merged.append(max(present) if present else None)
+        result[key] = merged
+    return result
+
+
+def _final(columns, rows, sql, params=()):
+    """Выполнить последний шаг (ROUND, ORDER BY) в SQLite над слитыми строками"""
+    mem = sqlite3.connect(":memory:")
+    try:
+        mem.execute(f"CREATE TABLE merged ({', '.join(quote_ident(c) for c in columns)})")
+        mem.executemany(f"INSERT INTO merged VALUES ({', '.join('?' * len(columns))})", rows)
+        cursor = mem.execute(sql, params)
+        return [d[0] for d in cursor.description], cursor.fetchall()
+    finally:
+        mem.close()
+
+
+def view_rows(columns, rows, sort=None, filters=None):
+    """Сортировка и фильтры из заголовка вкладки (queries.wrap_view) над
+    готовыми строками bt2/bt3 — тем же шагом в SQLite :memory:"""
+    sql, params = wrap_view("SELECT * FROM merged", (), sort, filters)
+    return _final(columns, rows, sql, params)
+
+
+def _group_key(value):
+    # порядок групп как у GROUP BY: NULL первым
+    return (value is not None, value if value is not None else 0)
+
+
+def revenue_rows(by_customer, countries):
+    """(columns, rows) как у queries.BT2_SQL из {customer_id: [count, revenue]}
+    и {customer_id: country}"""
+    per_country = {}
+    for customer_id, (count, revenue) in by_customer.items():
+        # LEFT JOIN customers: клиента нет — страна NULL
+        counts, revenues = per_country.setdefault(countries.get(customer_id), ([], []))
+        counts.append(count)
+        revenues.append(revenue)
+    rows = [(country, sum(counts), _sum(revenues))
+            for country, (counts, revenues) in sorted(per_country.items(),
+                                                      key=lambda item: _group_key(item[0]))]
+    return _final(("country", "orders_count", "revenue"), rows, BT2_FINAL_SQL)
+
+
+def product_rows(by_product, products):
+    """(columns, rows) как у queries.BT3_SQL из {product_id: [qty, revenue]}
+    и {product_id: (name, category)}"""
+    rows = [products[pid] + (qty, revenue) for pid, (qty, revenue) in sorted(by_product.items())]
+    return _final(("product_name", "category", "total_qty", "revenue"), rows, BT3_FINAL_SQL)
+
+
+class ParallelAggregator:
+    """Пул процессов, каждый со своим read-only соединением к базе.
+
+    task — TaskPool фоновой задачи (query_executor.py): после её отмены
+    расчёт не ждёт процессы, а недошедшие до них диапазоны снимаются.
+    """
+
+    # как часто проверять отмену, пока процессы считают (секунды)
+    CANCEL_POLL = 0.05
+
+    def __init__(self, db_path, workers=None, pragmas=None, parts_per_worker=2):
+        self.db_path = db_path
+        self.workers = workers or os.cpu_count() or 1
+        self.parts = self.workers * parts_per_worker
+        self._pool = ConnectionPool(db_path, size=1, pragmas=pragmas)
+        self._executor = ProcessPoolExecutor(
+            self.workers, mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker, initargs=(db_path, pragmas),
+        )
+
+    def warm_up(self, wait=True):
+        """Запустить все процессы пула заранее (spawn занимает заметное время)"""
+        futures = [self._executor.submit(_partial, "SELECT 1", ()) for _ in range(self.workers)]
+        if wait:
+            for f in futures:
+                f.result()
+
+    def _connect(self, task):
+        conn = self._pool.acquire()
+        return task.watch(conn) if task is not None else conn
+
+    def aggregate(self, sql, bounds_sql, column, kinds, nullable=False, task=None):
+        """Частичные агрегаты sql по диапазонам column, слитые через merge().
+
+        bounds_sql возвращает MIN и MAX ключа (отдельными подзапросами: вместе
+        в одном SELECT они не берутся с края индекса); nullable — отдельно посчитать
+        строки с NULL в ключе (в BETWEEN они не попадают).
+        """
+        conn = self._connect(task)
+        try:
+            low, high = conn.execute(bounds_sql).fetchone()
+        finally:
+            conn.close()
+        tasks = [(sql.format(where=f"{column} BETWEEN ? AND ?"), r)
+                 for r in key_ranges(low, high, self.parts)]
+        if nullable:
+            tasks.append((sql.format(where=f"{column} IS NULL"), ()))
+        futures = [self._executor.submit(_partial, task_sql, params) for task_sql, params in tasks]
+        pending = futures
+        while pending:
+            # запрос в другом процессе не прервать: отмена только перестаёт его ждать
+            if task is not None and task.should_stop():
+                for f in futures:
+                    f.cancel()
+                raise sqlite3.OperationalError("interrupted")
+            _, pending = wait(pending, timeout=self.CANCEL_POLL, return_when=FIRST_EXCEPTION)
+        return merge([f.result() for f in futures], kinds)
+
+    def revenue_by_country(self, task=None):
+        """(columns, rows) как у queries.BT2_SQL"""
+        by_customer = self.aggregate(
+            ORDERS_BY_CUSTOMER_SQL,
+            "SELECT (SELECT MIN(customer_id) FROM orders), (SELECT MAX(customer_id) FROM orders)",
+            "customer_id", ("count", "sum"), nullable=True, task=task)
+        conn = self._connect(task)
+        try:
+            countries = dict(conn.execute("SELECT id, country FROM customers"))
+        finally:
+            conn.close()
+        return revenue_rows(by_customer, countries)
+
+    def top_products(self, task=None):
+        """(columns, rows) как у queries.BT3_SQL"""
+        by_product = self.aggregate(
+            ITEMS_BY_PRODUCT_SQL, "SELECT (SELECT MIN(id) FROM products), (SELECT MAX(id) FROM products)",
+            "p.id", ("sum", "sum"), task=task)
+        conn = self._connect(task)
+        try:
+            products = {r[0]: r[1:] for r in conn.execute("SELECT id, name, category FROM products")}
+        finally:
+            conn.close()
+        return product_rows(by_product, products)
+
+    def describe(self):
+        return f"{self.workers} processes"
+
+    def close(self):
+        # не ждём диапазоны, которые процессы ещё считают после отмены
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._pool.close()
+
+
+def _best(fn, repeat):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main(argv=None):
+    import queries
+
+    parser = argparse.ArgumentParser(description="Бенчмарк: bt2/bt3 одним запросом и параллельно")
+    parser.add_argument("db", nargs="?", default="crm.db")
+    parser.add_argument("--workers", default="1,2,4,8", help="число процессов через запятую")
+    parser.add_argument("--repeat", type=int, default=3, help="прогонов, берётся лучший")
+    args = parser.parse_args(argv)
+
+    pool = ConnectionPool(args.db, size=1)
+    conn = pool.acquire()
+    print(f"{args.db}: {os.cpu_count()} CPU(s)")
+    single = {}
+    for name, sql in (("bt2", queries.BT2_SQL), ("bt3", queries.BT3_SQL)):
+        seconds, cursor_rows = _best(lambda: conn.execute(sql).fetchall(), args.repeat)
+        single[name] = (seconds, cursor_rows)
+        print(f"  {name} single query        {seconds * 1000:9.1f} ms")
+    conn.close()
+    pool.close()
+
+    ok = True
+    for workers in (int(w) for w in args.workers.split(",")):
+        agg = ParallelAggregator(args.db, workers)
+        try:
+            agg.warm_up()
+            for name, fn in (("bt2", agg.revenue_by_country), ("bt3", agg.top_products)):
+                seconds, (_, rows) = _best(fn, args.repeat)
+                base, expected = single[name]
+                same = rows == expected
+                ok = ok and same
+                print(f"  {name} {workers:2} worker(s)         {seconds * 1000:9.1f} ms  "
+                      f"x{base / seconds:5.2f}  {'same rows' if same else 'MISMATCH'}")
+        finally:
+            agg.close()
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
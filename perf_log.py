@@ -0,0 +1,126 @@
+"""Замеры запросов по фазам и журнал медленных запросов.
+
+Каждая операция (запрос из кэша или из базы) превращается в запись
+QueryStats: сколько она ждала в очереди, выполнялась в SQLite, читала
+первую порцию, строила модель и подгоняла ширину колонок. Последние
+записи держатся в памяти для вкладки Performance, а всё, что медленнее
+порога, дописывается в JSON-lines файл с ротацией. StartupProfile
+печатает время холодного старта окна (--startup-profile).
+"""
+import json
+import logging
+import time
+from collections import deque
+from logging.handlers import RotatingFileHandler
+
+# порядок фаз в таблице Performance и в журнале
+PHASES = ("queue", "acquire", "execute", "fetch", "model", "resize")
+
+PERF_COLUMNS = ["time", "key", "status", "total_ms"] + [f"{p}_ms" for p in PHASES] + [
+    "rows", "complete", "kbytes", "sql"]
+
+
+class QueryStats:
+    """Одна операция: фазы в секундах, число строк, примерный объём"""
+
+    def __init__(self, key, sql="", params=()):
+        self.key = key
+        self.sql = sql
+        self.params = tuple(params)
+        self.started = time.time()
+        self.phases = {}
+        self.rows = 0
+        self.complete = True      # прочитан ли результат целиком
+        self.bytes = 0
+        self.status = "ok"        # ok | cached | failed | cancelled
+
+    def add(self, phase, seconds):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    @property
+    def total(self):
+        return sum(self.phases.values())
+
+    def to_dict(self):
+        return {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+            "key": self.key,
+            "status": self.status,
+            "total_ms": round(self.total * 1000, 2),
+            "phases_ms": {p: round(s * 1000, 2) for p, s in self.phases.items()},
+            "rows": self.rows,
+            "complete": self.complete,
+            "bytes": self.bytes,
+            "sql": " ".join(self.sql.split()),
+            "params": [p if isinstance(p, (int, float, str)) or p is None else repr(p)
+                       for p in self.params],
+        }
+
+    def row(self):
+        """Строка для таблицы Performance (см. PERF_COLUMNS)"""
+        phases = [round(self.phases[p] * 1000, 2) if p in self.phases else None
+                  for p in PHASES]
+        return (
+            time.strftime("%H:%M:%S", time.localtime(self.started)), self.key,
+            self.status, round(self.total * 1000, 2), *phases,
+            self.rows, "yes" if self.complete else "no",
+            round(self.bytes / 1024, 1), " ".join(self.sql.split())[:200],
+        )
+
+
+class PerfLog:
+    """Последние keep операций в памяти + журнал медленных запросов.
+
+    Журнал — файл JSON-lines (одна запись на строку), который
+    RotatingFileHandler переименовывает в .1, .2, … при достижении
+    max_bytes. Файл создаётся только при первой медленной записи.
+    """
+
+    def __init__(self, path="slow_queries.jsonl", threshold_ms=500, keep=200,
+                 max_bytes=1024 * 1024, backups=3):
+        self.path = path
+        self.threshold_ms = threshold_ms
+        self.recent = deque(maxlen=keep)
+        self.slow = 0
+        self._logger = None
+        if path:
+            self._logger = logging.getLogger(f"crm.slow_queries.{id(self)}")
+            self._logger.propagate = False
+            self._logger.setLevel(logging.INFO)
+            handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups,
+                                          encoding="utf-8", delay=True)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self._logger.addHandler(handler)
+
+    def record(self, stats):
+        """Запомнить операцию; медленную — дописать в журнал"""
+        self.recent.append(stats)
+        if self._logger is not None and stats.total * 1000 >= self.threshold_ms:
+            self.slow += 1
+            self._logger.info(json.dumps(stats.to_dict(), ensure_ascii=False, default=str))
+
+    def rows(self):
+        """Последние операции, новые сверху"""
+        return [s.row() for s in reversed(self.recent)]
+
+    def close(self):
+        if self._logger is not None:
+            for handler in list(self._logger.handlers):
+                handler.close()
+                self._logger.removeHandler(handler)
+            self._logger = None
+
+
+class StartupProfile:
+    """Моменты холодного старта от запуска main.py: импорты, первый кадр окна, первые данные"""
+
+    def __init__(self, started):
+        self.started = started
+        self.marks = {}
+
+    def mark(self, name, note=""):
+        """Запомнить и напечатать момент name (повторные вызовы не учитываются)"""
+        if name in self.marks:
+            return
+        self.marks[name] = time.perf_counter() - self.started
+        print(f"startup: {name} at {self.marks[name] * 1000:.0f} ms{note}", flush=True)
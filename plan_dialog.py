@@ -0,0 +1,57 @@
+from PyQt5.QtWidgets import QDialog, QVBoxLayout, QTreeWidget, QTreeWidgetItem, QLabel, QPushButton
+from PyQt5.QtGui import QBrush, QColor
+
+from query_plan import check_builtin
+
+
+class PlanDialog(QDialog):
+    """Диагностика: EXPLAIN QUERY PLAN для каждого встроенного запроса"""
+
+    def __init__(self, conn, parent=None):
+        super().__init__(parent)
+        self.conn = conn
+        self.setWindowTitle("Diagnostics — query plans")
+        self.resize(800, 500)
+
+        layout = QVBoxLayout(self)
+        self.summary = QLabel()
+        layout.addWidget(self.summary)
+
+        self.tree = QTreeWidget()
+        self.tree.setHeaderLabels(["Query / plan step", "Problem"])
+        self.tree.setColumnWidth(0, 560)
+        layout.addWidget(self.tree)
+
+        refresh = QPushButton("Re-run EXPLAIN")
+        refresh.clicked.connect(self.refresh)
+        layout.addWidget(refresh)
+
+        self.refresh()
+
+    def refresh(self):
+        self.tree.clear()
+        reports = check_builtin(self.conn)
+        red = QBrush(QColor("#c0392b"))
+        for rep in reports:
+            top = QTreeWidgetItem([rep.name, "OK" if rep.ok else f"{len(rep.problems)} problem(s)"])
+            if not rep.ok:
+                top.setForeground(1, red)
+            parents = {-1: top}
+            for depth, detail, reason in rep.plan:
+                item = QTreeWidgetItem([detail, reason or ""])
+                if reason:
+                    item.setForeground(0, red)
+                    item.setForeground(1, red)
+                parents.get(depth - 1, top).addChild(item)
+                parents[depth] = item
+            self.tree.addTopLevelItem(top)
+            top.setExpanded(not rep.ok)
+
+        bad = sum(1 for rep in reports if not rep.ok)
+        if bad:
+            self.summary.setText(
+                f"{bad} of {len(reports)} queries use a full scan or a temp B-tree sort. "
+                "Run `python init_db.py --migrate` to add the indexes."
+            )
+        else:
+            self.summary.setText(f"All {len(reports)} queries use indexes as expected.")
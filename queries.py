@@ -0,0 +1,354 @@
+"""Встроенные запросы CRM Viewer (Tab1, bt1, bt2, bt3, ComboBox).
+
+Параметры — именованные (:date_from, :date_to); по именам запросы
+выполняет реестр query_registry.py. Шаблоны страниц ({where}, {dir})
+собирает pagination.KeysetPager с позиционными «?».
+"""
+import re
+
+# Tab1: все заказы, новые сверху (id — для однозначного порядка внутри дня)
+ORDERS_SQL = "SELECT * FROM orders ORDER BY date DESC, id DESC"
+
+# bt1: заказ → клиент → менеджер
+BT1_SQL = """
+    SELECT o.id AS order_id,
+           c.name AS customer_name,
+           u.name AS user_name,
+           o.amount,
+           o.date
+    FROM orders o
+    LEFT JOIN customers c ON o.customer_id = c.id
+    LEFT JOIN users u ON o.user_id = u.id
+    ORDER BY o.date DESC, o.id DESC
+"""
+
+# bt2: выручка по странам. Сначала агрегируем по customer_id (идёт по
+# индексу idx_orders_customer без сортировки), потом сворачиваем
+# небольшое число клиентов до стран
+BT2_SQL = """
+    SELECT c.country AS country,
+           SUM(o.orders_count) AS orders_count,
+           ROUND(SUM(o.revenue), 2) AS total_revenue,
+           ROUND(SUM(o.revenue) / SUM(o.orders_count), 2) AS avg_order
+    FROM (
+        SELECT customer_id, COUNT(id) AS orders_count, SUM(amount) AS revenue
+        FROM orders
+        GROUP BY customer_id
+    ) o
+    LEFT JOIN customers c ON o.customer_id = c.id
+    GROUP BY c.country
+    ORDER BY total_revenue DESC
+"""
+
+# bt3: топ товаров по количеству и выручке
+BT3_SQL = """
+    SELECT p.name AS product_name,
+           p.category,
+           SUM(oi.qty) AS total_qty,
+           ROUND(SUM(oi.qty * p.price), 2) AS total_revenue
+    FROM order_items oi
+    JOIN products p ON oi.product_id = p.id
+    GROUP BY p.id
+    ORDER BY total_qty DESC, total_revenue DESC
+    LIMIT 100
+"""
+
+# bt2/bt3 по сводным таблицам из summaries.py (если они установлены):
+# читают O(стран) / O(товаров) строк вместо всех заказов.
+# CROSS JOIN фиксирует порядок: сводка снаружи, products по первичному ключу
+BT2_SUMMARY_SQL = """
+    SELECT NULLIF(country, '') AS country,
+           orders_count,
+           ROUND(revenue, 2) AS total_revenue,
+           ROUND(revenue / orders_count, 2) AS avg_order
+    FROM country_revenue
+    WHERE orders_count > 0
+    ORDER BY total_revenue DESC
+"""
+
+BT3_SUMMARY_SQL = """
+    SELECT p.name AS product_name,
+           p.category,
+           s.total_qty,
+           ROUND(s.total_qty * p.price, 2) AS total_revenue
+    FROM product_sales s
+    CROSS JOIN products p ON s.product_id = p.id
+    WHERE s.items_count > 0
+    ORDER BY total_qty DESC, total_revenue DESC
+    LIMIT 100
+"""
+
+# Фильтр по диапазону дат (два параметра: от, до включительно).
+# orders.date — ISO TEXT 'YYYY-MM-DD', строки сравниваются в том же порядке,
+# что и даты, поэтому условие стоит на самой колонке (без date()/strftime())
+# и остаётся диапазонным поиском по idx_orders_date_id: неделя из десяти
+# лет читает только свои строки индекса
+ORDERS_RANGE_SQL = """
+    SELECT * FROM orders
+    WHERE date BETWEEN :date_from AND :date_to
+    ORDER BY date DESC, id DESC
+"""
+
+BT1_RANGE_SQL = """
+    SELECT o.id AS order_id,
+           c.name AS customer_name,
+           u.name AS user_name,
+           o.amount,
+           o.date
+    FROM orders o
+    LEFT JOIN customers c ON o.customer_id = c.id
+    LEFT JOIN users u ON o.user_id = u.id
+    WHERE o.date BETWEEN :date_from AND :date_to
+    ORDER BY o.date DESC, o.id DESC
+"""
+
+# диапазон читается из покрывающего idx_orders_date_id, группировка по
+# клиентам — уже по отобранным строкам
+BT2_RANGE_SQL = """
+    SELECT c.country AS country,
+           SUM(o.orders_count) AS orders_count,
+           ROUND(SUM(o.revenue), 2) AS total_revenue,
+           ROUND(SUM(o.revenue) / SUM(o.orders_count), 2) AS avg_order
+    FROM (
+        SELECT customer_id, COUNT(id) AS orders_count, SUM(amount) AS revenue
+        FROM orders
+        WHERE date BETWEEN :date_from AND :date_to
+        GROUP BY customer_id
+    ) o
+    LEFT JOIN customers c ON o.customer_id = c.id
+    GROUP BY c.country
+    ORDER BY total_revenue DESC
+"""
+
+# заказы диапазона → их позиции по idx_order_items_order_product (покрывающий)
+# → товар по первичному ключу. CROSS JOIN фиксирует этот порядок: при
+# нескольких товарах планировщик иначе начинает со SCAN products
+BT3_RANGE_SQL = """
+    SELECT p.name AS product_name,
+           p.category,
+           SUM(oi.qty) AS total_qty,
+           ROUND(SUM(oi.qty * p.price), 2) AS total_revenue
+    FROM orders o
+    CROSS JOIN order_items oi ON oi.order_id = o.id
+    CROSS JOIN products p ON oi.product_id = p.id
+    WHERE o.date BETWEEN :date_from AND :date_to
+    GROUP BY p.id
+    ORDER BY total_qty DESC, total_revenue DESC
+    LIMIT 100
+"""
+
+# Графики (charts.py): выручка по дням и суммы отдельных заказов во времени.
+# Оба идут по покрывающему idx_orders_date_id в порядке date — без обращения
+# к таблице и без сортировки; _RANGE — с фильтром по датам
+REVENUE_BY_DAY_SQL = """
+    SELECT date, ROUND(SUM(amount), 2) AS revenue
+    FROM orders
+    GROUP BY date
+    ORDER BY date
+"""
+
+REVENUE_BY_DAY_RANGE_SQL = """
+    SELECT date, ROUND(SUM(amount), 2) AS revenue
+    FROM orders
+    WHERE date BETWEEN :date_from AND :date_to
+    GROUP BY date
+    ORDER BY date
+"""
+
+ORDER_AMOUNTS_SQL = "SELECT date, amount FROM orders ORDER BY date, id"
+
+ORDER_AMOUNTS_RANGE_SQL = """
+    SELECT date, amount FROM orders
+    WHERE date BETWEEN :date_from AND :date_to
+    ORDER BY date, id
+"""
+
+# Профиль колонки (Tab3, выбор в ComboBox): порядок не нужен, SQLite сам
+# выберет самый узкий индекс. Имя колонки параметром не передать — реестр
+# подставляет его в {column}, только если оно есть в PRAGMA table_info(orders)
+PROFILE_SQL = "SELECT {column} FROM orders"
+
+
+# Сортировка и фильтры из заголовков таблиц (filter_header.py): запрос
+# вкладки оборачивается в SELECT * FROM (...) WHERE ... ORDER BY ...
+# SQLite разворачивает такой подзапрос (query flattening), поэтому условия
+# и сортировка попадают прямо на orders и идут по индексам: сортировка по
+# amount — по idx_orders_amount, фильтр по date — по idx_orders_date_id.
+# Развернуть нельзя, если ORDER BY есть и внутри, и снаружи, — внутренний
+# ORDER BY в конце запроса убирается (кроме ORDER BY … LIMIT: это срез)
+_ORDER_BY_TAIL = re.compile(r"\s+ORDER\s+BY\s[^()]*$", re.IGNORECASE)
+
+_FILTER_OPS = (">=", "<=", "!=", "<>", ">", "<", "=")
+
+
+def quote_ident(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _filter_value(text):
+    """Число, если текст похож на число, иначе строка"""
+    for cast in (int, float):
+        try:
+            return cast(text)
+        except ValueError:
+            pass
+    return text
+
+
+def column_filter(column, text):
+    """Условие (sql, params) по тексту из поля фильтра колонки.
+
+    >100, <=5, !=0, =x — сравнение; 10..20 — BETWEEN; NULL / NOT NULL;
+    число — равенство; остальной текст — вхождение (LIKE %текст%).
+    """
+    col = quote_ident(column)
+    text = text.strip()
+    if text.upper() == "NULL":
+        return f"{col} IS NULL", ()
+    if text.upper() in ("NOT NULL", "!NULL"):
+        return f"{col} IS NOT NULL", ()
+    for op in _FILTER_OPS:
+        if text.startswith(op):
+            return f"{col} {op} ?", (_filter_value(text[len(op):].strip()),)
+    if ".." in text:
+        low, high = text.split("..", 1)
+        return f"{col} BETWEEN ? AND ?", (_filter_value(low.strip()), _filter_value(high.strip()))
+    value = _filter_value(text)
+    if isinstance(value, str):
+        return f"{col} LIKE ?", (f"%{value}%",)
+    return f"{col} = ?", (value,)
+
+
+def wrap_view(sql, params=(), sort=None, filters=None):
+    """Запрос вкладки с сортировкой (колонка, ASC|DESC) и фильтрами {колонка: текст}.
+
+    Возвращает (sql, params); без сортировки и фильтров — исходный запрос.
+    """
+    if not sort and not filters:
+        return sql, tuple(params)
+    inner = sql.strip()
+    if sort:
+        tail = _ORDER_BY_TAIL.search(inner)
+        if tail and "LIMIT" not in tail.group(0).upper():
+            inner = inner[:tail.start()]
+    conds = []
+    args = list(params)
+    for column, text in (filters or {}).items():
+        cond, values = column_filter(column, text)
+        conds.append(cond)
+        args.extend(values)
+    out = f"SELECT * FROM (\n{inner}\n)"
+    if conds:
+        out += "\nWHERE " + " AND ".join(conds)
+    if sort:
+        column, direction = sort
+        if direction not in ("ASC", "DESC"):
+            raise ValueError(f"bad sort direction: {direction!r}")
+        out += f"\nORDER BY {quote_ident(column)} {direction}"
+    return out, tuple(args)
+
+
+# Постраничный просмотр Tab1/Tab2 по ключу (date, id), см. pagination.py.
+# {where} — условие относительно ключа границы страницы, {dir} — ASC/DESC
+ORDERS_PAGE_SQL = """
+    SELECT * FROM orders
+    {where}
+    ORDER BY date {dir}, id {dir}
+    LIMIT ?
+"""
+
+# Живое обновление Tab1: заказы, добавленные после последнего увиденного id.
+# NOT INDEXED оставляет поиск по rowid: иначе ради ORDER BY планировщик
+# выбирает skip-scan idx_orders_date_id по всем датам (14 мс против 0,03 мс),
+# а отсортировать несколько новых строк ничего не стоит.
+ORDERS_NEW_SQL = """
+    SELECT * FROM orders NOT INDEXED
+    WHERE id > :after_id AND id <= :last_id
+    ORDER BY date DESC, id DESC
+"""
+
+ORDERS_NEW_RANGE_SQL = """
+    SELECT * FROM orders NOT INDEXED
+    WHERE id > :after_id AND id <= :last_id AND date BETWEEN :date_from AND :date_to
+    ORDER BY date DESC, id DESC
+"""
+
+BT1_PAGE_SQL = """
+    SELECT o.id AS order_id,
+           c.name AS customer_name,
+           u.name AS user_name,
+           o.amount,
+           o.date
+    FROM orders o
+    LEFT JOIN customers c ON o.customer_id = c.id
+    LEFT JOIN users u ON o.user_id = u.id
+    {where}
+    ORDER BY o.date {dir}, o.id {dir}
+    LIMIT ?
+"""
+
+
+# Для диагностики планов: имя -> (SQL, ожидаемые строки плана).
+# Ожидаемые строки — это SCAN/TEMP B-TREE, которые допустимы по смыслу
+# запроса (сортировка уже агрегированных строк, обход маленьких
+# справочников и результатов подзапросов); всё остальное — регрессия.
+BUILTIN_QUERIES = {
+    "Tab1 orders": (ORDERS_SQL, []),
+    "bt1 orders with client & manager": (BT1_SQL, []),
+    "bt2 revenue by country": (BT2_SQL, [
+        "SCAN o",
+        "USE TEMP B-TREE FOR GROUP BY",
+        "USE TEMP B-TREE FOR ORDER BY",
+    ]),
+    "bt3 top products": (BT3_SQL, [
+        "SCAN p",
+        "USE TEMP B-TREE FOR ORDER BY",
+    ]),
+}
+
+BUILTIN_QUERIES.update({
+    "Tab1 orders (date range)": (ORDERS_RANGE_SQL, []),
+    "bt1 (date range)": (BT1_RANGE_SQL, []),
+    "bt2 revenue by country (date range)": (BT2_RANGE_SQL, [
+        "USE TEMP B-TREE FOR GROUP BY",
+        "SCAN o",
+        "USE TEMP B-TREE FOR GROUP BY",
+        "USE TEMP B-TREE FOR ORDER BY",
+    ]),
+    "bt3 top products (date range)": (BT3_RANGE_SQL, [
+        "USE TEMP B-TREE FOR GROUP BY",
+        "USE TEMP B-TREE FOR ORDER BY",
+    ]),
+})
+
+BUILTIN_QUERIES.update({
+    "chart revenue by day": (REVENUE_BY_DAY_SQL, []),
+    "chart revenue by day (date range)": (REVENUE_BY_DAY_RANGE_SQL, []),
+    "chart order amounts": (ORDER_AMOUNTS_SQL, []),
+    "chart order amounts (date range)": (ORDER_AMOUNTS_RANGE_SQL, []),
+})
+
+# Сортировка из заголовка: первая страница без сортировки всей таблицы
+BUILTIN_QUERIES["Tab1 sorted by amount"] = (wrap_view(ORDERS_SQL, sort=("amount", "DESC"))[0], [])
+BUILTIN_QUERIES["bt1 sorted by amount"] = (wrap_view(BT1_SQL, sort=("amount", "DESC"))[0], [])
+
+# Страницы Tab1/Tab2 проверяем в виде «следующая страница»
+BUILTIN_QUERIES["Tab1 orders page"] = (
+    ORDERS_PAGE_SQL.format(where="WHERE (date, id) < (?, ?)", dir="DESC"), [])
+BUILTIN_QUERIES["bt1 page"] = (
+    BT1_PAGE_SQL.format(where="WHERE (o.date, o.id) < (?, ?)", dir="DESC"), [])
+BUILTIN_QUERIES["Tab1 new orders"] = (ORDERS_NEW_SQL, ["USE TEMP B-TREE FOR ORDER BY"])
+BUILTIN_QUERIES["Tab1 new orders (date range)"] = (
+    ORDERS_NEW_RANGE_SQL, ["USE TEMP B-TREE FOR ORDER BY"])
+
+# Запросы по сводным таблицам — проверяются, только если таблицы есть
+SUMMARY_QUERIES = {
+    "bt2 revenue by country (summary)": (BT2_SUMMARY_SQL, [
+        "SCAN country_revenue",
+        "USE TEMP B-TREE FOR ORDER BY",
+    ]),
+    "bt3 top products (summary)": (BT3_SUMMARY_SQL, [
+        "SCAN s",
+        "USE TEMP B-TREE FOR ORDER BY",
+    ]),
+}
@@ -0,0 +1,110 @@
+import os
+import sqlite3
+import sys
+from collections import OrderedDict
+
+
+def estimate_size(columns, rows):
+    """Приблизительный объём результата в байтах (списки, кортежи, значения)"""
+    size = sys.getsizeof(rows) + sum(sys.getsizeof(c) for c in columns)
+    for row in rows:
+        size += sys.getsizeof(row)
+        for val in row:
+            size += sys.getsizeof(val)
+    return size
+
+
+class QueryCache:
+    """LRU-кэш результатов запросов по (текст SQL, параметры).
+
+    Кэш сбрасывается целиком, когда меняется PRAGMA data_version
+    (её меняет любой коммит из другого соединения или процесса) или
+    время изменения файла базы/WAL. Пока данные не менялись,
+    повторный запрос отдаётся из памяти без обращения к SQLite.
+
+    files — функция, возвращающая файлы, чьи mtime входят в token
+    (по умолчанию файл базы и его WAL; для месяцев — shards.ShardSet.files).
+    """
+
+    def __init__(self, db_path, connection=None, max_entries=64, max_bytes=64 * 1024 * 1024,
+                 files=None):
+        self.db_path = db_path
+        self._files = files or (lambda: (db_path, db_path + "-wal"))
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.bytes_used = 0
+        self._entries = OrderedDict()   # key -> (columns, rows, size)
+        # отдельное соединение только для опроса data_version
+        self._probe = connection if connection is not None else sqlite3.connect(db_path)
+        self._token = self.token()
+
+    def token(self):
+        """Текущая «версия» данных: data_version + mtime файлов базы"""
+        version = self._probe.execute("PRAGMA data_version").fetchone()[0]
+        mtimes = []
+        for path in self._files():
+            try:
+                mtimes.append(os.stat(path).st_mtime_ns)
+            except OSError:
+                mtimes.append(None)
+        return (version, tuple(mtimes))
+
+    def validate(self):
+        """Сбросить кэш, если данные изменились. Возвращает текущий token"""
+        token = self.token()
+        if token != self._token:
+            self.clear()
+            self._token = token
+        return token
+
+    @staticmethod
+    def _key(sql, params):
+        return (" ".join(sql.split()), tuple(params))
+
+    def get(self, sql, params=()):
+        """(columns, rows) из кэша или None"""
+        self.validate()
+        entry = self._entries.get(self._key(sql, params))
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(self._key(sql, params))
+        self.hits += 1
+        return entry[0], entry[1]
+
+    def put(self, sql, params, columns, rows, token):
+        """Сохранить результат, если данные не менялись с момента token"""
+        if self.validate() != token:
+            # пока шёл запрос, базу успели изменить — результат мог устареть
+            return False
+        size = estimate_size(columns, rows)
+        if size > self.max_bytes:
+            return False
+        key = self._key(sql, params)
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.bytes_used -= old[2]
+        self._entries[key] = (list(columns), rows, size)
+        self.bytes_used += size
+        while self._entries and (len(self._entries) > self.max_entries
+                                 or self.bytes_used > self.max_bytes):
+            _, (_, _, evicted) = self._entries.popitem(last=False)
+            self.bytes_used -= evicted
+        return True
+
+    def clear(self):
+        self._entries.clear()
+        self.bytes_used = 0
+
+    def stats_text(self):
+        return (f"cache: {self.hits} hit / {self.misses} miss, "
+                f"{len(self._entries)} entries, {self.bytes_used / 1024:.0f} KB")
+
+    def close(self):
+        self.clear()
+        try:
+            self._probe.close()
+        except Exception:
+            pass
@@ -0,0 +1,565 @@
+import itertools
+import sqlite3
+import threading
+import time
+
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+from approx_agg import ApproxAggregate
+from column_profile import ColumnProfiler, PROFILE_COLUMNS
+from export import column_kinds, export_cursor, export_rows, format_for_path
+
+
+class QueryResult:
+    """Результат фонового запроса: первая порция строк и открытый курсор"""
+
+    def __init__(self, key, task_id, connection, cursor, columns, rows, elapsed):
+        self.key = key
+        self.task_id = task_id
+        self.connection = connection
+        self.cursor = cursor
+        self.columns = columns
+        self.rows = rows
+        self.elapsed = elapsed
+        # фазы в секундах: queue, acquire, execute, fetch (см. perf_log.PHASES)
+        self.timings = {}
+        # почему поток строк остановлен раньше конца ("row budget", "time budget")
+        self.stopped = None
+
+    def close(self):
+        """Закрыть курсор и соединение, если результат никому не нужен"""
+        try:
+            if self.cursor is not None:
+                self.cursor.close()
+            if self.connection is not None:
+                self.connection.close()
+        except Exception:
+            pass
+        self.cursor = None
+        self.connection = None
+
+
+class QuerySignals(QObject):
+    """Сигналы задачи: QRunnable сам не может их объявлять"""
+    finished = pyqtSignal(object)            # QueryResult
+    failed = pyqtSignal(str, int, str)       # (key, task_id, message)
+    cancelled = pyqtSignal(str, int)         # (key, task_id)
+    progress = pyqtSignal(str, int, int)     # (key, task_id, vm_steps)
+    partial = pyqtSignal(str, int, object)   # (key, task_id, промежуточный результат)
+
+
+class QueryTask(QRunnable):
+    """Выполняет запрос на своём соединении в пуле потоков.
+
+    Отмена работает через Connection.interrupt() и progress handler,
+    поэтому останавливает SQLite даже посреди длинного GROUP BY.
+    """
+
+    # как часто (в инструкциях VM) SQLite вызывает progress handler
+    PROGRESS_STEPS = 10000
+    # не чаще чем раз в столько секунд отправляем сигнал progress
+    PROGRESS_INTERVAL = 0.1
+    # work(conn) получает соединение из пула; False — work(None)
+    OWN_CONNECTION = True
+
+    def __init__(self, key, task_id, pool, sql, params=(), chunk_size=1000):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.key = key
+        self.task_id = task_id
+        self.pool = pool
+        self.sql = sql
+        self.params = params
+        self.chunk_size = chunk_size
+        self.signals = QuerySignals()
+        self._conn = None
+        # соединения, которые работа задачи открыла сама (см. TaskPool)
+        self._watched = []
+        self._lock = threading.Lock()
+        self._cancelled = False
+        self._steps = 0
+        self._last_emit = 0.0
+        self._submitted = time.perf_counter()
+        self.timings = {}
+
+    def cancel(self):
+        with self._lock:
+            self._cancelled = True
+            for conn in [self._conn] + self._watched:
+                if conn is None:
+                    continue
+                try:
+                    conn.interrupt()
+                except (sqlite3.ProgrammingError, AttributeError):
+                    pass  # уже закрыто (или возвращено в пул)
+
+    def watch(self, conn):
+        """Прерывать conn при отмене задачи (и сразу, если она уже отменена)"""
+        conn.set_progress_handler(self._on_progress, self.PROGRESS_STEPS)
+        with self._lock:
+            self._watched.append(conn)
+            if self._cancelled:
+                conn.interrupt()
+        return conn
+
+    def _unwatch(self):
+        """Снять progress handler с соединений из watch() и забыть их: иначе
+        поздний cancel() прервал бы чужой запрос на соединении, вернувшемся
+        в пул, а следующая задача получала бы наши сигналы progress"""
+        with self._lock:
+            watched, self._watched = self._watched, []
+            for conn in watched:
+                try:
+                    conn.set_progress_handler(None, 0)
+                except (sqlite3.ProgrammingError, AttributeError):
+                    pass  # уже закрыто (или возвращено в пул)
+
+    def _on_progress(self):
+        self._steps += self.PROGRESS_STEPS
+        now = time.monotonic()
+        if now - self._last_emit >= self.PROGRESS_INTERVAL:
+            self._last_emit = now
+            self.signals.progress.emit(self.key, self.task_id, self._steps)
+        # ненулевой ответ прерывает текущий запрос
+        return 1 if self._cancelled else 0
+
+    def run(self):
+        conn = None
+        start = time.perf_counter()
+        self.timings["queue"] = start - self._submitted
+        try:
+            with self._lock:
+                if self._cancelled:
+                    self.signals.cancelled.emit(self.key, self.task_id)
+                    return
+                if self.OWN_CONNECTION:
+                    conn = self.pool.acquire()
+                self._conn = conn
+            self.timings["acquire"] = time.perf_counter() - start
+            if conn is not None:
+                conn.set_progress_handler(self._on_progress, self.PROGRESS_STEPS)
+            try:
+                result = self.work(conn)
+            finally:
+                self._unwatch()
+            if conn is not None:
+                conn.set_progress_handler(None, 0)
+        except Exception as e:
+            with self._lock:
+                self._conn = None
+            if conn is not None:
+                conn.close()
+            if self._cancelled:
+                self.signals.cancelled.emit(self.key, self.task_id)
+            else:
+                self.signals.failed.emit(self.key, self.task_id, str(e))
+            return
+
+        with self._lock:
+            self._conn = None
+        if result.connection is None and conn is not None:
+            conn.close()
+        result.elapsed = time.perf_counter() - start
+        result.timings = self.timings
+        self.signals.finished.emit(result)
+
+    def work(self, conn):
+        """Выполнить запрос и прочитать первую порцию строк"""
+        t0 = time.perf_counter()
+        cursor = conn.execute(self.sql, self.params)
+        t1 = time.perf_counter()
+        columns = [d[0] for d in cursor.description] if cursor.description else []
+        rows = cursor.fetchmany(self.chunk_size)
+        self.timings["execute"] = t1 - t0
+        self.timings["fetch"] = time.perf_counter() - t1
+        # дальше курсор читает модель в GUI-потоке порциями
+        return QueryResult(self.key, self.task_id, conn, cursor, columns, rows, 0.0)
+
+
+class ProfileTask(QueryTask):
+    """Профиль колонки за один проход по курсору (см. column_profile.py).
+
+    Пока идёт проход, раз в PARTIAL_INTERVAL секунд отправляет
+    промежуточный профиль через signals.partial.
+    """
+
+    PARTIAL_INTERVAL = 0.5
+
+    def __init__(self, key, task_id, pool, sql, column, chunk_size=10000):
+        super().__init__(key, task_id, pool, sql, (), chunk_size)
+        self.column = column
+
+    def work(self, conn):
+        profiler = ColumnProfiler(self.column)
+        t0 = time.perf_counter()
+        cursor = conn.execute(self.sql, self.params)
+        self.timings["execute"] = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        last = time.monotonic()
+        while True:
+            chunk = cursor.fetchmany(self.chunk_size)
+            if not chunk:
+                break
+            if self._cancelled:
+                raise sqlite3.OperationalError("interrupted")
+            profiler.update([r[0] for r in chunk])
+            now = time.monotonic()
+            if now - last >= self.PARTIAL_INTERVAL:
+                last = now
+                self.signals.partial.emit(self.key, self.task_id, profiler.rows())
+        cursor.close()
+        # для профиля fetch — весь проход вместе с подсчётом статистик
+        self.timings["fetch"] = time.perf_counter() - t0
+        return QueryResult(self.key, self.task_id, None, None,
+                           PROFILE_COLUMNS, profiler.rows(), 0.0)
+
+
+class StreamTask(QueryTask):
+    """Потоковое чтение произвольного запроса порциями через signals.partial.
+
+    Строки не накапливаются в задаче: каждая порция fetchmany сразу
+    уходит в GUI как {"columns", "rows", "total", "elapsed"}. Первая
+    порция маленькая, чтобы первые строки появились за миллисекунды.
+    Поток останавливается по бюджету строк или времени; время
+    проверяется и в progress handler, поэтому долгий GROUP BY до первой
+    строки тоже прерывается.
+    """
+
+    FIRST_CHUNK = 100
+
+    def __init__(self, key, task_id, pool, sql, params=(), chunk_size=2000,
+                 max_rows=100_000, max_seconds=30.0):
+        super().__init__(key, task_id, pool, sql, params, chunk_size)
+        self.max_rows = max_rows
+        self.max_seconds = max_seconds
+        self._deadline = None
+        self._timed_out = False
+
+    def _on_progress(self):
+        if self._deadline is not None and time.monotonic() > self._deadline:
+            self._timed_out = True
+            return 1
+        return super()._on_progress()
+
+    def work(self, conn):
+        self._deadline = time.monotonic() + self.max_seconds
+        started = time.perf_counter()
+        columns = []
+        total = 0
+        stopped = None
+        try:
+            cursor = conn.execute(self.sql, self.params)
+            self.timings["execute"] = time.perf_counter() - started
+            columns = [d[0] for d in cursor.description] if cursor.description else []
+            size = min(self.FIRST_CHUNK, self.max_rows)
+            while True:
+                chunk = cursor.fetchmany(size)
+                if chunk:
+                    total += len(chunk)
+                    self.signals.partial.emit(self.key, self.task_id, {
+                        "columns": columns, "rows": chunk, "total": total,
+                        "elapsed": time.perf_counter() - started,
+                    })
+                if len(chunk) < size:
+                    break
+                if total >= self.max_rows:
+                    stopped = "row budget"
+                    break
+                if time.monotonic() > self._deadline:
+                    stopped = "time budget"
+                    break
+                size = min(self.chunk_size, self.max_rows - total)
+            cursor.close()
+        except sqlite3.OperationalError:
+            if not self._timed_out or self._cancelled:
+                raise
+            stopped = "time budget"
+        self.timings["fetch"] = time.perf_counter() - started - self.timings.get("execute", 0.0)
+        result = QueryResult(self.key, self.task_id, None, None, columns, [], 0.0)
+        result.stopped = stopped
+        return result
+
+
+class ApproxTask(QueryTask):
+    """bt2/bt3 по выборке (см. approx_agg.py), затем точный ответ.
+
+    Первая оценка отправляется через signals.partial примерно через
+    FIRST_SECONDS, дальше оценка уточняется и отправляется раз в
+    PARTIAL_INTERVAL секунд, пока худший интервал не станет уже
+    precision или не выйдет refine_seconds. После этого выполняется
+    точный запрос sql (или exact(pool) с TaskPool, как у CallTask), и его
+    строки — результат задачи.
+    Промежуточный результат: {"columns", "rows", "fraction", "precision",
+    "table", "elapsed"}.
+    """
+
+    FIRST_SECONDS = 0.08
+    PARTIAL_INTERVAL = 0.5
+
+    def __init__(self, key, task_id, pool, sql, params, kind, exact=None,
+                 refine_seconds=2.0, precision=0.01):
+        super().__init__(key, task_id, pool, sql, params)
+        self.kind = kind
+        self.exact = exact
+        self.refine_seconds = refine_seconds
+        self.precision = precision
+
+    def work(self, conn):
+        started = time.perf_counter()
+        approx = ApproxAggregate(self.kind, conn)
+        seconds = self.FIRST_SECONDS
+        while True:
+            more = approx.refine(seconds)
+            if self._cancelled:
+                raise sqlite3.OperationalError("interrupted")
+            columns, rows, precision = approx.result()
+            elapsed = time.perf_counter() - started
+            self.signals.partial.emit(self.key, self.task_id, {
+                "columns": columns, "rows": rows, "fraction": approx.fraction,
+                "precision": precision, "table": approx.table, "elapsed": elapsed,
+            })
+            if not more or precision <= self.precision or elapsed >= self.refine_seconds:
+                break
+            seconds = self.PARTIAL_INTERVAL
+        # в журнале: выборка — фаза fetch, точный ответ — execute
+        self.timings["fetch"] = time.perf_counter() - started
+        t0 = time.perf_counter()
+        if self.exact is not None:
+            columns, rows = self.exact(TaskPool(self))
+            if self._cancelled:
+                raise sqlite3.OperationalError("interrupted")
+        else:
+            cursor = conn.execute(self.sql, self.params)
+            columns = [d[0] for d in cursor.description]
+            rows = cursor.fetchall()
+        self.timings["execute"] = time.perf_counter() - t0
+        return QueryResult(self.key, self.task_id, None, None, columns, rows, 0.0)
+
+
+class ExportTask(QueryTask):
+    """Экспорт в файл (см. export.py): заново выполняет sql и пишет
+    строки порциями прямо из курсора; если sql нет — пишет rows.
+
+    Прогресс {"rows", "elapsed"} отправляется через signals.partial.
+    """
+
+    PARTIAL_INTERVAL = 0.2
+
+    def __init__(self, key, task_id, pool, path, fmt=None, sql="", params=(),
+                 columns=None, rows=None):
+        super().__init__(key, task_id, pool, sql, params)
+        self.path = path
+        self.fmt = fmt or format_for_path(path)
+        self.columns = columns
+        self.rows = rows
+        self._last_partial = 0.0
+
+    def _on_written(self, count, elapsed):
+        now = time.monotonic()
+        if now - self._last_partial >= self.PARTIAL_INTERVAL:
+            self._last_partial = now
+            self.signals.partial.emit(self.key, self.task_id, {"rows": count, "elapsed": elapsed})
+
+    def work(self, conn):
+        started = time.perf_counter()
+        options = {"progress": self._on_written, "should_stop": lambda: self._cancelled}
+        if self.rows is not None:
+            count = export_rows(self.columns, self.rows, self.path, self.fmt, **options)
+        else:
+            if self.fmt == "parquet":
+                # типы колонок и строки — из одного снимка базы (см. export.py)
+                conn.execute("BEGIN")
+                options["kinds"] = column_kinds(conn, self.sql, self.params)
+            cursor = conn.execute(self.sql, self.params)
+            try:
+                count = export_cursor(cursor, self.path, self.fmt, **options)
+            finally:
+                cursor.close()
+                if conn.in_transaction:
+                    conn.rollback()
+        elapsed = time.perf_counter() - started
+        self.timings["execute"] = elapsed
+        return QueryResult(self.key, self.task_id, None, None,
+                           ["path", "format", "rows", "seconds"],
+                           [(self.path, self.fmt, count, round(elapsed, 2))], 0.0)
+
+
+class TaskPool:
+    """Пул соединений, который задача отдаёт своей функции (CallTask, ApproxTask).
+
+    Соединения из acquire()/connect() и переданные в watch() получают
+    progress handler задачи, и отмена прерывает их через interrupt() —
+    как собственное соединение QueryTask. should_stop() — для работы вне
+    SQLite (ожидание процессов, циклы по порциям). Остальное (pragmas,
+    describe, ...) берётся у настоящего пула.
+    """
+
+    def __init__(self, task):
+        self._task = task
+
+    def __getattr__(self, name):
+        return getattr(self._task.pool, name)
+
+    def acquire(self):
+        return self.watch(self._task.pool.acquire())
+
+    def connect(self, pragmas=None):
+        return self.watch(self._task.pool.connect(pragmas))
+
+    def watch(self, conn):
+        """Отменять вместе с задачей запросы на conn; возвращает conn"""
+        return self._task.watch(conn)
+
+    def should_stop(self):
+        return self._task._cancelled
+
+
+class CallTask(QueryTask):
+    """Произвольная фоновая работа: fn(pool) -> (columns, rows).
+
+    fn получает TaskPool: запросы на взятых через него соединениях
+    прерываются отменой задачи. Своего соединения задача не берёт — fn
+    может и вовсе не читать пул (ShardAggregator открывает месяцы сам).
+    """
+
+    OWN_CONNECTION = False
+
+    def __init__(self, key, task_id, pool, fn):
+        super().__init__(key, task_id, pool, "")
+        self.fn = fn
+
+    def work(self, conn):
+        t0 = time.perf_counter()
+        columns, rows = self.fn(TaskPool(self))
+        if self._cancelled:
+            raise sqlite3.OperationalError("interrupted")
+        self.timings["execute"] = time.perf_counter() - t0
+        return QueryResult(self.key, self.task_id, None, None, columns, rows, 0.0)
+
+
+class QueryExecutor(QObject):
+    """Запускает запросы вне GUI-потока и возвращает результаты сигналами.
+
+    Запросы различаются ключом (например "bt2"): пока запрос с этим ключом
+    выполняется, повторный submit() не ставит в очередь ещё один проход.
+    """
+
+    started = pyqtSignal(str)
+    finished = pyqtSignal(str, object)   # (key, QueryResult)
+    failed = pyqtSignal(str, str)        # (key, message)
+    cancelled = pyqtSignal(str)
+    progress = pyqtSignal(str, int)      # (key, vm_steps)
+    partial = pyqtSignal(str, object)    # (key, промежуточный результат)
+
+    def __init__(self, pool, max_threads=4, parent=None):
+        super().__init__(parent)
+        self.pool = pool
+        self.threads = QThreadPool(self)
+        self.threads.setMaxThreadCount(max_threads)
+        self._running = {}
+        # задачи держим до их завершения, даже если они уже отменены
+        self._alive = {}
+        self._ids = itertools.count(1)
+
+    def is_running(self, key=None):
+        if key is None:
+            return bool(self._running)
+        return key in self._running
+
+    def submit(self, key, sql, params=(), chunk_size=1000, replace=False):
+        """Поставить запрос в пул. Возвращает False, если такой уже идёт.
+
+        replace=True отменяет выполняющийся запрос с тем же ключом и
+        запускает новый (нужно для ComboBox, где важен последний выбор).
+        """
+        task = QueryTask(key, next(self._ids), self.pool, sql, params, chunk_size)
+        return self.start_task(task, replace)
+
+    def submit_profile(self, key, sql, column, replace=True):
+        """Построить профиль колонки в фоне (результат — строки профиля)"""
+        task = ProfileTask(key, next(self._ids), self.pool, sql, column)
+        return self.start_task(task, replace)
+
+    def submit_stream(self, key, sql, params=(), max_rows=100_000, max_seconds=30.0,
+                      replace=False):
+        """Читать запрос порциями в signals partial (см. StreamTask)"""
+        task = StreamTask(key, next(self._ids), self.pool, sql, params,
+                          max_rows=max_rows, max_seconds=max_seconds)
+        return self.start_task(task, replace)
+
+    def submit_approx(self, key, sql, kind, exact=None, replace=False):
+        """Оценка bt2/bt3 по выборке в signals partial, затем точный sql (см. ApproxTask)"""
+        task = ApproxTask(key, next(self._ids), self.pool, sql, (), kind, exact)
+        return self.start_task(task, replace)
+
+    def submit_export(self, key, path, fmt=None, sql="", params=(), columns=None, rows=None):
+        """Экспорт запроса (или готовых строк) в файл в пуле потоков"""
+        task = ExportTask(key, next(self._ids), self.pool, path, fmt, sql, params, columns, rows)
+        return self.start_task(task)
+
+    def submit_call(self, key, fn, replace=False):
+        """Выполнить fn(pool) -> (columns, rows) в пуле потоков"""
+        return self.start_task(CallTask(key, next(self._ids), self.pool, fn), replace)
+
+    def start_task(self, task, replace=False):
+        key = task.key
+        if key in self._running:
+            if not replace:
+                return False
+            self.cancel(key)
+        task.signals.finished.connect(self._on_finished)
+        task.signals.failed.connect(self._on_failed)
+        task.signals.cancelled.connect(self._on_cancelled)
+        task.signals.progress.connect(self._on_progress)
+        task.signals.partial.connect(self._on_partial)
+        self._running[key] = task
+        self._alive[task.task_id] = task
+        self.threads.start(task)
+        self.started.emit(key)
+        return True
+
+    def cancel(self, key=None):
+        """Отменить запрос по ключу или все выполняющиеся запросы"""
+        keys = [key] if key is not None else list(self._running)
+        for k in keys:
+            task = self._running.pop(k, None)
+            if task is not None:
+                task.cancel()
+                self.cancelled.emit(k)
+
+    def shutdown(self):
+        self.cancel()
+        self.threads.waitForDone()
+
+    def _current(self, key, task_id):
+        task = self._running.get(key)
+        return task is not None and task.task_id == task_id
+
+    def _on_finished(self, result):
+        self._alive.pop(result.task_id, None)
+        if not self._current(result.key, result.task_id):
+            # запрос уже отменён или заменён — результат никому не нужен
+            result.close()
+            return
+        del self._running[result.key]
+        self.finished.emit(result.key, result)
+
+    def _on_failed(self, key, task_id, message):
+        self._alive.pop(task_id, None)
+        if self._current(key, task_id):
+            del self._running[key]
+            self.failed.emit(key, message)
+
+    def _on_cancelled(self, key, task_id):
+        self._alive.pop(task_id, None)
+        if self._current(key, task_id):
+            del self._running[key]
+            self.cancelled.emit(key)
+
+    def _on_progress(self, key, task_id, steps):
+        if self._current(key, task_id):
+            self.progress.emit(key, steps)
+
+    def _on_partial(self, key, task_id, value):
+        if self._current(key, task_id):
+            self.partial.emit(key, value)
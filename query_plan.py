@@ -0,0 +1,104 @@
+"""Проверка планов встроенных запросов через EXPLAIN QUERY PLAN.
+
+Запуск из консоли (код возврата 1, если есть регрессии):
+    python query_plan.py crm.db
+"""
+import sqlite3
+import sys
+from collections import Counter
+
+import approx_agg
+import queries
+import rollups
+import summaries
+from query_registry import QueryRegistry, null_params
+
+
+class PlanReport:
+    """План одного запроса и строки, которые выглядят как регрессия"""
+
+    def __init__(self, name, sql, plan, problems):
+        self.name = name
+        self.sql = sql
+        self.plan = plan            # [(depth, detail, reason или None)]
+        self.problems = problems    # [(detail, reason)]
+
+    @property
+    def ok(self):
+        return not self.problems
+
+
+def classify(detail):
+    """Причина, по которой строка плана подозрительна, или None"""
+    if detail.startswith("USE TEMP B-TREE"):
+        return "temp B-tree sort"
+    if detail.startswith("SCAN ") and " USING " not in detail:
+        return "full scan"
+    return None
+
+
+def explain(conn, sql, params=()):
+    """[(depth, detail)] из EXPLAIN QUERY PLAN с глубиной вложенности"""
+    rows = conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+    depth = {0: -1}
+    plan = []
+    for node_id, parent, _, detail in rows:
+        depth[node_id] = depth.get(parent, -1) + 1
+        plan.append((depth[node_id], detail))
+    return plan
+
+
+def check_query(conn, name, sql, expected=(), params=None):
+    """Проверить план запроса; expected — допустимые SCAN/TEMP B-TREE строки"""
+    if params is None:
+        params = null_params(sql)
+    allowed = Counter(expected)
+    plan = []
+    problems = []
+    for depth, detail in explain(conn, sql, params):
+        reason = classify(detail)
+        if reason is not None and allowed[detail] > 0:
+            # ожидаемая строка: учитываем, сколько раз её можно встретить
+            allowed[detail] -= 1
+            reason = None
+        if reason is not None:
+            problems.append((detail, reason))
+        plan.append((depth, detail, reason))
+    return PlanReport(name, sql, plan, problems)
+
+
+def check_builtin(conn):
+    """Проверить все встроенные запросы (и ComboBox для каждой колонки orders)"""
+    builtin = dict(queries.BUILTIN_QUERIES)
+    builtin.update(approx_agg.plan_queries())
+    if summaries.is_installed(conn):
+        builtin.update(queries.SUMMARY_QUERIES)
+    if rollups.is_installed(conn):
+        builtin.update(rollups.plan_queries())
+    reports = [check_query(conn, name, sql, expected)
+               for name, (sql, expected) in builtin.items()]
+    registry = QueryRegistry(conn)
+    for col in registry.columns("orders"):
+        # профиль читает все значения колонки: SCAN допустим, если SQLite
+        # не нашёл более узкого покрывающего индекса
+        sql, params = registry.bind("profile", column=col)
+        reports.append(check_query(conn, f"ComboBox {col}", sql, ["SCAN orders"], params))
+    return reports
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    db_path = argv[0] if argv else "crm.db"
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    reports = check_builtin(conn)
+    conn.close()
+    for rep in reports:
+        print(f"[{'OK' if rep.ok else 'FAIL'}] {rep.name}")
+        for depth, detail, reason in rep.plan:
+            mark = f"   <-- {reason}" if reason else ""
+            print(f"    {'  ' * depth}{detail}{mark}")
+    return 0 if all(rep.ok for rep in reports) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,179 @@
+"""Реестр запросов окна: каждый запрос описан один раз и вызывается по имени.
+
+Query хранит SQL с именованными параметрами (:date_from) и, если нужно,
+имена колонок в фигурных скобках ({column}) — их параметром не передать.
+QueryRegistry.bind() проверяет, что переданы ровно нужные параметры, а
+имена колонок есть в PRAGMA table_info, и отдаёт (sql, params) с
+позиционными «?»: окно, кэш результатов и обёртка сортировки/фильтров
+(queries.wrap_view) работают с кортежами параметров.
+
+Текст SQL запроса не зависит от значений параметров, поэтому sqlite3
+готовит его один раз на соединение пула и дальше берёт из кэша
+cached_statements (db_pool.STATEMENT_CACHE), а не разбирает на каждый клик.
+
+Реестр используют окно (main.py), проверка планов (query_plan.py) и
+консольный запуск без окна:
+    python query_registry.py list
+    python query_registry.py run crm.db bt2
+    python query_registry.py run crm.db bt3_range date_from=2026-01-01 date_to=2026-03-31
+    python query_registry.py run crm.db profile column=amount --repeat 5
+"""
+import argparse
+import re
+import sys
+import time
+
+import queries
+from db_pool import ConnectionPool
+
+# :name вне строковых литералов ('...' пропускаются целиком)
+_NAMED = re.compile(r"'[^']*'|(?<![:\w]):([A-Za-z_]\w*)")
+
+
+def param_names(sql):
+    """Именованные параметры в порядке появления (с повторами)"""
+    return [m.group(1) for m in _NAMED.finditer(sql) if m.group(1)]
+
+
+def null_params(sql):
+    """Параметры-заглушки для EXPLAIN: {имя: None} или (None, ...) для «?»"""
+    names = param_names(sql)
+    if names:
+        return dict.fromkeys(names)
+    return (None,) * sql.count("?")
+
+
+class Query:
+    """Один запрос: имя, описание, SQL и откуда берутся имена колонок"""
+
+    def __init__(self, name, title, sql, identifiers=None):
+        self.name = name
+        self.title = title
+        self.sql = sql
+        # {подстановка: таблица}, например {"column": "orders"}
+        self.identifiers = dict(identifiers or {})
+        self._order = param_names(sql)
+        self.params = tuple(dict.fromkeys(self._order))
+        self.positional = _NAMED.sub(lambda m: "?" if m.group(1) else m.group(0), sql)
+
+
+QUERIES = {q.name: q for q in (
+    Query("tab1", "Tab1: all orders, newest first", queries.ORDERS_SQL),
+    Query("tab1_range", "Tab1: orders in a date range", queries.ORDERS_RANGE_SQL),
+    Query("bt1", "bt1: orders with client & manager", queries.BT1_SQL),
+    Query("bt1_range", "bt1 in a date range", queries.BT1_RANGE_SQL),
+    Query("bt2", "bt2: revenue by country", queries.BT2_SQL),
+    Query("bt2_range", "bt2 in a date range", queries.BT2_RANGE_SQL),
+    Query("bt2_summary", "bt2 from the country_revenue summary table", queries.BT2_SUMMARY_SQL),
+    Query("bt3", "bt3: top products", queries.BT3_SQL),
+    Query("bt3_range", "bt3 in a date range", queries.BT3_RANGE_SQL),
+    Query("bt3_summary", "bt3 from the product_sales summary table", queries.BT3_SUMMARY_SQL),
+    Query("profile", "ComboBox: one orders column for the Tab3 profile",
+          queries.PROFILE_SQL, {"column": "orders"}),
+    Query("revenue_by_day", "Charts: revenue per day", queries.REVENUE_BY_DAY_SQL),
+    Query("revenue_by_day_range", "Charts: revenue per day in a date range",
+          queries.REVENUE_BY_DAY_RANGE_SQL),
+    Query("order_amounts", "Charts: every order amount over time", queries.ORDER_AMOUNTS_SQL),
+    Query("order_amounts_range", "Charts: order amounts in a date range",
+          queries.ORDER_AMOUNTS_RANGE_SQL),
+    Query("new_orders", "Live refresh: orders after the last seen id", queries.ORDERS_NEW_SQL),
+    Query("new_orders_range", "Live refresh in a date range", queries.ORDERS_NEW_RANGE_SQL),
+    Query("max_order_id", "Live refresh: last order id", "SELECT max(id) FROM orders"),
+    Query("date_bounds", "Date filter: first and last order date",
+          "SELECT (SELECT min(date) FROM orders), (SELECT max(date) FROM orders)"),
+)}
+
+
+class QueryRegistry:
+    """Запросы QUERIES, связанные с базой: знает её колонки для проверки имён.
+
+    conn нужен только для PRAGMA table_info (читается один раз на таблицу);
+    bind() без подстановок колонок к базе не обращается и годится для
+    рабочих потоков. overrides — {имя: Query}, подменяющие запросы QUERIES
+    для другой раскладки базы (например, shards.QUERY_OVERRIDES).
+    """
+
+    def __init__(self, conn=None, overrides=None):
+        self._conn = conn
+        self._overrides = dict(overrides or {})
+        self._columns = {}
+
+    def columns(self, table):
+        """Имена колонок таблицы по PRAGMA table_info (кэшируются)"""
+        if table not in self._columns:
+            rows = self._conn.execute(f"PRAGMA table_info({queries.quote_ident(table)})").fetchall()
+            self._columns[table] = [r[1] for r in rows]  # (cid, name, type, ...)
+        return self._columns[table]
+
+    def bind(self, name, **values):
+        """(sql, params) запроса name; ValueError — неизвестный запрос, параметр или колонка"""
+        query = self._overrides.get(name) or QUERIES.get(name)
+        if query is None:
+            raise ValueError(f"unknown query {name!r}")
+        names = {}
+        for key, table in query.identifiers.items():
+            value = values.pop(key, None)
+            if value not in self.columns(table):
+                raise ValueError(f"{name}: no column {value!r} in {table}")
+            names[key] = queries.quote_ident(value)
+        missing = [p for p in query.params if p not in values]
+        extra = sorted(set(values) - set(query.params))
+        if missing or extra:
+            raise ValueError(f"{name}: missing {missing or '-'}, unexpected {extra or '-'}")
+        sql = query.positional.format(**names) if names else query.positional
+        return sql, tuple(values[p] for p in query._order)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Запросы CRM Viewer без окна")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="перечислить запросы и их параметры")
+    run = sub.add_parser("run", help="выполнить запрос и напечатать строки")
+    run.add_argument("db")
+    run.add_argument("name")
+    run.add_argument("values", nargs="*", metavar="NAME=VALUE")
+    run.add_argument("--limit", type=int, default=20, help="сколько строк напечатать")
+    run.add_argument("--repeat", type=int, default=1, help="выполнить несколько раз и показать время")
+    args = parser.parse_args(argv)
+
+    if args.command == "list":
+        for query in QUERIES.values():
+            params = [f":{p}" for p in query.params] + [f"{{{k}}}" for k in query.identifiers]
+            print(f"{query.name:<22} {' '.join(params):<36} {query.title}")
+        return 0
+
+    values = {}
+    for item in args.values:
+        key, sep, value = item.partition("=")
+        if not sep:
+            parser.error(f"expected NAME=VALUE, got {item!r}")
+        values[key] = value
+    pool = ConnectionPool(args.db, size=1)
+    conn = pool.acquire()
+    try:
+        try:
+            sql, params = QueryRegistry(conn).bind(args.name, **values)
+        except ValueError as e:
+            parser.error(str(e))
+        timings = []
+        for _ in range(max(args.repeat, 1)):
+            started = time.perf_counter()
+            cursor = conn.execute(sql, params)
+            rows = cursor.fetchall()
+            timings.append(time.perf_counter() - started)
+        columns = [d[0] for d in cursor.description]
+    finally:
+        conn.close()
+        pool.close()
+    print("\t".join(columns))
+    for row in rows[:args.limit]:
+        print("\t".join("" if v is None else str(v) for v in row))
+    # первый прогон включает подготовку запроса, остальные — из cached_statements
+    print(f"-- {len(rows):,} rows; first run {timings[0] * 1000:.2f} ms"
+          + (f", best of the rest {min(timings[1:]) * 1000:.2f} ms" if len(timings) > 1 else ""),
+          file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,283 @@
+"""Выручка по дням, неделям и месяцам в разрезе стран, менеджеров и категорий.
+
+Таблица revenue_rollup хранит готовые суммы по ключу
+(шкала, измерение, начало периода, значение). Она обновляется не
+триггерами, а пачкой: rollup_state помнит последний обработанный
+orders.id (high-water mark), и refresh() сворачивает только заказы с
+большим id. Заказы, которые ещё не свёрнуты, просмотрщик добавляет к
+таблице на лету (view_sql), так что результат всегда актуален, а
+стоимость запроса зависит от числа периодов и новых заказов, а не от
+всех заказов.
+
+Изменения и удаления уже свёрнутых заказов, позиции, добавленные к ним
+позже, и смена цен товаров (выручка категории = qty * price на момент
+свёртки) подхватываются только полным rebuild.
+
+    python rollups.py install crm.db   # создать таблицы и свернуть все заказы
+    python rollups.py refresh crm.db   # свернуть заказы, добавленные после прошлого раза
+    python rollups.py rebuild crm.db   # пересчитать с нуля
+    python rollups.py check crm.db     # сравнить с полным GROUP BY (код 1 при расхождении)
+"""
+import sqlite3
+import sys
+import time
+
+# шкала -> начало периода для ISO-даты 'YYYY-MM-DD' (неделя — с понедельника)
+GRAINS = {
+    "day": "{date}",
+    "week": "date({date}, 'weekday 0', '-6 days')",
+    "month": "substr({date}, 1, 7) || '-01'",
+}
+
+# измерение -> (соединения к orders o, значение, выручка, число заказов).
+# Неизвестное значение хранится как '' (NULL в PRIMARY KEY не ловится ON CONFLICT)
+DIMENSIONS = {
+    "country": ("LEFT JOIN customers c ON c.id = o.customer_id",
+                "IFNULL(c.country, '')", "IFNULL(o.amount, 0)", "COUNT(*)"),
+    "manager": ("LEFT JOIN users u ON u.id = o.user_id",
+                "IFNULL(u.name, '')", "IFNULL(o.amount, 0)", "COUNT(*)"),
+    "category": ("CROSS JOIN order_items oi ON oi.order_id = o.id "
+                 "LEFT JOIN products p ON p.id = oi.product_id",
+                 "IFNULL(p.category, '')", "IFNULL(oi.qty * p.price, 0)", "COUNT(DISTINCT o.id)"),
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS revenue_rollup (
+    grain TEXT NOT NULL,
+    dimension TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    value TEXT NOT NULL,
+    orders_count INTEGER NOT NULL,
+    revenue REAL NOT NULL,
+    PRIMARY KEY (grain, dimension, bucket, value)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS rollup_state (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    last_order_id INTEGER NOT NULL,
+    refreshed_at TEXT,
+    refresh_seconds REAL,
+    refresh_orders INTEGER
+);
+
+INSERT OR IGNORE INTO rollup_state (id, last_order_id) VALUES (1, 0);
+"""
+
+
+def _delta_sql(dimension, where):
+    """Суммы по дням для заказов из where (колонки: dimension, day, value, orders_count, revenue)"""
+    joins, value, revenue, count = DIMENSIONS[dimension]
+    return f"""
+        SELECT '{dimension}' AS dimension, o.date AS day, {value} AS value,
+               {count} AS orders_count, SUM({revenue}) AS revenue
+        FROM orders o
+        {joins}
+        WHERE {where}
+        GROUP BY o.date, {value}
+    """
+
+
+# пачка по дням; недели и месяцы сворачиваются уже из неё
+BATCH_SQL = "CREATE TEMP TABLE rollup_batch AS " + " UNION ALL ".join(
+    _delta_sql(d, "o.id > :low AND o.id <= :high") for d in DIMENSIONS)
+
+UPSERT_SQL = """
+    INSERT INTO revenue_rollup (grain, dimension, bucket, value, orders_count, revenue)
+    SELECT '{grain}', dimension, {bucket}, value, SUM(orders_count), SUM(revenue)
+    FROM temp.rollup_batch
+    WHERE true
+    GROUP BY dimension, {bucket}, value
+    ON CONFLICT (grain, dimension, bucket, value) DO UPDATE SET
+        orders_count = orders_count + excluded.orders_count,
+        revenue = revenue + excluded.revenue
+"""
+
+
+def is_installed(conn):
+    names = {r[0] for r in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' "
+        "AND name IN ('revenue_rollup', 'rollup_state')"
+    )}
+    return len(names) == 2
+
+
+def state(conn):
+    """{"last_order_id", "refreshed_at", "refresh_seconds", "refresh_orders"}"""
+    row = conn.execute(
+        "SELECT last_order_id, refreshed_at, refresh_seconds, refresh_orders "
+        "FROM rollup_state WHERE id = 1"
+    ).fetchone()
+    keys = ("last_order_id", "refreshed_at", "refresh_seconds", "refresh_orders")
+    return dict(zip(keys, row or (0, None, None, None)))
+
+
+def pending_orders(conn, last_order_id):
+    """Сколько заказов ещё не свёрнуто (поиск по rowid, без прохода по таблице)"""
+    return conn.execute("SELECT COUNT(*) FROM orders WHERE id > ?", (last_order_id,)).fetchone()[0]
+
+
+def refresh(conn):
+    """Свернуть заказы после high-water mark. Возвращает (заказов, секунд).
+
+    conn — соединение с isolation_level=None; вся пачка — одна транзакция.
+    """
+    start = time.perf_counter()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        low = conn.execute("SELECT last_order_id FROM rollup_state WHERE id = 1").fetchone()[0]
+        high = conn.execute("SELECT IFNULL(MAX(id), 0) FROM orders").fetchone()[0]
+        count = 0
+        if high > low:
+            count = pending_orders(conn, low)
+            conn.execute("DROP TABLE IF EXISTS temp.rollup_batch")
+            conn.execute(BATCH_SQL, {"low": low, "high": high})
+            for grain, bucket in GRAINS.items():
+                conn.execute(UPSERT_SQL.format(grain=grain, bucket=bucket.format(date="day")))
+            conn.execute("DROP TABLE temp.rollup_batch")
+        seconds = time.perf_counter() - start
+        conn.execute(
+            "UPDATE rollup_state SET last_order_id = ?, refreshed_at = datetime('now'), "
+            "refresh_seconds = ?, refresh_orders = ? WHERE id = 1",
+            (max(high, low), round(seconds, 3), count),
+        )
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return count, seconds
+
+
+def install(conn):
+    """Создать таблицы и свернуть все заказы"""
+    conn.executescript(SCHEMA)
+    return refresh(conn)
+
+
+def rebuild(conn):
+    """Пересчитать с нуля (после изменений/удалений старых заказов)"""
+    conn.executescript("BEGIN;" + SCHEMA + "DELETE FROM revenue_rollup;"
+                       "UPDATE rollup_state SET last_order_id = 0; COMMIT;")
+    return refresh(conn)
+
+
+def view_sql(grain, dimension, rng=None, live=True):
+    """(sql, params): суммы шкалы grain по измерению dimension, новые периоды сверху.
+
+    live=True — к свёрнутым строкам добавляются заказы после high-water
+    mark, и результат совпадает с полным GROUP BY по orders; если таких
+    заказов нет, live=False читает одну таблицу без слияния. rng — (от, до):
+    берутся целые периоды, которые задевают диапазон.
+    """
+    bucket = GRAINS[grain]
+    rollup_where = "grain = ? AND dimension = ?"
+    params = [grain, dimension]
+    if rng is not None:
+        rollup_where += f" AND bucket BETWEEN {bucket.format(date='?')} AND ?"
+        params += [rng[0], rng[1]]
+    if not live:
+        sql = f"""
+            SELECT bucket, value AS {dimension}, orders_count,
+                   ROUND(revenue, 2) AS revenue,
+                   ROUND(revenue / orders_count, 2) AS avg_order
+            FROM revenue_rollup
+            WHERE {rollup_where}
+            ORDER BY bucket DESC, revenue DESC
+        """
+        return sql, params
+    delta_where = "o.id > (SELECT last_order_id FROM rollup_state WHERE id = 1)"
+    if rng is not None:
+        # начало периода не позже даты, поэтому o.date >= начала первого периода
+        delta_where += f" AND o.date >= {bucket.format(date='?')} AND {bucket.format(date='o.date')} <= ?"
+        params += [rng[0], rng[1]]
+    sql = f"""
+        SELECT bucket, value AS {dimension},
+               SUM(orders_count) AS orders_count,
+               ROUND(SUM(revenue), 2) AS revenue,
+               ROUND(SUM(revenue) / SUM(orders_count), 2) AS avg_order
+        FROM (
+            SELECT bucket, value, orders_count, revenue
+            FROM revenue_rollup
+            WHERE {rollup_where}
+            UNION ALL
+            SELECT {bucket.format(date='day')}, value, orders_count, revenue
+            FROM ({_delta_sql(dimension, delta_where)})
+        )
+        GROUP BY bucket, value
+        ORDER BY bucket DESC, revenue DESC
+    """
+    return sql, params
+
+
+def plan_queries():
+    """Запросы вкладки Analytics для query_plan.py: имя -> (SQL, ожидаемые строки плана)"""
+    reports = {}
+    for dimension in DIMENSIONS:
+        sql, _ = view_sql("month", dimension)
+        # свёртка несвёрнутых заказов и слияние с таблицей — по небольшим
+        # промежуточным результатам
+        expected = ["USE TEMP B-TREE FOR GROUP BY", "SCAN (subquery-3)", "SCAN (subquery-4)",
+                    "USE TEMP B-TREE FOR GROUP BY", "USE TEMP B-TREE FOR ORDER BY"]
+        if dimension == "category":
+            expected.append("USE TEMP B-TREE FOR count(DISTINCT)")
+        reports[f"analytics month by {dimension}"] = (sql, expected)
+    reports["analytics month (no new orders)"] = (
+        view_sql("month", "country", live=False)[0], ["USE TEMP B-TREE FOR RIGHT PART OF ORDER BY"])
+    return reports
+
+
+def check(conn, tolerance=0.01):
+    """Сравнить свёрнутые суммы с полным GROUP BY по orders.
+
+    Возвращает расхождения [(шкала, измерение, период, значение, в таблице, по факту)].
+    """
+    problems = []
+    last = state(conn)["last_order_id"]
+    for grain, bucket in GRAINS.items():
+        for dimension, (joins, value, revenue, count) in DIMENSIONS.items():
+            full_sql = f"""
+                SELECT {bucket.format(date='o.date')}, {value}, {count}, SUM({revenue})
+                FROM orders o {joins}
+                WHERE o.id <= ?
+                GROUP BY 1, 2
+            """
+            expected = {(r[0], r[1]): r[2:] for r in conn.execute(full_sql, (last,))}
+            actual = {(r[0], r[1]): r[2:] for r in conn.execute(
+                "SELECT bucket, value, orders_count, revenue FROM revenue_rollup "
+                "WHERE grain = ? AND dimension = ?", (grain, dimension))}
+            for key in expected.keys() | actual.keys():
+                exp = expected.get(key)
+                act = actual.get(key)
+                if exp is None or act is None or exp[0] != act[0] \
+                        or abs(exp[1] - act[1]) > tolerance:
+                    problems.append((grain, dimension) + key + (act, exp))
+    return problems
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] not in ("install", "refresh", "rebuild", "check"):
+        print(__doc__)
+        return 2
+    db_path = argv[1] if len(argv) > 1 else "crm.db"
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    start = time.perf_counter()
+    try:
+        if argv[0] == "check":
+            problems = check(conn)
+            for grain, dimension, bucket, value, act, exp in problems:
+                print(f"{grain}/{dimension}[{bucket}, {value!r}]: rollup={act} full={exp}")
+            print(f"{len(problems)} mismatch(es) in {time.perf_counter() - start:.2f} s")
+            return 1 if problems else 0
+        if argv[0] == "refresh" and not is_installed(conn):
+            print("rollup tables are missing, run: python rollups.py install")
+            return 1
+        action = {"install": install, "refresh": refresh, "rebuild": rebuild}[argv[0]]
+        count, seconds = action(conn)
+    finally:
+        conn.close()
+    print(f"{argv[0]} done: {count:,} new orders in {seconds:.2f} s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,430 @@
+"""Заказы по месяцам: каталог с dims.db и файлом orders_YYYY_MM.db на месяц.
+
+dims.db хранит справочники (users, customers, products), каждый
+orders_YYYY_MM.db — заказы этого месяца и их позиции (orders, order_items
+с теми же индексами, что и в crm.db; id сквозные). Отдельные файлы
+по месяцам проще чистить (VACUUM), копировать и удалять целиком.
+
+Просмотрщик открывает dims.db и подключает месяцы через ATTACH, а
+запросы окна видят обычные orders и order_items — это TEMP VIEW с
+UNION ALL по подключённым месяцам. SQLite подставляет условия запроса в
+каждую ветку и сливает ветки по индексу (MERGE UNION ALL), так что
+ORDER BY date DESC, id DESC и постраничный просмотр не сортируют всё.
+
+Месяцы вне фильтра по датам не подключаются вовсе (ShardedPool.set_range),
+поэтому запросы с диапазоном не трогают чужие файлы. ATTACH ограничен
+(SQLITE_MAX_ATTACHED, обычно 10): без фильтра подключаются самые новые
+месяцы, а диапазон длиннее лимита пул не подключает вовсе. bt2/bt3
+считает ShardAggregator: частичные агрегаты каждого месяца (всех, а с
+фильтром — только пересекающих диапазон), слитые как в parallel_agg.py,
+так что итоги не зависят от лимита ATTACH.
+
+    python init_db.py --orders 1000000 --days 730 --shards crm_shards
+    python shards.py split crm.db crm_shards     # разложить готовую crm.db
+    python shards.py list crm_shards
+    python main.py --db crm_shards
+"""
+import argparse
+import calendar
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from urllib.parse import quote
+
+from db_pool import STATEMENT_CACHE, ConnectionPool
+from query_registry import Query
+
+DIMS_FILE = "dims.db"
+SHARD_FILE = re.compile(r"orders_(\d{4})_(\d{2})\.db")
+
+ORDERS_COLUMNS = ("id", "customer_id", "user_id", "amount", "date")
+ORDER_ITEMS_COLUMNS = ("id", "order_id", "product_id", "qty")
+
+# PRAGMA, которые действуют на каждый файл отдельно: для подключённых
+# месяцев повторяются с именем схемы (cache_size не повторяем — кэш на
+# каждый месяц умножил бы память соединения)
+_PER_SCHEMA_PRAGMAS = ("mmap_size",)
+
+# Запросы реестра, которые по UNION ALL читали бы все месяцы целиком:
+# здесь они идут по order_bounds — краям первичного ключа и индекса дат
+# каждого подключённого месяца (см. ShardSet.attach)
+QUERY_OVERRIDES = {q.name: q for q in (
+    Query("max_order_id", "Last order id (month shards)",
+          "SELECT max(max_id) FROM order_bounds"),
+    Query("date_bounds", "First and last order date (month shards)",
+          "SELECT min(first_day), max(last_day) FROM order_bounds"),
+)}
+
+
+def shard_name(month):
+    """'2026-01' -> 'orders_2026_01.db'"""
+    return f"orders_{month.replace('-', '_')}.db"
+
+
+def attach_limit():
+    """Сколько баз можно подключить к одному соединению (SQLITE_MAX_ATTACHED)"""
+    conn = sqlite3.connect(":memory:")
+    try:
+        return conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)
+    finally:
+        conn.close()
+
+
+class Shard:
+    """Один месяц: файл, имя схемы в ATTACH и границы дат"""
+
+    def __init__(self, root, month):
+        self.month = month
+        self.path = os.path.join(root, shard_name(month))
+        self.schema = "m_" + month.replace("-", "_")
+        year, mon = map(int, month.split("-"))
+        self.first_day = f"{month}-01"
+        self.last_day = f"{month}-{calendar.monthrange(year, mon)[1]:02d}"
+
+    def __repr__(self):
+        return f"Shard({self.month})"
+
+    def __eq__(self, other):
+        return isinstance(other, Shard) and other.path == self.path
+
+    def __hash__(self):
+        return hash(self.path)
+
+    def overlaps(self, date_from, date_to):
+        return self.first_day <= date_to and date_from <= self.last_day
+
+    def within(self, date_from, date_to):
+        """Месяц целиком внутри диапазона — фильтр по датам не нужен"""
+        return date_from <= self.first_day and self.last_day <= date_to
+
+
+class ShardSet:
+    """Каталог с dims.db и помесячными файлами заказов"""
+
+    def __init__(self, root):
+        self.root = root
+        self.dims_path = os.path.join(root, DIMS_FILE)
+        if not os.path.exists(self.dims_path):
+            raise sqlite3.OperationalError(f"{DIMS_FILE} not found in {root}")
+        self.shards = []
+        self.refresh()
+
+    def refresh(self):
+        """Перечитать список месяцев (backend мог начать новый); True — изменился"""
+        months = sorted(f"{m.group(1)}-{m.group(2)}" for m in
+                        (SHARD_FILE.fullmatch(name) for name in os.listdir(self.root)) if m)
+        # от новых месяцев к старым
+        shards = [Shard(self.root, month) for month in reversed(months)]
+        changed = shards != self.shards
+        self.shards = shards
+        return changed
+
+    def select(self, date_from=None, date_to=None):
+        """Месяцы, пересекающие диапазон (None — все), от новых к старым"""
+        if date_from is None:
+            return list(self.shards)
+        return [s for s in self.shards if s.overlaps(date_from, date_to)]
+
+    def files(self):
+        """Файлы данных с WAL — их mtime входит в token кэша и живого обновления"""
+        self.refresh()
+        paths = [self.dims_path]
+        for shard in self.shards:
+            paths.append(shard.path)
+        return [p + suffix for p in paths for suffix in ("", "-wal")]
+
+    def connect(self, shards):
+        """Read-only соединение к dims.db с подключёнными месяцами (см. attach)"""
+        uri = f"file:{quote(os.path.abspath(self.dims_path))}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False,
+                               cached_statements=STATEMENT_CACHE)
+        self.attach(conn, shards)
+        return conn
+
+    @staticmethod
+    def attach(conn, shards):
+        """ATTACH месяцев и TEMP VIEW orders, order_items, order_bounds по ним.
+
+        Вызывается до PRAGMA query_only: она запрещает и CREATE TEMP VIEW.
+        Смена PRAGMA temp_store после этого удалила бы представления.
+        """
+        for shard in shards:
+            conn.execute(f"ATTACH DATABASE ? AS {shard.schema}",
+                         (f"file:{quote(os.path.abspath(shard.path))}?mode=ro",))
+        views = {
+            "orders": [f"SELECT * FROM {s.schema}.orders" for s in shards],
+            "order_items": [f"SELECT * FROM {s.schema}.order_items" for s in shards],
+            # min/max отдельными подзапросами — с краёв индексов каждого месяца
+            "order_bounds": [f"SELECT (SELECT max(id) FROM {s.schema}.orders) AS max_id, "
+                             f"(SELECT min(date) FROM {s.schema}.orders) AS first_day, "
+                             f"(SELECT max(date) FROM {s.schema}.orders) AS last_day"
+                             for s in shards],
+        }
+        empty = {
+            "orders": ORDERS_COLUMNS,
+            "order_items": ORDER_ITEMS_COLUMNS,
+            "order_bounds": ("max_id", "first_day", "last_day"),
+        }
+        for name, parts in views.items():
+            if not parts:
+                # ни одного месяца (например, диапазон вне данных) — пустая выборка
+                parts = ["SELECT " + ", ".join(f"NULL AS {c}" for c in empty[name]) + " WHERE 0"]
+            conn.execute(f"CREATE TEMP VIEW {name} AS " + "\nUNION ALL ".join(parts))
+
+
+class ShardedPool(ConnectionPool):
+    """Пул read-only соединений к каталогу месяцев (см. ShardSet).
+
+    Каждое соединение видит месяцы окна window: пересекающие фильтр по
+    датам, но не больше лимита ATTACH. set_range() меняет окно;
+    свободные соединения со старым окном закрываются, занятые (открытый
+    курсор вкладки) дочитывают своё. Диапазон дат длиннее лимита не
+    урезается: acquire() отказывает с текстом refused, иначе запросы
+    вернули бы итоги без старых месяцев (bt2/bt3 считает ShardAggregator).
+    """
+
+    def __init__(self, root, size=4, pragmas=None):
+        self.shards = ShardSet(root)
+        self.max_attached = attach_limit()
+        self.window = self.shards.select()[:self.max_attached]
+        self.skipped = len(self.shards.shards) - len(self.window)
+        self.refused = None
+        # запросы реестра с другим SQL для этого хранения
+        self.queries = QUERY_OVERRIDES
+        super().__init__(self.shards.dims_path, size, pragmas)
+
+    def connect(self, pragmas=None):
+        pragmas = dict(self.pragmas if pragmas is None else pragmas)
+        # TEMP VIEW — после temp_store (её смена удаляет временную схему)
+        # и до query_only (она запрещает и CREATE TEMP VIEW)
+        query_only = pragmas.pop("query_only", None)
+        conn = super().connect(pragmas)
+        self.shards.attach(conn, self.window)
+        for name, value in pragmas.items():
+            if name in _PER_SCHEMA_PRAGMAS:
+                for shard in self.window:
+                    conn.execute(f"PRAGMA {shard.schema}.{name} = {value}")
+        if query_only is not None:
+            conn.execute(f"PRAGMA query_only = {query_only}")
+        return conn
+
+    def set_range(self, date_from=None, date_to=None):
+        """Подключать только месяцы диапазона (None — самые новые). True — окно изменилось"""
+        self.shards.refresh()
+        selected = self.shards.select(date_from, date_to)
+        window = selected[:self.max_attached]
+        refused = None
+        if date_from is not None and len(selected) > self.max_attached:
+            refused = (f"date range covers {len(selected)} month files, more than can be "
+                       f"attached at once ({self.max_attached}): narrow the range")
+        with self._lock:
+            self.refused = refused
+            if window == self.window:
+                return False
+            self.window = window
+            self.skipped = len(selected) - len(window)
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+        return True
+
+    def acquire(self):
+        if self.refused:
+            raise sqlite3.OperationalError(self.refused)
+        return super().acquire()
+
+    def release(self, conn):
+        # соединение со старым окном (было занято во время set_range) не возвращаем
+        attached = [row[1] for row in conn.execute("PRAGMA database_list")
+                    if row[1] not in ("main", "temp")]
+        if attached != [s.schema for s in self.window]:
+            conn.close()
+            return
+        super().release(conn)
+
+    def describe(self):
+        months = f"{len(self.window)} month(s)"
+        if self.window:
+            months += f" {self.window[-1].month}…{self.window[0].month}"
+        if self.refused:
+            months += f", {self.refused}"
+        elif self.skipped:
+            months += f", {self.skipped} older not attached (ATTACH limit {self.max_attached})"
+        return f"{super().describe()}, {months}"
+
+
+# Частичные агрегаты одного месяца: {s} — схема месяца; _RANGE — с фильтром
+# по датам для месяцев, которые диапазон покрывает не целиком
+ORDERS_BY_CUSTOMER_SQL = """
+    SELECT customer_id, COUNT(id), SUM(amount)
+    FROM {s}.orders
+    GROUP BY customer_id
+"""
+
+ORDERS_BY_CUSTOMER_RANGE_SQL = """
+    SELECT customer_id, COUNT(id), SUM(amount)
+    FROM {s}.orders
+    WHERE date BETWEEN ? AND ?
+    GROUP BY customer_id
+"""
+
+ITEMS_BY_PRODUCT_SQL = """
+    SELECT product_id, SUM(qty), SUM(qty * p.price)
+    FROM {s}.order_items oi
+    JOIN main.products p ON p.id = oi.product_id
+    GROUP BY product_id
+"""
+
+ITEMS_BY_PRODUCT_RANGE_SQL = """
+    SELECT oi.product_id, SUM(oi.qty), SUM(oi.qty * p.price)
+    FROM {s}.orders o
+    CROSS JOIN {s}.order_items oi ON oi.order_id = o.id
+    JOIN main.products p ON p.id = oi.product_id
+    WHERE o.date BETWEEN ? AND ?
+    GROUP BY oi.product_id
+"""
+
+
+class ShardAggregator:
+    """bt2/bt3 по месяцам: частичный агрегат каждого месяца, слияние — parallel_agg.merge.
+
+    Месяцы подключаются группами по лимиту ATTACH к отдельному
+    соединению, так что считаются все месяцы (с фильтром — только
+    пересекающие диапазон), сколько бы их ни было. task — TaskPool
+    фоновой задачи (query_executor.py): её отмена прерывает чтение месяцев.
+    """
+
+    def __init__(self, shards, pragmas=None):
+        self.shards = shards
+        self.pragmas = {k: v for k, v in (pragmas or {}).items() if k in _PER_SCHEMA_PRAGMAS}
+        self.group_size = attach_limit()
+        # сколько месяцев прочитал последний расчёт в этом потоке (bt2 и bt3
+        # считаются параллельно в разных задачах)
+        self._local = threading.local()
+
+    @property
+    def last_read(self):
+        return getattr(self._local, "read", 0)
+
+    def _connect(self, shards, task):
+        conn = self.shards.connect(shards)
+        return task.watch(conn) if task is not None else conn
+
+    def _partials(self, full_sql, range_sql, date_from, date_to, task=None):
+        selected = self.shards.select(date_from, date_to)
+        self._local.read = len(selected)
+        partials = []
+        for first in range(0, len(selected), self.group_size):
+            group = selected[first:first + self.group_size]
+            conn = self._connect(group, task)
+            try:
+                for shard in group:
+                    for name, value in self.pragmas.items():
+                        conn.execute(f"PRAGMA {shard.schema}.{name} = {value}")
+                    if date_from is None or shard.within(date_from, date_to):
+                        rows = conn.execute(full_sql.format(s=shard.schema)).fetchall()
+                    else:
+                        rows = conn.execute(range_sql.format(s=shard.schema),
+                                            (date_from, date_to)).fetchall()
+                    partials.append(rows)
+            finally:
+                conn.close()
+        return partials
+
+    def _dimension(self, sql, task=None):
+        conn = self._connect([], task)
+        try:
+            return conn.execute(sql).fetchall()
+        finally:
+            conn.close()
+
+    def revenue_by_country(self, date_from=None, date_to=None, task=None):
+        """(columns, rows) как у queries.BT2_SQL / BT2_RANGE_SQL"""
+        from parallel_agg import merge, revenue_rows
+        by_customer = merge(self._partials(ORDERS_BY_CUSTOMER_SQL, ORDERS_BY_CUSTOMER_RANGE_SQL,
+                                           date_from, date_to, task), ("count", "sum"))
+        countries = dict(self._dimension("SELECT id, country FROM customers", task))
+        return revenue_rows(by_customer, countries)
+
+    def top_products(self, date_from=None, date_to=None, task=None):
+        """(columns, rows) как у queries.BT3_SQL / BT3_RANGE_SQL"""
+        from parallel_agg import merge, product_rows
+        by_product = merge(self._partials(ITEMS_BY_PRODUCT_SQL, ITEMS_BY_PRODUCT_RANGE_SQL,
+                                          date_from, date_to, task), ("sum", "sum"))
+        products = {r[0]: r[1:] for r in
+                    self._dimension("SELECT id, name, category FROM products", task)}
+        return product_rows(by_product, products)
+
+    def describe(self):
+        """Вызывать в потоке расчёта, после него (см. last_read)"""
+        return f"merged from {self.last_read} month shard(s)"
+
+    def close(self):
+        pass
+
+
+def split(db_path, root, verbose=True):
+    """Разложить crm.db по месяцам: dims.db и orders_YYYY_MM.db в каталоге root"""
+    import init_db
+
+    os.makedirs(root, exist_ok=True)
+    started = time.perf_counter()
+    src = os.path.abspath(db_path)
+    init_db.create_dims(os.path.join(root, DIMS_FILE), source=src)
+    conn = sqlite3.connect(f"file:{quote(src)}?mode=ro", uri=True)
+    try:
+        first, last = conn.execute(
+            "SELECT (SELECT min(date) FROM orders), (SELECT max(date) FROM orders)").fetchone()
+    finally:
+        conn.close()
+    months = _months(first, last) if first else []
+    for month in months:
+        shard = Shard(root, month)
+        count = init_db.create_shard(shard.path, source=src,
+                                     date_from=shard.first_day, date_to=shard.last_day)
+        if verbose:
+            print(f"  {shard_name(month)}: {count:,} orders")
+    print(f"{db_path} -> {root}: {len(months)} month(s) in {time.perf_counter() - started:.1f} s")
+
+
+def _months(first_day, last_day):
+    """['2026-01', '2026-02', ...] от месяца first_day до месяца last_day"""
+    year, month = map(int, first_day[:7].split("-"))
+    end = tuple(map(int, last_day[:7].split("-")))
+    months = []
+    while (year, month) <= end:
+        months.append(f"{year:04d}-{month:02d}")
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Помесячное хранение заказов CRM")
+    sub = parser.add_subparsers(dest="command", required=True)
+    cmd = sub.add_parser("split", help="разложить crm.db по месяцам")
+    cmd.add_argument("db")
+    cmd.add_argument("root")
+    cmd = sub.add_parser("list", help="месяцы каталога и число заказов в каждом")
+    cmd.add_argument("root")
+    args = parser.parse_args(argv)
+
+    if args.command == "split":
+        split(args.db, args.root)
+        return 0
+    shards = ShardSet(args.root)
+    print(f"{args.root}: {len(shards.shards)} month(s), ATTACH limit {attach_limit()}")
+    for shard in reversed(shards.shards):
+        conn = sqlite3.connect(f"file:{quote(os.path.abspath(shard.path))}?mode=ro", uri=True)
+        try:
+            count = conn.execute("SELECT count(*) FROM orders").fetchone()[0]
+        finally:
+            conn.close()
+        print(f"  {shard.month}  {count:>12,} orders  {os.path.getsize(shard.path) / 2**20:8.1f} MB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+import time
+
+from PyQt5.QtWidgets import (
+    QWidget, QVBoxLayout, QHBoxLayout, QPlainTextEdit, QPushButton, QLabel,
+    QSpinBox, QTableView, QShortcut, QMessageBox
+)
+from PyQt5.QtGui import QFont, QKeySequence
+
+from cell_delegate import fit_columns, setup_table
+from table_model import SqlTableModel
+
+
+class SqlConsole(QWidget):
+    """Вкладка SQL: произвольный запрос на read-only соединении из пула.
+
+    Строки приходят из StreamTask порциями и дописываются в модель по мере
+    чтения, поэтому первые строки видны сразу, а в памяти хранится не
+    больше бюджета строк. Запись в базу невозможна: соединения пула
+    открыты с mode=ro и query_only.
+    """
+
+    KEY = "console"
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.executor = None
+        self.model = None
+        # последний запущенный запрос (его выгружает экспорт вкладки)
+        self.last_sql = None
+        self._started = None
+        self._first_row = None
+
+        layout = QVBoxLayout(self)
+        self.editor = QPlainTextEdit()
+        self.editor.setFont(QFont("Monospace"))
+        self.editor.setPlaceholderText("SELECT * FROM orders WHERE amount > 9000  -- Ctrl+Enter")
+        self.editor.setMaximumHeight(140)
+        layout.addWidget(self.editor)
+
+        controls = QHBoxLayout()
+        self.bt_run = QPushButton("Run")
+        self.bt_run.clicked.connect(self.run)
+        controls.addWidget(self.bt_run)
+        self.bt_cancel = QPushButton("Cancel")
+        self.bt_cancel.clicked.connect(self.cancel)
+        self.bt_cancel.setEnabled(False)
+        controls.addWidget(self.bt_cancel)
+
+        controls.addWidget(QLabel("Max rows:"))
+        self.max_rows = QSpinBox()
+        self.max_rows.setRange(100, 10_000_000)
+        self.max_rows.setSingleStep(10_000)
+        self.max_rows.setValue(100_000)
+        self.max_rows.setGroupSeparatorShown(True)
+        controls.addWidget(self.max_rows)
+
+        controls.addWidget(QLabel("Max time, s:"))
+        self.max_seconds = QSpinBox()
+        self.max_seconds.setRange(1, 3600)
+        self.max_seconds.setValue(30)
+        controls.addWidget(self.max_seconds)
+
+        self.info = QLabel()
+        controls.addWidget(self.info, 1)
+        layout.addLayout(controls)
+
+        self.table = QTableView()
+        self.table.setEditTriggers(QTableView.NoEditTriggers)
+        self.table.setSelectionBehavior(QTableView.SelectRows)
+        setup_table(self.table)
+        layout.addWidget(self.table)
+
+        QShortcut(QKeySequence("Ctrl+Return"), self.editor, self.run)
+
+    def set_executor(self, executor):
+        """Подключить к QueryExecutor текущего соединения (None — отключить)"""
+        if self.executor is not None:
+            for signal, slot in self._slots():
+                try:
+                    signal.disconnect(slot)
+                except TypeError:
+                    pass
+        self.executor = executor
+        if executor is not None:
+            for signal, slot in self._slots():
+                signal.connect(slot)
+        self._set_running(False)
+
+    def _slots(self):
+        ex = self.executor
+        return [(ex.partial, self._on_partial), (ex.finished, self._on_finished),
+                (ex.failed, self._on_failed), (ex.cancelled, self._on_cancelled)]
+
+    def run(self):
+        if self.executor is None:
+            QMessageBox.information(self, "Not connected", "Сначала выполните Set connection")
+            return
+        sql = self.editor.toPlainText().strip()
+        if not sql:
+            return
+        self._clear()
+        self.last_sql = sql
+        self._started = time.perf_counter()
+        self._first_row = None
+        self.executor.submit_stream(self.KEY, sql, max_rows=self.max_rows.value(),
+                                    max_seconds=self.max_seconds.value(), replace=True)
+        self.info.setText("running…")
+        self._set_running(True)
+
+    def cancel(self):
+        if self.executor is not None:
+            self.executor.cancel(self.KEY)
+
+    def _clear(self):
+        old = self.table.model()
+        self.table.setModel(None)
+        if old is not None:
+            old.deleteLater()
+        self.model = None
+
+    def _set_running(self, running):
+        self.bt_run.setEnabled(not running)
+        self.bt_cancel.setEnabled(running)
+
+    def _on_partial(self, key, batch):
+        if key != self.KEY:
+            return
+        if self.model is None:
+            self._first_row = batch["elapsed"]
+            self.model = SqlTableModel(None, batch["columns"], rows=batch["rows"], parent=self.table)
+            self.table.setModel(self.model)
+            # ширину колонок подбираем по первой порции, дальше не пересчитываем
+            fit_columns(self.table)
+            self.table.horizontalHeader().setStretchLastSection(True)
+        else:
+            self.model.append_rows(batch["rows"])
+        self._show_info(batch["total"], batch["elapsed"])
+
+    def _show_info(self, total, elapsed, note=""):
+        rate = total / elapsed if elapsed > 0 else 0
+        first = f", first rows in {self._first_row * 1000:.1f} ms" if self._first_row is not None else ""
+        self.info.setText(f"{total:,} rows in {elapsed:.2f} s ({rate:,.0f} rows/s{first}){note}")
+
+    def _on_finished(self, key, result):
+        if key != self.KEY:
+            return
+        self._set_running(False)
+        elapsed = time.perf_counter() - self._started
+        total = self.model.rowCount() if self.model is not None else 0
+        if self.model is None and result.columns:
+            # запрос без строк: показываем хотя бы заголовки
+            self.model = SqlTableModel(None, result.columns, rows=[], parent=self.table)
+            self.table.setModel(self.model)
+        note = f" — stopped: {result.stopped} reached" if result.stopped else " — done"
+        self._show_info(total, elapsed, note)
+
+    def _on_failed(self, key, message):
+        if key != self.KEY:
+            return
+        self._set_running(False)
+        self.info.setText(f"error: {message}")
+
+    def _on_cancelled(self, key):
+        if key != self.KEY:
+            return
+        self._set_running(False)
+        total = self.model.rowCount() if self.model is not None else 0
+        self._show_info(total, time.perf_counter() - self._started, " — cancelled")
@@ -0,0 +1,255 @@
+"""Сводные таблицы для bt2 (выручка по странам) и bt3 (топ товаров).
+
+Таблицы обновляются триггерами на orders, order_items и customers,
+поэтому bt2/bt3 читают O(стран) / O(товаров) строк вместо всех заказов.
+
+    python summaries.py install crm.db   # создать таблицы, заполнить, повесить триггеры
+    python summaries.py rebuild crm.db   # пересчитать с нуля
+    python summaries.py check crm.db     # сравнить с полным GROUP BY (код 1 при расхождении)
+"""
+import sqlite3
+import sys
+import time
+
+
+# Неизвестная страна (клиента нет или country IS NULL) хранится как '',
+# потому что NULL в PRIMARY KEY не ловится ON CONFLICT
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS country_revenue (
+    country TEXT PRIMARY KEY,
+    orders_count INTEGER NOT NULL,
+    revenue REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS product_sales (
+    product_id INTEGER PRIMARY KEY,
+    items_count INTEGER NOT NULL,
+    total_qty INTEGER NOT NULL
+);
+"""
+
+# Выручка товара = total_qty * price, поэтому смена цены в products
+# не требует отдельного триггера — bt3 умножает на текущую цену
+TRIGGERS = """
+CREATE TRIGGER IF NOT EXISTS trg_orders_ins_summary AFTER INSERT ON orders
+BEGIN
+    INSERT INTO country_revenue (country, orders_count, revenue)
+    VALUES (IFNULL((SELECT country FROM customers WHERE id = NEW.customer_id), ''),
+            1, IFNULL(NEW.amount, 0))
+    ON CONFLICT(country) DO UPDATE SET
+        orders_count = orders_count + 1,
+        revenue = revenue + excluded.revenue;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_orders_del_summary AFTER DELETE ON orders
+BEGIN
+    UPDATE country_revenue
+    SET orders_count = orders_count - 1,
+        revenue = revenue - IFNULL(OLD.amount, 0)
+    WHERE country = IFNULL((SELECT country FROM customers WHERE id = OLD.customer_id), '');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_orders_upd_summary AFTER UPDATE OF customer_id, amount ON orders
+BEGIN
+    UPDATE country_revenue
+    SET orders_count = orders_count - 1,
+        revenue = revenue - IFNULL(OLD.amount, 0)
+    WHERE country = IFNULL((SELECT country FROM customers WHERE id = OLD.customer_id), '');
+    INSERT INTO country_revenue (country, orders_count, revenue)
+    VALUES (IFNULL((SELECT country FROM customers WHERE id = NEW.customer_id), ''),
+            1, IFNULL(NEW.amount, 0))
+    ON CONFLICT(country) DO UPDATE SET
+        orders_count = orders_count + 1,
+        revenue = revenue + excluded.revenue;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_customers_ins_summary AFTER INSERT ON customers
+WHEN EXISTS (SELECT 1 FROM orders WHERE customer_id = NEW.id)
+BEGIN
+    -- заказы этого клиента раньше числились в неизвестной стране
+    UPDATE country_revenue
+    SET orders_count = orders_count - (SELECT COUNT(*) FROM orders WHERE customer_id = NEW.id),
+        revenue = revenue - (SELECT IFNULL(SUM(amount), 0) FROM orders WHERE customer_id = NEW.id)
+    WHERE country = '';
+    INSERT INTO country_revenue (country, orders_count, revenue)
+    SELECT IFNULL(NEW.country, ''), COUNT(*), IFNULL(SUM(amount), 0)
+    FROM orders WHERE customer_id = NEW.id
+    ON CONFLICT(country) DO UPDATE SET
+        orders_count = orders_count + excluded.orders_count,
+        revenue = revenue + excluded.revenue;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_customers_del_summary AFTER DELETE ON customers
+WHEN EXISTS (SELECT 1 FROM orders WHERE customer_id = OLD.id)
+BEGIN
+    UPDATE country_revenue
+    SET orders_count = orders_count - (SELECT COUNT(*) FROM orders WHERE customer_id = OLD.id),
+        revenue = revenue - (SELECT IFNULL(SUM(amount), 0) FROM orders WHERE customer_id = OLD.id)
+    WHERE country = IFNULL(OLD.country, '');
+    INSERT INTO country_revenue (country, orders_count, revenue)
+    SELECT '', COUNT(*), IFNULL(SUM(amount), 0)
+    FROM orders WHERE customer_id = OLD.id
+    ON CONFLICT(country) DO UPDATE SET
+        orders_count = orders_count + excluded.orders_count,
+        revenue = revenue + excluded.revenue;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_customers_upd_summary AFTER UPDATE OF id, country ON customers
+BEGIN
+    UPDATE country_revenue
+    SET orders_count = orders_count - (SELECT COUNT(*) FROM orders WHERE customer_id = OLD.id),
+        revenue = revenue - (SELECT IFNULL(SUM(amount), 0) FROM orders WHERE customer_id = OLD.id)
+    WHERE country = IFNULL(OLD.country, '');
+    INSERT INTO country_revenue (country, orders_count, revenue)
+    SELECT IFNULL(OLD.country, ''), COUNT(*), IFNULL(SUM(amount), 0)
+    FROM orders WHERE customer_id = OLD.id AND OLD.id <> NEW.id
+    ON CONFLICT(country) DO UPDATE SET
+        orders_count = orders_count + excluded.orders_count,
+        revenue = revenue + excluded.revenue;
+    UPDATE country_revenue
+    SET orders_count = orders_count - (SELECT COUNT(*) FROM orders WHERE customer_id = NEW.id),
+        revenue = revenue - (SELECT IFNULL(SUM(amount), 0) FROM orders WHERE customer_id = NEW.id)
+    WHERE country = '' AND OLD.id <> NEW.id;
+    INSERT INTO country_revenue (country, orders_count, revenue)
+    SELECT IFNULL(NEW.country, ''), COUNT(*), IFNULL(SUM(amount), 0)
+    FROM orders WHERE customer_id = NEW.id
+    ON CONFLICT(country) DO UPDATE SET
+        orders_count = orders_count + excluded.orders_count,
+        revenue = revenue + excluded.revenue;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_order_items_ins_summary AFTER INSERT ON order_items
+BEGIN
+    INSERT INTO product_sales (product_id, items_count, total_qty)
+    VALUES (NEW.product_id, 1, IFNULL(NEW.qty, 0))
+    ON CONFLICT(product_id) DO UPDATE SET
+        items_count = items_count + 1,
+        total_qty = total_qty + excluded.total_qty;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_order_items_del_summary AFTER DELETE ON order_items
+BEGIN
+    UPDATE product_sales
+    SET items_count = items_count - 1,
+        total_qty = total_qty - IFNULL(OLD.qty, 0)
+    WHERE product_id = OLD.product_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_order_items_upd_summary AFTER UPDATE OF product_id, qty ON order_items
+BEGIN
+    UPDATE product_sales
+    SET items_count = items_count - 1,
+        total_qty = total_qty - IFNULL(OLD.qty, 0)
+    WHERE product_id = OLD.product_id;
+    INSERT INTO product_sales (product_id, items_count, total_qty)
+    VALUES (NEW.product_id, 1, IFNULL(NEW.qty, 0))
+    ON CONFLICT(product_id) DO UPDATE SET
+        items_count = items_count + 1,
+        total_qty = total_qty + excluded.total_qty;
+END;
+"""
+
+REBUILD = """
+DELETE FROM country_revenue;
+INSERT INTO country_revenue (country, orders_count, revenue)
+SELECT IFNULL(c.country, ''), SUM(o.orders_count), SUM(o.revenue)
+FROM (
+    SELECT customer_id, COUNT(*) AS orders_count, IFNULL(SUM(amount), 0) AS revenue
+    FROM orders
+    GROUP BY customer_id
+) o
+LEFT JOIN customers c ON o.customer_id = c.id
+GROUP BY IFNULL(c.country, '');
+
+DELETE FROM product_sales;
+INSERT INTO product_sales (product_id, items_count, total_qty)
+SELECT product_id, COUNT(*), IFNULL(SUM(qty), 0)
+FROM order_items
+GROUP BY product_id;
+"""
+
+# Полные GROUP BY, с которыми сравнивает check()
+FULL_COUNTRY_SQL = """
+    SELECT IFNULL(c.country, ''), COUNT(o.id), IFNULL(SUM(o.amount), 0)
+    FROM orders o
+    LEFT JOIN customers c ON o.customer_id = c.id
+    GROUP BY IFNULL(c.country, '')
+"""
+
+FULL_PRODUCT_SQL = """
+    SELECT product_id, COUNT(*), IFNULL(SUM(qty), 0)
+    FROM order_items
+    GROUP BY product_id
+"""
+
+
+def is_installed(conn):
+    names = {r[0] for r in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' "
+        "AND name IN ('country_revenue', 'product_sales')"
+    )}
+    return len(names) == 2
+
+
+def install(conn):
+    """Создать сводные таблицы, заполнить их и повесить триггеры"""
+    conn.executescript("BEGIN;" + SCHEMA + REBUILD + TRIGGERS + "COMMIT;")
+
+
+def rebuild(conn):
+    """Пересчитать сводные таблицы с нуля (триггеры не трогаются)"""
+    conn.executescript("BEGIN;" + REBUILD + "COMMIT;")
+
+
+def check(conn, tolerance=0.005):
+    """Сравнить сводные таблицы с полным GROUP BY.
+
+    Возвращает список расхождений [(таблица, ключ, в сводке, по факту)];
+    суммы выручки сравниваются с допуском — порядок сложения float разный.
+    """
+    problems = []
+    pairs = (
+        ("country_revenue", FULL_COUNTRY_SQL,
+         "SELECT country, orders_count, revenue FROM country_revenue WHERE orders_count <> 0"),
+        ("product_sales", FULL_PRODUCT_SQL,
+         "SELECT product_id, items_count, total_qty FROM product_sales WHERE items_count <> 0"),
+    )
+    for table, full_sql, summary_sql in pairs:
+        expected = {r[0]: r[1:] for r in conn.execute(full_sql)}
+        actual = {r[0]: r[1:] for r in conn.execute(summary_sql)}
+        for key in expected.keys() | actual.keys():
+            exp = expected.get(key)
+            act = actual.get(key)
+            if exp is None or act is None or exp[0] != act[0] \
+                    or abs(exp[1] - act[1]) > tolerance:
+                problems.append((table, key, act, exp))
+    return problems
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] not in ("install", "rebuild", "check"):
+        print(__doc__)
+        return 2
+    db_path = argv[1] if len(argv) > 1 else "crm.db"
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    start = time.perf_counter()
+    try:
+        if argv[0] == "install":
+            install(conn)
+        elif argv[0] == "rebuild":
+            rebuild(conn)
+        else:
+            problems = check(conn)
+            for table, key, act, exp in problems:
+                print(f"{table}[{key!r}]: summary={act} full={exp}")
+            print(f"{len(problems)} mismatch(es) in {time.perf_counter() - start:.2f} s")
+            return 1 if problems else 0
+    finally:
+        conn.close()
+    print(f"{argv[0]} done in {time.perf_counter() - start:.2f} s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
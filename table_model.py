@@ -0,0 +1,195 @@
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QVariant
+
+from column_store import ColumnStore
+
+_RIGHT = int(Qt.AlignVCenter | Qt.AlignRight)
+_LEFT = int(Qt.AlignVCenter | Qt.AlignLeft)
+
+# сколько строк держит кэш отформатированных ячеек (text()); при
+# переполнении он сбрасывается целиком — на экране всё равно десятки строк
+TEXT_CACHE_ROWS = 4096
+
+
+class SqlTableModel(QAbstractTableModel):
+    """Модель таблицы, которая подгружает строки из курсора sqlite3 порциями.
+
+    Строки читаются через fetchmany() только тогда, когда представление
+    просит следующую порцию (canFetchMore/fetchMore), поэтому время до
+    первой строки и расход памяти не зависят от размера результата.
+    Прочитанные строки хранятся по колонкам (column_store.ColumnStore),
+    а выравнивание выбирается для колонки целиком, а не для каждой ячейки.
+    Новые строки можно вставить и в начало (prepend_rows) — они хранятся
+    отдельно, так что вставка не копирует уже прочитанные.
+
+    Строки ячеек форматируются только для тех строк, которые просят
+    представление или делегат (cell_delegate.CellDelegate), и кэшируются
+    построчно (text()).
+    """
+
+    def __init__(self, cursor=None, columns=None, rows=None, connection=None,
+                 chunk_size=1000, parent=None):
+        super().__init__(parent)
+        self._cursor = cursor
+        # соединение, которое принадлежит модели (закрывается вместе с ней)
+        self._connection = connection
+        self._chunk_size = chunk_size
+        if columns is None and cursor is not None and cursor.description:
+            columns = [d[0] for d in cursor.description]
+        self._columns = list(columns or [])
+        self._store = ColumnStore(self._columns)
+        # строки, вставленные в начало, в обратном порядке (последняя вставка — в конце)
+        self._head = None
+        self._align = []
+        # номер строки -> отформатированные значения (см. text())
+        self._texts = {}
+        self._exhausted = cursor is None
+        if rows is not None:
+            # первая порция уже прочитана фоновым потоком
+            self._append(rows)
+            if len(rows) < chunk_size:
+                self._release()
+        else:
+            # первую порцию читаем сразу, чтобы таблица не была пустой
+            self.fetchMore(QModelIndex())
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._store) + self._head_len()
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._columns)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return QVariant()
+        if role == Qt.DisplayRole:
+            return self.text(index.row(), index.column())
+        if role == Qt.TextAlignmentRole:
+            align = self._align[index.column()]
+            if align is None:
+                align = self.alignment(index.row(), index.column())
+            return align or QVariant()
+        return QVariant()
+
+    def text(self, row, col):
+        """Значение ячейки строкой ("" для NULL); строка форматируется целиком
+        при первом обращении и берётся из кэша при следующих отрисовках"""
+        texts = self._texts.get(row)
+        if texts is None:
+            if len(self._texts) >= TEXT_CACHE_ROWS:
+                self._texts.clear()
+            texts = self._texts[row] = tuple(
+                "" if val is None else str(val)
+                for val in (self._value(row, c) for c in range(len(self._columns))))
+        return texts[col]
+
+    def alignment(self, row, col):
+        """Выравнивание ячейки: числа в правую сторону — для числовых колонок
+        решено заранее, для смешанных (профиль колонки) — по значению"""
+        align = self._align[col]
+        if align is None:
+            align = _RIGHT if isinstance(self._value(row, col), (int, float)) else 0
+        return align or _LEFT
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return QVariant()
+        if orientation == Qt.Horizontal:
+            if 0 <= section < len(self._columns):
+                return self._columns[section]
+            return QVariant()
+        return str(section + 1)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return False
+        return not self._exhausted
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self._exhausted:
+            return
+        chunk = self._cursor.fetchmany(self._chunk_size)
+        if len(chunk) < self._chunk_size:
+            self._release()
+        if not chunk:
+            return
+        first = self.rowCount()
+        self.beginInsertRows(QModelIndex(), first, first + len(chunk) - 1)
+        self._append(chunk)
+        self.endInsertRows()
+
+    def append_rows(self, rows):
+        """Дописать строки в конец (для потоковых результатов без курсора)"""
+        if not rows:
+            return
+        first = self.rowCount()
+        self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+        self._append(rows)
+        self.endInsertRows()
+
+    def prepend_rows(self, rows):
+        """Вставить строки в начало таблицы (rows — в порядке показа)"""
+        if not rows:
+            return
+        if self._head is None:
+            self._head = ColumnStore(self._columns)
+        self.beginInsertRows(QModelIndex(), 0, len(rows) - 1)
+        # номера строк сдвигаются — кэш текста по номерам больше не годится
+        self._texts.clear()
+        self._head.append(rows[::-1])
+        if not self._align:
+            self._append([])
+        self.endInsertRows()
+
+    def _head_len(self):
+        return len(self._head) if self._head is not None else 0
+
+    def _value(self, row, col):
+        head = self._head_len()
+        if row < head:
+            return self._head.value(head - 1 - row, col)
+        return self._store.value(row - head, col)
+
+    def _append(self, rows):
+        self._store.append(rows)
+        # выравнивание по типу колонки (тип может расшириться с новой порцией)
+        store = self._head if self._head is not None and not len(self._store) else self._store
+        self._align = []
+        for col in range(len(self._columns)):
+            kind = store.kind(col)
+            self._align.append(_RIGHT if kind in ("int", "float") else
+                               0 if kind == "text" else None)
+
+    def columns(self):
+        return list(self._columns)
+
+    def rows(self):
+        """Уже прочитанные строки (список кортежей)"""
+        head = self._head.rows()[::-1] if self._head is not None else []
+        return head + self._store.rows()
+
+    def row(self, i):
+        return tuple(self._value(i, col) for col in range(len(self._columns)))
+
+    def store(self):
+        """Строки, прочитанные из курсора (без вставленных в начало)"""
+        return self._store
+
+    def close(self):
+        """Отпустить курсор (например, при закрытии соединения)"""
+        self._release()
+
+    def _release(self):
+        try:
+            if self._cursor is not None:
+                self._cursor.close()
+            if self._connection is not None:
+                self._connection.close()
+        except Exception:
+            pass
+        self._cursor = None
+        self._connection = None
+        self._exhausted = True
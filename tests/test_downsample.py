@@ -0,0 +1,40 @@
+import random
+
+import pytest
+
+import downsample
+
+pytest.importorskip("numpy")
+
+
+def both(monkeypatch, xs, ys, x0, x1, width):
+    """minmax с NumPy и без него (чистый Python)"""
+    fast_x, fast_y = downsample.minmax(xs, ys, x0, x1, width)
+    monkeypatch.setattr(downsample, "np", None)
+    slow_x, slow_y = downsample.minmax(xs, ys, x0, x1, width)
+    monkeypatch.undo()
+    return (list(map(float, fast_x)), list(map(float, fast_y))), (slow_x, slow_y)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_python_fallback_matches_numpy(monkeypatch, seed):
+    rng = random.Random(seed)
+    n = rng.randint(1, 3000)
+    xs = sorted(rng.uniform(0, 1000) for _ in range(n))
+    # мало разных значений — много равных min/max внутри пикселя
+    ys = [float(rng.randint(0, 5)) for _ in range(n)]
+    fast, slow = both(monkeypatch, xs, ys, 0.0, 1000.0, rng.randint(1, 300))
+    assert slow == pytest.approx(fast)
+
+
+def test_order_within_pixel(monkeypatch):
+    # в одном пикселе: максимум раньше минимума, минимум встречается позже ещё раз
+    xs = [0.0, 0.1, 0.2, 0.3, 0.4]
+    ys = [3.0, 9.0, 1.0, 5.0, 1.0]
+    fast, slow = both(monkeypatch, xs, ys, 0.0, 1.0, 1)
+    assert fast[1] == [9.0, 1.0]
+    assert slow == fast
+
+
+def test_empty():
+    assert downsample.minmax([], [], 0.0, 1.0, 10) == ([], [])
@@ -0,0 +1,44 @@
+import sqlite3
+
+import pytest
+
+import export
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, v)")
+    # первые строки — NULL и int, дальше str и float: первая порция типов не знает
+    values = [None] * 5 + [1, 2] + ["x", 2.5, b"\x00"]
+    conn.executemany("INSERT INTO t (v) VALUES (?)", [(v,) for v in values])
+    yield conn
+    conn.close()
+
+
+def test_column_kinds_see_all_rows(conn):
+    kinds = export.column_kinds(conn, "SELECT id, v, NULL AS n FROM t ORDER BY id")
+    assert kinds == [{int}, {int, str, float, bytes}, set()]
+
+
+def test_column_kinds_params_and_trailing_comment(conn):
+    sql = "SELECT v FROM t WHERE id > :low -- только str и float\n;"
+    assert export.column_kinds(conn, sql, {"low": 7}) == [{str, float, bytes}]
+
+
+def test_parquet_schema_covers_later_chunks(conn, tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    path = str(tmp_path / "t.parquet")
+    sql = "SELECT id, v FROM t WHERE typeof(v) != 'blob' ORDER BY id"
+    cursor = conn.execute(sql)
+    count = export.export_cursor(cursor, path, chunk_size=3, kinds=export.column_kinds(conn, sql))
+    assert count == 9
+    table = pq.read_table(path)
+    assert str(table.schema.field("v").type) == "string"
+    assert table.column("v").to_pylist()[5:] == ["1", "2", "x", "2.5"]
+
+
+def test_csv_unchanged(conn, tmp_path):
+    path = tmp_path / "t.csv"
+    assert export.export_cursor(conn.execute("SELECT id, v FROM t"), str(path), chunk_size=4) == 10
+    assert path.read_text(encoding="utf-8").splitlines()[0] == "id,v"
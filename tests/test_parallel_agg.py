@@ -0,0 +1,39 @@
+import sqlite3
+
+import parallel_agg
+import queries
+
+
+ROWS = [("DE", 3, 30.5, 10.17), ("FR", 1, 99.0, 99.0), (None, 2, 4.0, 2.0), ("US", 5, 30.5, 6.1)]
+COLUMNS = ["country", "orders_count", "total_revenue", "avg_order"]
+
+
+def _sql_view(sort, filters):
+    """То же через queries.wrap_view над обычным запросом"""
+    conn = sqlite3.connect(":memory:")
+    try:
+        values = " UNION ALL ".join("SELECT ?, ?, ?, ?" for _ in ROWS)
+        base = f"SELECT * FROM (SELECT NULL AS country, NULL AS orders_count, " \
+               f"NULL AS total_revenue, NULL AS avg_order WHERE 0 UNION ALL {values})"
+        sql, params = queries.wrap_view(base, [v for r in ROWS for v in r], sort, filters)
+        return conn.execute(sql, params).fetchall()
+    finally:
+        conn.close()
+
+
+def test_view_rows_matches_wrap_view():
+    for sort, filters in ((("orders_count", "DESC"), {}),
+                          (("total_revenue", "ASC"), {"country": "NOT NULL"}),
+                          (None, {"total_revenue": ">10", "country": "e"})):
+        columns, rows = parallel_agg.view_rows(COLUMNS, ROWS, sort, filters)
+        assert columns == COLUMNS
+        if sort is None:
+            assert rows == _sql_view(sort, filters)
+        else:
+            assert [r[COLUMNS.index(sort[0])] for r in rows] == \
+                   [r[COLUMNS.index(sort[0])] for r in _sql_view(sort, filters)]
+            assert sorted(rows, key=repr) == sorted(_sql_view(sort, filters), key=repr)
+
+
+def test_view_rows_without_view_keeps_rows():
+    assert parallel_agg.view_rows(COLUMNS, ROWS) == (COLUMNS, ROWS)
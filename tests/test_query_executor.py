@@ -0,0 +1,122 @@
+import sqlite3
+import time
+
+import pytest
+from PyQt5.QtCore import QCoreApplication
+
+from db_pool import ConnectionPool
+from query_executor import QueryExecutor
+
+# считает до миллиарда — без отмены это минуты
+SLOW_SQL = ("WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 1000000000) "
+            "SELECT count(*) FROM n")
+
+
+@pytest.fixture
+def app():
+    return QCoreApplication.instance() or QCoreApplication([])
+
+
+@pytest.fixture
+def pool(tmp_path):
+    path = str(tmp_path / "t.db")
+    sqlite3.connect(path).close()
+    pool = ConnectionPool(path, size=2)
+    yield pool
+    pool.close()
+
+
+def wait_for(app, condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        app.processEvents()
+        time.sleep(0.01)
+    app.processEvents()
+    return condition()
+
+
+def test_cancel_interrupts_call_task(app, pool):
+    executor = QueryExecutor(pool)
+    started, events = [], []
+    executor.cancelled.connect(lambda key: events.append("cancelled"))
+    executor.finished.connect(lambda key, result: events.append("finished"))
+
+    def work(task_pool):
+        conn = task_pool.acquire()
+        try:
+            started.append(True)
+            return ["n"], conn.execute(SLOW_SQL).fetchall()
+        finally:
+            conn.close()
+
+    assert executor.submit_call("slow", work)
+    assert wait_for(app, lambda: started)
+    time.sleep(0.1)
+    t0 = time.monotonic()
+    executor.shutdown()
+    assert time.monotonic() - t0 < 2.0
+    app.processEvents()
+    assert events == ["cancelled"]
+
+
+def test_call_task_own_connection_is_watched(app, pool):
+    executor = QueryExecutor(pool)
+    started = []
+
+    def work(task_pool):
+        conn = task_pool.connect()
+        try:
+            started.append(True)
+            return ["n"], conn.execute(SLOW_SQL).fetchall()
+        finally:
+            conn.close()
+
+    assert executor.submit_call("slow", work)
+    assert wait_for(app, lambda: started)
+    t0 = time.monotonic()
+    executor.shutdown()
+    assert time.monotonic() - t0 < 2.0
+
+
+def test_call_task_result(app, pool):
+    executor = QueryExecutor(pool)
+    results = []
+    executor.finished.connect(lambda key, result: results.append(result.rows))
+
+    def work(task_pool):
+        conn = task_pool.acquire()
+        try:
+            return ["x"], conn.execute("SELECT 42").fetchall()
+        finally:
+            conn.close()
+
+    executor.submit_call("ok", work)
+    assert wait_for(app, lambda: results)
+    assert results == [[(42,)]]
+    executor.shutdown()
+
+
+def test_watched_connections_released_after_task(app, pool):
+    executor = QueryExecutor(pool)
+    kept, tasks, results = [], [], []
+    executor.finished.connect(lambda key, result: results.append(result))
+
+    def work(task_pool):
+        # соединение переживает задачу (как у ShardAggregator до close)
+        kept.append(task_pool.connect())
+        tasks.append(task_pool._task)
+        return ["x"], []
+
+    executor.submit_call("keep", work)
+    assert wait_for(app, lambda: results)
+    task, conn = tasks[0], kept[0]
+    assert task._watched == []
+    steps = task._steps
+    try:
+        # progress handler задачи снят: долгий запрос её не трогает
+        conn.execute("WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n "
+                     "WHERE i < 300000) SELECT count(*) FROM n").fetchone()
+        assert task._steps == steps
+    finally:
+        conn.close()
+    executor.shutdown()